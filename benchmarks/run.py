@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Benchmarks for the PLIP pipeline.
+
+Every case (a local structure or a synthetic complex, see `synthetic.py`)
+is run through each of these paths, in a fresh child process per run so
+that peak memory (``ru_maxrss``) belongs to that run alone:
+
+- ``analysis``: `plipgui.analysis.analyze_with_plip` on the PDB contents.
+- ``model``: open the structure in Chimera and run a `core.Model` on it
+  (export, PLIP copy and analysis). Outside Chimera, the stand-in from
+  `tests/headless.py` is used, which times our code but not Chimera's.
+- ``controller``: the ``model`` path plus depicting every binding site
+  through `core.Controller`, as the results dialog does.
+
+Time and peak memory growth are reported per stage. Results can be saved
+as baselines, and later runs are compared against them: any metric slower
+or bigger than its baseline by more than the tolerance is flagged, and
+the exit code is 1.
+
+Usage::
+
+    pychimera benchmarks/run.py [--sizes 1000,10000,50000] [--corpus DIR|GLOB ...]
+                                [--paths analysis,model,controller] [--repeat 3]
+                                [--baseline FILE] [--save-baseline] [--tolerance 0.25]
+                                [-o results.json]
+    chimera --nogui --script "benchmarks/run.py --sizes 5000"
+    python benchmarks/run.py --sizes 5000   # headless Chimera stand-in
+"""
+
+from __future__ import print_function, division
+# Python stdlib
+import argparse
+import gzip
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Benchmark the working tree, even if another plipgui is installed, and
+# find the Chimera stand-in among the tests
+sys.path[:0] = [HERE, os.path.dirname(HERE), os.path.join(os.path.dirname(HERE), 'tests')]
+
+from synthetic import synthetic_complex
+
+
+PATHS = ('analysis', 'model', 'controller')
+DEFAULT_SIZES = (1000, 10000, 50000)
+DEFAULT_BASELINE = os.path.join(HERE, 'baselines.json')
+# Differences below these are noise, whatever the relative change
+MIN_SECONDS, MIN_MB = 0.05, 5.0
+# Progress messages of analyze_with_plip, and the stage each one starts
+_PROGRESS_STAGES = {'Checking cache': 'cache', 'Loading structure': 'load_pdb',
+                    'Detecting interactions': 'analyze', 'Building report': 'report'}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='benchmarks/run.py',
+                                     description='Benchmark the PLIP pipeline.')
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+                        help='Atom counts of the synthetic complexes, comma separated '
+                             '(default: %(default)s; empty for none)')
+    parser.add_argument('--ligands', type=int, default=2,
+                        help='Ligands per synthetic complex (default: %(default)s)')
+    parser.add_argument('--corpus', nargs='*', default=[], metavar='PATH',
+                        help='Local structures: files, directories or glob patterns')
+    parser.add_argument('--paths', default=','.join(PATHS),
+                        help='Paths to benchmark (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs per case and path; medians are reported '
+                             '(default: %(default)s)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='Baselines file (default: %(default)s)')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Store these results as the new baselines')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Relative slowdown flagged as a regression (default: %(default)s)')
+    parser.add_argument('-o', '--output', help='Write the full results as JSON')
+    args = parser.parse_args(argv)
+    args.sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    args.paths = [p.strip() for p in args.paths.split(',') if p.strip()]
+    unknown = set(args.paths).difference(PATHS)
+    if unknown:
+        parser.error('unknown paths: {}'.format(', '.join(sorted(unknown))))
+    return args
+
+
+def build_corpus(sizes, ligands, inputs, workdir):
+    """
+    Return ``(name, path)`` cases: synthetic complexes are written to
+    `workdir`; local structures are used in place.
+    """
+    from plipgui.batch import collect_structures, _structure_name
+    cases = []
+    for size in sizes:
+        path = os.path.join(workdir, 'synthetic-{}.pdb'.format(size))
+        with open(path, 'w') as f:
+            f.write(synthetic_complex(size, ligands=ligands))
+        cases.append(('synthetic-{}'.format(size), path))
+    cases.extend((_structure_name(path), path) for path in collect_structures(inputs))
+    return cases
+
+
+def run_case(path, bench_path, repeat=3):
+    """
+    Run `bench_path` on the structure at `path` `repeat` times, each in a
+    child process, and return the median seconds and MB per stage.
+    """
+    runs = []
+    for _ in range(repeat):
+        parent, child = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=_child, args=(child, bench_path, path))
+        process.start()
+        child.close()
+        try:
+            result = parent.recv()
+        except EOFError:
+            result = {'error': 'benchmark process died (exit code {})'.format(process.exitcode)}
+        process.join()
+        if 'error' in result:
+            return result
+        runs.append(result)
+    return dict((metric, _medians([run[metric] for run in runs]))
+                for metric in ('seconds', 'peak_mb'))
+
+
+def compare(results, baselines, tolerance):
+    """
+    List the metrics of `results` that regressed against `baselines`
+    """
+    regressions = []
+    for case, paths in sorted(results.items()):
+        for bench_path, result in sorted(paths.items()):
+            base = baselines.get(case, {}).get(bench_path)
+            if not base or 'error' in result:
+                continue
+            for metric, minimum in (('seconds', MIN_SECONDS), ('peak_mb', MIN_MB)):
+                for stage, value in sorted(result[metric].items()):
+                    before = base.get(metric, {}).get(stage)
+                    if before is None:
+                        continue
+                    if value > before * (1 + tolerance) and value - before > minimum:
+                        regressions.append((case, bench_path, metric, stage, before, value))
+    return regressions
+
+
+def versions():
+    info = {'python': sys.version.split()[0], 'platform': platform.platform()}
+    try:
+        from plip.modules import config as plip_config
+        info['plip'] = getattr(plip_config, '__version__', 'unknown')
+    except ImportError:
+        pass
+    try:
+        import openbabel
+        info['openbabel'] = openbabel.OBReleaseVersion()
+    except (ImportError, AttributeError):
+        pass
+    return info
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix='plip-bench-')
+    results = {}
+    try:
+        cases = build_corpus(args.sizes, args.ligands, args.corpus, workdir)
+        if not cases:
+            print('Nothing to benchmark', file=sys.stderr)
+            return 1
+        print('{:<28}{:<12}{:>10}{:>10}  slowest stages'.format(
+              'case', 'path', 'total (s)', 'peak MB'))
+        for name, path in cases:
+            for bench_path in args.paths:
+                result = results.setdefault(name, {})[bench_path] = run_case(
+                    path, bench_path, repeat=args.repeat)
+                print(_summary_line(name, bench_path, result))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baselines = {}
+    if os.path.isfile(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    regressions = compare(results, baselines, args.tolerance)
+    for case, bench_path, metric, stage, before, value in regressions:
+        print('REGRESSION {} {} {}[{}]: {:.3f} -> {:.3f} (+{:.0%})'.format(
+              case, bench_path, metric, stage, before, value, value / before - 1))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'versions': versions(), 'results': results}, f, indent=2,
+                      sort_keys=True)
+    if args.save_baseline:
+        for case, paths in results.items():
+            baselines.setdefault(case, {}).update(
+                (p, r) for (p, r) in paths.items() if 'error' not in r)
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print('Baselines saved to', args.baseline)
+    failed = any('error' in r for paths in results.values() for r in paths.values())
+    return 1 if regressions or failed else 0
+
+
+###################
+# Child processes #
+###################
+
+
+class _Probe(object):
+
+    """
+    Records time and peak memory when each stage starts. The last
+    mark must be ``'end'``.
+    """
+
+    def __init__(self):
+        self.marks = []
+
+    def mark(self, stage):
+        self.marks.append((stage, time.time(), _maxrss_mb()))
+
+    def seconds(self, stage):
+        for (name, before, _), (_, after, _) in zip(self.marks, self.marks[1:]):
+            if name == stage:
+                return after - before
+
+    def memory(self):
+        """
+        Growth of the peak memory during each stage, and overall
+        """
+        growth = {}
+        for (stage, _, before), (_, _, after) in zip(self.marks, self.marks[1:]):
+            growth[stage] = growth.get(stage, 0.0) + after - before
+        growth['total'] = self.marks[-1][2] - self.marks[0][2]
+        return growth
+
+
+class _Button(object):
+
+    def configure(self, **kwargs):
+        pass
+
+
+class _HeadlessGUI(object):
+
+    """
+    The parts of PLIPInputDialog used by `Controller` outside `run`
+    """
+
+    def __init__(self):
+        self.buttonWidgets = {'Run': _Button(), 'Cancel': _Button()}
+
+    def set_running(self, running):
+        pass
+
+    def set_progress(self, stage):
+        pass
+
+
+def _child(conn, bench_path, path):
+    try:
+        result = _BENCHMARKS[bench_path](path)
+    except Exception:
+        result = {'error': traceback.format_exc()}
+    conn.send(result)
+    conn.close()
+
+
+def _bench_analysis(path):
+    from plipgui.analysis import analyze_with_plip
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        pdb = f.read()
+    probe = _Probe()
+    probe.mark('start')
+    t0 = time.time()
+    analysis = analyze_with_plip(pdb, cache=False,
+                                 progress=lambda msg: probe.mark(_PROGRESS_STAGES[msg]))
+    seconds = dict(analysis.timings, total=time.time() - t0)
+    probe.mark('end')
+    return {'seconds': seconds, 'peak_mb': probe.memory()}
+
+
+def _bench_model(path, depict=False):
+    import headless
+    chimera = headless.install()
+    from plipgui.core import Controller, Model
+    from plipgui.analysis import analyze_with_plip
+    from plipgui.stats import STATS
+    STATS.reset()
+    probe = _Probe()
+    probe.mark('open')
+    t0 = time.time()
+    molecules = chimera.openModels.open(path, type='PDB')
+    probe.mark('prepare')
+    model = Model(molecules[0], cache=False, run=False)
+    pdb = model.prepare()
+    probe.mark('analysis')
+    model.analysis = analyze_with_plip(pdb, cache=False)
+    if depict:
+        probe.mark('depiction')
+        controller = Controller(gui=_HeadlessGUI(), prefetch=False)
+        controller.model = model
+        for site in sorted(controller.binding_sites):
+            controller.depict(site)
+    probe.mark('end')
+    seconds = dict(STATS.totals)
+    seconds.update(model.analysis.timings)
+    seconds['open'] = probe.seconds('open')
+    seconds['total'] = time.time() - t0
+    model.discard()
+    chimera.openModels.close(molecules)
+    return {'seconds': seconds, 'peak_mb': probe.memory()}
+
+
+def _bench_controller(path):
+    return _bench_model(path, depict=True)
+
+
+_BENCHMARKS = {'analysis': _bench_analysis, 'model': _bench_model,
+               'controller': _bench_controller}
+
+
+def _maxrss_mb():
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return maxrss / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10)
+
+
+def _medians(dicts):
+    medians = {}
+    for key in set().union(*dicts):
+        values = sorted(d[key] for d in dicts if key in d)
+        middle = len(values) // 2
+        medians[key] = (values[middle] if len(values) % 2
+                        else (values[middle - 1] + values[middle]) / 2)
+    return medians
+
+
+def _summary_line(name, bench_path, result):
+    if 'error' in result:
+        return '{:<28}{:<12}FAILED\n{}'.format(name, bench_path, result['error'])
+    seconds = result['seconds']
+    stages = sorted((s for s in seconds if s != 'total'), key=seconds.get, reverse=True)
+    return '{:<28}{:<12}{:>10.3f}{:>10.1f}  {}'.format(
+        name, bench_path, seconds['total'], result['peak_mb']['total'],
+        ', '.join('{} {:.2f}'.format(s, seconds[s]) for s in stages[:3]))
+
+
+# Chimera runs --script files in a sandbox module
+if __name__ == '__main__' or __name__.startswith('ChimeraOpenSandbox'):
+    sys.exit(main(sys.argv[1:]))
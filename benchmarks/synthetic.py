@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Synthetic protein-ligand complexes of a requested size, for benchmarks.
+
+The "protein" is a block of stacked, extended strands of alanine and serine
+residues; the ligands are phenol molecules placed in cavities carved into
+the block. Geometry is idealized but bond lengths are realistic, so
+OpenBabel perceives the expected connectivity and PLIP finds hydrophobic
+contacts and hydrogen bonds around each ligand.
+
+Usage::
+
+    python benchmarks/synthetic.py 20000 [--ligands N] [--seed S] > complex.pdb
+"""
+
+from __future__ import print_function, division
+# Python stdlib
+import argparse
+import math
+import random
+import string
+import sys
+
+
+#: PDB serial numbers have five columns
+MAX_ATOMS = 99999
+CHAINS = string.ascii_uppercase + string.ascii_lowercase + string.digits
+# Residue repeat along a strand, and strand/layer spacing (A)
+RISE, STRAND_SPACING, LAYER_SPACING = 3.78, 4.8, 6.0
+# Residue templates, relative to the residue origin
+BACKBONE = (('N', 'N', (0.00, 0.00, 0.00)),
+            ('CA', 'C', (1.20, 0.80, 0.00)),
+            ('C', 'C', (2.45, 0.00, 0.00)),
+            ('O', 'O', (2.10, -1.17, 0.00)),
+            ('CB', 'C', (1.20, 1.70, 1.20)))
+SIDECHAINS = {'ALA': (), 'SER': (('OG', 'O', (1.20, 2.20, 2.50)),)}
+# Phenol: ring radius 1.39 A, C-O 1.36 A
+LIGAND_RING = [('C{}'.format(i + 1), 'C',
+                (1.39 * math.cos(math.pi * i / 3), 1.39 * math.sin(math.pi * i / 3), 0.0))
+               for i in range(6)]
+LIGAND = LIGAND_RING + [('O1', 'O', (2.75, 0.0, 0.0))]
+LIGAND_BONDS = [(i, (i + 1) % 6) for i in range(6)] + [(0, 6)]
+# Protein atoms closer than this to a ligand atom are removed
+CAVITY = 3.2
+
+_ATOM = '{:6}{:5d} {:<4}{:1}{:>3} {:1}{:4d}{:1}   {:8.3f}{:8.3f}{:8.3f}{:6.2f}{:6.2f}          {:>2}\n'
+
+
+def synthetic_complex(n_atoms, ligands=1, seed=0):
+    """
+    PDB contents of a complex with about `n_atoms` protein atoms and
+    `ligands` phenol molecules. The same arguments give the same text.
+    """
+    if not 0 < n_atoms <= MAX_ATOMS - 7 * ligands:
+        raise ValueError('n_atoms must be between 1 and {}'.format(MAX_ATOMS - 7 * ligands))
+    rng = random.Random(seed)
+    n_residues = int(math.ceil(n_atoms / 5.3))
+    side = max(2, int(math.ceil(n_residues ** (1 / 3))))
+    nx, ny = side, side
+    nz = int(math.ceil(n_residues / (nx * ny)))
+    if nz > len(CHAINS):
+        nx = ny = int(math.ceil(math.sqrt(n_residues / len(CHAINS))))
+        nz = int(math.ceil(n_residues / (nx * ny)))
+
+    # Ligand centers inside the block, away from its faces
+    size = (nx * RISE, ny * STRAND_SPACING, nz * LAYER_SPACING)
+    centers = [tuple(rng.uniform(0.25, 0.75) * s for s in size) for _ in range(ligands)]
+    ligand_atoms = []
+    for center in centers:
+        angle = rng.uniform(0, 2 * math.pi)
+        cos, sin = math.cos(angle), math.sin(angle)
+        ligand_atoms.append([(name, element, (center[0] + x * cos - y * sin,
+                                              center[1] + x * sin + y * cos,
+                                              center[2] + z))
+                             for (name, element, (x, y, z)) in LIGAND])
+    flat = [xyz for atoms in ligand_atoms for (_, _, xyz) in atoms]
+
+    def in_cavity(xyz):
+        return any(_distance(xyz, other) < CAVITY for other in flat)
+
+    lines, serial, count = [], 0, 0
+    for k in range(nz):
+        chain, resseq, layer_start = CHAINS[k], 0, serial
+        for j in range(ny):
+            for i in range(nx):
+                if count >= n_atoms:
+                    break
+                resname = 'SER' if (i + j + k) % 3 == 0 else 'ALA'
+                origin = (i * RISE, j * STRAND_SPACING, k * LAYER_SPACING)
+                atoms = [(name, element, _add(origin, xyz))
+                         for (name, element, xyz) in BACKBONE + SIDECHAINS[resname]]
+                resseq += 1
+                if any(in_cavity(xyz) for (_, _, xyz) in atoms):
+                    continue
+                for name, element, xyz in atoms:
+                    serial += 1
+                    count += 1
+                    lines.append(_line('ATOM', serial, name, resname, chain, resseq, xyz,
+                                       element))
+        if serial > layer_start:
+            lines.append('TER\n')
+
+    conect = []
+    for n, atoms in enumerate(ligand_atoms, 1):
+        first = serial + 1
+        for name, element, xyz in atoms:
+            serial += 1
+            lines.append(_line('HETATM', serial, name, 'LIG', 'L', n, xyz, element))
+        bonded = dict((a, []) for a in range(len(atoms)))
+        for a, b in LIGAND_BONDS:
+            bonded[a].append(b)
+            bonded[b].append(a)
+        for a in sorted(bonded):
+            conect.append('CONECT{:5d}{}\n'.format(
+                first + a, ''.join('{:5d}'.format(first + b) for b in sorted(bonded[a]))))
+    return ''.join(lines + conect + ['END\n'])
+
+
+def _line(record, serial, name, resname, chain, resseq, xyz, element):
+    name = name if len(name) > 3 else ' ' + name
+    return _ATOM.format(record, serial, name, ' ', resname, chain, resseq, ' ',
+                        xyz[0], xyz[1], xyz[2], 1.0, 20.0, element)
+
+
+def _add(a, b):
+    return a[0] + b[0], a[1] + b[1], a[2] + b[2]
+
+
+def _distance(a, b):
+    return math.sqrt((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('atoms', type=int, help='Number of protein atoms')
+    parser.add_argument('--ligands', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    sys.stdout.write(synthetic_complex(args.atoms, ligands=args.ligands, seed=args.seed))
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,6 @@
 from __future__ import print_function, division
 import chimera
 from Midas.midas_text import doExtensionFunc, addCommand
-from plipgui.core import cmd_plip, cmd_unplip
 
 
 class PLIPExtension(chimera.extension.EMO):
@@ -26,13 +25,31 @@ class PLIPExtension(chimera.extension.EMO):
         self.module('gui').showUI()
 
 
+# plipgui.core is only imported when a command is run: Chimera loads this
+# file on every launch, and PLIP brings in OpenBabel and its report modules
+
+
 def _cmd_plip(cmdName, args):
+    from plipgui.core import cmd_plip
     doExtensionFunc(cmd_plip, args, specInfo=[("selSpec", "selection", None)])
 
 
 def _cmd_unplip(cmdName, args):
-    doExtensionFunc(cmd_unplip, args)
+    from plipgui.core import cmd_unplip
+    doExtensionFunc(cmd_unplip, args, specInfo=[("selSpec", "selection", None)])
+
+
+def _cmd_pliptraj(cmdName, args):
+    from plipgui.core import cmd_pliptraj
+    doExtensionFunc(cmd_pliptraj, args, specInfo=[("selSpec", "selection", None)])
+
+
+def _cmd_plipstats(cmdName, args):
+    from plipgui.core import cmd_plipstats
+    doExtensionFunc(cmd_plipstats, args)
 
 
 addCommand("plip", _cmd_plip, revFunc=_cmd_unplip)
+addCommand("pliptraj", _cmd_pliptraj)
+addCommand("plipstats", _cmd_plipstats)
 chimera.extension.manager.registerExtension(PLIPExtension(__file__))
\ No newline at end of file
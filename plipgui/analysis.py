@@ -0,0 +1,481 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+PLIP analyses as picklable results, independent of UCSF Chimera.
+
+Everything here runs in plain Python with PLIP and OpenBabel installed,
+so it can be used from worker processes, batch jobs and benchmarks.
+`plip4chimera` re-exports it and adds the Chimera side (export, depiction).
+"""
+
+from __future__ import print_function, division
+# Python stdlib
+import contextlib
+import functools
+import multiprocessing
+import os
+import sys
+import traceback
+
+
+class Mock(object):
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __call__(self, *args, **kwargs):
+        return Mock()
+
+    @classmethod
+    def __getattr__(cls, name):
+        if name in ('__file__', '__path__'):
+            return '.',
+        elif name == '__all__':
+            return []
+        elif name[0] == name[0].upper():
+            mockType = type(name, (), {})
+            mockType.__module__ = __name__
+            return mockType
+        else:
+            return Mock()
+
+    def __getitem__(self, *args, **kwargs):
+        return
+
+    def __setitem__(self, *args, **kwargs):
+        return
+
+
+# Patch unneeded PLIP dependencies
+MOCK_MODULES = ('pymol',)
+sys.modules.update((mod_name, Mock()) for mod_name in MOCK_MODULES)
+
+
+# PLIP's preparation and report modules (and so OpenBabel) are imported by
+# the functions that run analyses, so that only the process doing the work
+# pays for them (see `plipgui.worker`)
+from plip.modules import config as plip_config
+plip_config.PLUGIN_MODE = True
+from plipgui.cache import cache_key, default_cache
+from plipgui.pool import CrashSafePool, PoolError
+from plipgui.stats import Timings
+
+#: Where analyses run: in this process, in the persistent `plipgui.worker`
+#: or on a shared `plipgui.server`
+BACKENDS = ('local', 'worker', 'remote')
+#: Backend used when none is given
+DEFAULT_BACKEND = os.environ.get('TANGRAM_PLIPGUI_BACKEND', 'local')
+
+#: Interaction types, as named in BindingSiteReport ``<type>_info`` attributes
+INTERACTIONS = ('waterbridge', 'saltbridge', 'hydrophobic', 'halogen',
+                'pistacking', 'hbond', 'metal', 'pication')
+#: plip.modules.detection functions, as called by PLInteraction, for each type
+DETECTORS = {'waterbridge': 'water_bridges', 'saltbridge': 'saltbridge',
+             'hydrophobic': 'hydrophobic_interactions', 'halogen': 'halogen',
+             'pistacking': 'pistacking', 'hbond': 'hbonds', 'metal': 'metal_complexation',
+             'pication': 'pication'}
+#: Types whose detection PLIP refines with the results of other types:
+#: hydrogen bonds that are also salt bridges, hydrophobic contacts and
+#: pi-cation interactions of stacked rings, and water bridges between
+#: hydrogen-bonded atoms are discarded
+REQUIRES = {'hbond': ('saltbridge',), 'hydrophobic': ('pistacking',),
+            'pication': ('pistacking',), 'waterbridge': ('hbond',)}
+#: PLInteraction attributes holding the interactions of each type
+INTERACTION_ATTRIBUTES = {'waterbridge': ('water_bridges',),
+                          'saltbridge': ('saltbridge_lneg', 'saltbridge_pneg'),
+                          'hydrophobic': ('hydrophobic_contacts',),
+                          'halogen': ('halogen_bonds',), 'pistacking': ('pistacking',),
+                          'hbond': ('hbonds_ldon', 'hbonds_pdon'),
+                          'metal': ('metal_complexes',),
+                          'pication': ('pication_laro', 'pication_paro')}
+
+
+class SiteReport(object):
+
+    """
+    Plain-data copy of a BindingSiteReport. Only the ``*_features`` and
+    ``*_info`` tables are kept, which is what the GUI tables consume.
+    """
+
+    def __init__(self, report):
+        self.bsid = report.bsid
+        for name, value in vars(report).items():
+            if name.endswith(('_features', '_info')):
+                setattr(self, name, value)
+
+
+class Analysis(object):
+
+    """
+    Picklable digest of an analyzed PDBComplex.
+
+    For each binding site it holds a `SiteReport` and the `VisualizerData`
+    needed to depict it, plus the lines of the structure text report.
+    No OpenBabel objects are kept, so instances can be cached on disk.
+
+    `timings` holds the `Timings` of the analysis that produced it (or of
+    the cache lookup, if `cached` is True).
+    """
+
+    cached = False
+    timings = None
+
+    def __init__(self, pdbcomplex):
+        from plip.modules.plipremote import VisualizerData
+        from plip.modules.report import StructureReport, BindingSiteReport
+        self.sites = {}
+        for site, interaction_set in pdbcomplex.interaction_sets.items():
+            view_data = VisualizerData(pdbcomplex, site)
+            # Only the PyMOL visualizer reads it; don't keep a copy per site
+            view_data.corrected_pdb = None
+            self.sites[site] = SiteReport(BindingSiteReport(interaction_set)), view_data
+        self.txtreport = StructureReport(pdbcomplex).txtreport
+
+
+def analyze_with_plip(pdb, cache=True, progress=None, ligands=None, types=None,
+                      backend=None):
+    """
+    Run PLIP on `pdb` (contents of a PDB file) and return an `Analysis`.
+
+    Results are looked up in the on-disk cache first, keyed by the PDB
+    contents and the active PLIP thresholds. Pass ``cache=False`` to
+    bypass it, or a `ResultCache` instance to use a different store.
+    `progress`, if given, is called with the name of each stage.
+    `ligands` and `types` restrict the analysis as explained in `plip_complex`.
+    The time spent in each stage is stored in the `timings` of the result.
+
+    `backend` is one of `BACKENDS` (`DEFAULT_BACKEND` if not given). With
+    ``'worker'``, cache misses are analyzed in the persistent worker process
+    and a crash there raises `plipgui.worker.WorkerError`. With ``'remote'``,
+    they are sent to the analysis server, and failures raise
+    `plipgui.server.ServerError`.
+    """
+    progress = progress or _noop
+    backend = check_backend(backend)
+    if ligands is not None:
+        ligands = sorted(set(_ligand_id(*ligand) for ligand in ligands))
+    types = interaction_types(types)
+    timings = Timings()
+    if cache is True:
+        cache = default_cache()
+    if cache:
+        progress('Checking cache')
+        with timings.time('cache'):
+            key = cache_key(pdb, config_snapshot(), ligands=ligands, types=types)
+            analysis = cache.get(key)
+        if analysis is not None:
+            analysis.cached, analysis.timings = True, timings
+            return analysis
+    if backend != 'local':
+        if backend == 'worker':
+            from plipgui.worker import get_worker
+            analysis = get_worker().analyze(pdb, progress=progress, ligands=ligands,
+                                            types=types)
+        else:
+            from plipgui.server import analyze_remote
+            progress('Waiting for the analysis server')
+            analysis = analyze_remote(pdb, ligands=ligands, types=types, cache=bool(cache))
+        for stage, seconds in analysis.timings.items():
+            timings[stage] = timings.get(stage, 0.0) + seconds
+    else:
+        pdbcomplex = plip_complex(pdb, progress=progress, ligands=ligands, types=types,
+                                  timings=timings)
+        progress('Building report')
+        with timings.time('report'):
+            analysis = Analysis(pdbcomplex)
+    analysis.timings = timings
+    if cache:
+        with timings.time('cache'):
+            cache.put(key, analysis)
+    return analysis
+
+
+def plip_complex(pdb, progress=None, ligands=None, types=None, timings=None):
+    """
+    Load and analyze `pdb` with PLIP.
+
+    If `ligands`, a list of ``(resname, chain, position)`` tuples, is given,
+    only the hetero groups containing one of those residues are analyzed;
+    the rest of the structure is still used as their environment.
+
+    If `types` lists some of `INTERACTIONS`, the other types are left out
+    of the results, and their detection is skipped unless one of `types`
+    depends on it (see `only_interactions`).
+
+    If a `Timings` dict is given, the time spent loading (including
+    protonation, also timed on its own) and analyzing is added to it.
+    """
+    from plip.modules.preparation import PDBComplex
+    progress = progress or _noop
+    if timings is None:
+        timings = Timings()
+    pdbcomplex = PDBComplex()
+    progress('Loading structure')
+    with timings.time('load_pdb'), _timed_protonation(timings):
+        pdbcomplex.load_pdb(pdb, as_string=True)
+    if ligands is not None:
+        wanted = set(_ligand_id(*ligand) for ligand in ligands)
+        pdbcomplex.ligands = [ligand for ligand in pdbcomplex.ligands
+                              if wanted.intersection(_ligand_members(ligand))]
+    progress('Detecting interactions')
+    with timings.time('analyze'), only_interactions(types):
+        pdbcomplex.analyze()
+        if types is not None:
+            for interaction_set in pdbcomplex.interaction_sets.values():
+                drop_interactions(interaction_set, types)
+    pdbcomplex.sourcefiles['filename'] = '/dev/null'
+    return pdbcomplex
+
+
+def analyze_many(pdbs, processes=None, cache=True, ligands=None, types=None, backend=None,
+                 pool=None, timeout=None):
+    """
+    Analyze several PDB strings across a `CrashSafePool` of `processes`
+    workers (one per CPU by default), or in `pool` if given, which can
+    then be reused between calls. Analyses running for more than
+    `timeout` seconds are stopped. `ligands`, if given, is a list aligned
+    with `pdbs` holding the `ligands` argument for each structure.
+    With the ``'worker'`` `backend`, the persistent worker analyzes
+    them one after another instead; with ``'remote'``, they are sent
+    to the analysis server in a single request, and only its result
+    cache is used.
+
+    Returns a list aligned with `pdbs`. Failed analyses are reported
+    with the formatted traceback (a string) instead of an `Analysis`,
+    so one bad structure does not discard the rest. So are structures
+    whose worker process crashed (e.g. in OpenBabel) or timed out.
+    """
+    backend = check_backend(backend)
+    if backend == 'remote':
+        from plipgui.server import analyze_batch
+        return analyze_batch(pdbs, ligands=ligands, types=types, cache=bool(cache))
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if backend == 'worker':
+        processes, pool = 1, None
+    processes = min(processes, len(pdbs))
+    jobs = zip(pdbs, ligands or [None] * len(pdbs))
+    analyze = functools.partial(_analyze_or_traceback, cache=cache, types=types,
+                                backend=backend)
+    if pool is None and processes <= 1:
+        return map(analyze, jobs)
+    own_pool = pool is None
+    if own_pool:
+        pool = CrashSafePool(processes, timeout=timeout)
+    try:
+        results = pool.map(analyze, jobs)
+    finally:
+        if own_pool:
+            pool.close()
+    return [lost_job_message(r) if isinstance(r, PoolError) else r for r in results]
+
+
+def lost_job_message(error):
+    """
+    Text reported for an analysis lost in a `CrashSafePool` (a `PoolError`)
+    """
+    return 'PLIP did not finish: {}'.format(error)
+
+
+def _analyze_or_traceback(job, **kwargs):
+    pdb, ligands = job
+    try:
+        return analyze_with_plip(pdb, ligands=ligands, **kwargs)
+    except Exception:
+        return traceback.format_exc()
+
+
+def interaction_types(types):
+    """
+    Normalize a selection of interaction types: a sequence or a comma or
+    space separated string of `INTERACTIONS`. Returns a sorted tuple, or
+    None if all types are selected.
+    """
+    if types is None:
+        return None
+    if isinstance(types, basestring):
+        types = types.replace(',', ' ').split()
+    types = set(t.lower() for t in types)
+    unknown = types.difference(INTERACTIONS)
+    if unknown:
+        raise ValueError('Unknown interaction types: {}. Choose from {}.'.format(
+                         ', '.join(sorted(unknown)), ', '.join(INTERACTIONS)))
+    if not types:
+        raise ValueError('Select at least one interaction type.')
+    if types.issuperset(INTERACTIONS):
+        return None
+    return tuple(sorted(types))
+
+
+def required_interactions(types=None):
+    """
+    `types` plus every type their detection depends on (see `REQUIRES`),
+    as a set. None, meaning all types, is returned as is.
+    """
+    if types is None:
+        return None
+    required, pending = set(), list(types)
+    while pending:
+        interaction = pending.pop()
+        if interaction not in required:
+            required.add(interaction)
+            pending.extend(REQUIRES.get(interaction, ()))
+    return required
+
+
+@contextlib.contextmanager
+def only_interactions(types=None):
+    """
+    Make PLIP skip the detection of the interaction types that neither
+    are in `types` nor are needed to refine them (`required_interactions`),
+    so the types kept are the same as in a full analysis. Types detected
+    only for that are still reported until `drop_interactions` removes them.
+
+    PLInteraction calls the detection functions through the
+    ``plip.modules.preparation`` namespace, so they are swapped there for
+    a function returning no interactions while the block runs.
+    """
+    from plip.modules import preparation
+    required = required_interactions(types)
+    skipped = [DETECTORS[t] for t in INTERACTIONS if required is not None and t not in required]
+    originals = dict((name, getattr(preparation, name)) for name in skipped)
+    for name in skipped:
+        setattr(preparation, name, _no_interactions)
+    try:
+        yield
+    finally:
+        for name, function in originals.items():
+            setattr(preparation, name, function)
+
+
+def drop_interactions(interaction_set, types):
+    """
+    Empty the interactions of a PLInteraction whose type is not in `types`,
+    and update the summaries PLIP derived from them (interacting residues
+    and chains). Unpaired ligand atoms are left as detected.
+    """
+    for interaction in INTERACTIONS:
+        if interaction not in types:
+            for name in INTERACTION_ATTRIBUTES[interaction]:
+                setattr(interaction_set, name, [])
+    kept = [i for t in INTERACTIONS if t in types
+            for name in INTERACTION_ATTRIBUTES[t] for i in getattr(interaction_set, name)]
+    interaction_set.all_itypes = kept
+    interaction_set.no_interactions = not kept
+    interaction_set.interacting_chains = sorted(set(i.reschain for i in kept
+                                                    if i.reschain not in (' ', None)))
+    interaction_set.interacting_res = list(set('{}{}'.format(i.resnr, i.reschain) for i in kept
+                                               if i.restype not in ('LIG', 'HOH')))
+
+
+def check_backend(backend):
+    """
+    Validate `backend`, replacing None by `DEFAULT_BACKEND`
+    """
+    if backend is None:
+        backend = DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError('Unknown backend: {}. Choose from {}.'.format(
+                         backend, ', '.join(BACKENDS)))
+    return backend
+
+
+def config_snapshot(overrides=None):
+    """
+    PLIP settings that can change the outcome of an analysis
+
+    Parameters
+    ----------
+    overrides : dict, optional
+        Settings (as from another `config_snapshot`) that replace the
+        current ones. Unknown names and non-numeric values are ignored,
+        and ``__version__`` is always the local PLIP version.
+    """
+    snapshot = dict((name, value) for (name, value) in vars(plip_config).items()
+                    if name.isupper() and isinstance(value, (int, float)))
+    for name, value in (overrides or {}).items():
+        if name in snapshot and isinstance(value, (int, float)):
+            snapshot[str(name)] = value
+    snapshot['__version__'] = plip_version()
+    return snapshot
+
+
+@contextlib.contextmanager
+def plip_settings(config):
+    """
+    Apply the PLIP settings in `config` while the block runs and restore
+    the previous ones afterwards, so that processes serving several
+    clients do not leak settings from one job into the next.
+    """
+    settings = config_snapshot(config)
+    del settings['__version__']
+    previous = dict((name, getattr(plip_config, name)) for name in settings)
+    try:
+        for name, value in settings.items():
+            setattr(plip_config, name, value)
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(plip_config, name, value)
+
+
+_plip_version = None
+def plip_version():
+    """
+    Version of the installed PLIP. It is read from the package metadata,
+    since the module that defines it imports OpenBabel.
+    """
+    global _plip_version
+    if _plip_version is None:
+        try:
+            import pkg_resources
+            _plip_version = pkg_resources.get_distribution('plip').version
+        except Exception:
+            _plip_version = 'unknown'
+    return _plip_version
+
+
+def _noop(*args, **kwargs):
+    pass
+
+
+def _no_interactions(*args, **kwargs):
+    return []
+
+
+@contextlib.contextmanager
+def _timed_protonation(timings):
+    """
+    Time OpenBabel's hydrogen addition, which PLIP runs inside load_pdb
+    """
+    try:
+        from openbabel import OBMol
+    except ImportError:
+        OBMol = None
+    methods = [name for name in ('AddHydrogens', 'AddPolarHydrogens')
+               if OBMol is not None and name in vars(OBMol)]
+    originals = dict((name, vars(OBMol)[name]) for name in methods)
+    for name, function in originals.items():
+        setattr(OBMol, name, _timed(function, timings, 'protonation'))
+    try:
+        yield
+    finally:
+        for name, function in originals.items():
+            setattr(OBMol, name, function)
+
+
+def _timed(function, timings, stage):
+    def timed(*args, **kwargs):
+        with timings.time(stage):
+            return function(*args, **kwargs)
+    return timed
+
+
+def _ligand_id(resname, chain, position):
+    return resname.strip().upper(), chain.strip(), int(position)
+
+
+def _ligand_members(ligand):
+    members = getattr(ligand, 'members', None) or [(ligand.hetid, ligand.chain, ligand.position)]
+    return [_ligand_id(*member) for member in members]
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Run PLIP analyses off the Tk main loop
+"""
+
+from __future__ import print_function, division
+# Python stdlib
+from Queue import Empty, Queue
+import threading
+import traceback
+
+
+class BackgroundAnalysis(object):
+
+    """
+    Runs `analysis.analyze_with_plip` off the Tk thread.
+
+    PLIP runs in another process: the persistent `plipgui.worker` (also
+    for the ``'local'`` backend, since forking Chimera with its Tk and
+    OpenGL state is not safe) or the analysis server, with the
+    ``'remote'`` backend. A thread waits for it, and the Tk main loop
+    polls that thread through ``widget.after``, forwarding progress
+    messages to `on_progress` and the resulting `Analysis` to `on_done`.
+    `cancel` stops the worker instead of waiting for PLIP to finish; a
+    remote analysis is left to finish.
+
+    Parameters
+    ----------
+    pdb : str
+        Contents of the PDB file to analyze
+    on_progress, on_done, on_error : callable, optional
+        Called with the stage name, the `Analysis` or the error message,
+        respectively.
+    kwargs
+        Passed to `analyze_with_plip`.
+    """
+
+    interval = 100  # ms
+
+    def __init__(self, pdb, on_progress=None, on_done=None, on_error=None, **kwargs):
+        self.pdb = pdb
+        self.kwargs = kwargs
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.on_error = on_error
+        self.process = None
+        self.queue = None
+        self._widget = None
+        self._after_id = None
+
+    @property
+    def running(self):
+        return self.process is not None
+
+    def start(self, widget):
+        from plipgui.analysis import check_backend
+        self._widget = widget
+        backend = check_backend(self.kwargs.get('backend'))
+        if backend == 'local':
+            backend = 'worker'
+        kwargs = dict(self.kwargs, backend=backend)
+        self.queue = _ThreadQueue()
+        self.process = _WaitingThread(backend, target=_work, args=(self.queue, self.pdb, kwargs))
+        self.process.daemon = True
+        self.process.start()
+        self.pdb = None
+        self._schedule()
+
+    def cancel(self):
+        if self.process is None:
+            return
+        self._unschedule()
+        try:
+            self.process.terminate()
+        finally:
+            self._cleanup()
+
+    def poll(self):
+        self._after_id = None
+        while self.process is not None:
+            try:
+                kind, value = self.queue.get_nowait()
+            except Empty:
+                if self.process.is_alive():
+                    break
+                # The thread may end right after its last put
+                try:
+                    kind, value = self.queue.get_nowait()
+                except Empty:
+                    kind, value = 'error', 'PLIP analysis ended without a result'
+            if kind == 'progress':
+                _call(self.on_progress, value)
+                continue
+            self._cleanup()
+            _call(self.on_done if kind == 'done' else self.on_error, value)
+        else:
+            return
+        self._schedule()
+
+    def _schedule(self):
+        self._after_id = self._widget.after(self.interval, self.poll)
+
+    def _unschedule(self):
+        if self._after_id is not None:
+            self._widget.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _cleanup(self):
+        # Never block the Tk thread: a cancelled thread ends by itself
+        # once the stopped worker's pipe closes
+        self.process.join(0)
+        self.process = None
+        self.queue.close()
+        self.queue = None
+
+
+class _WaitingThread(threading.Thread):
+
+    """
+    Waits for the process doing the analysis
+    """
+
+    def __init__(self, backend, **kwargs):
+        super(_WaitingThread, self).__init__(**kwargs)
+        self.backend = backend
+
+    def terminate(self):
+        if self.backend == 'worker':
+            from plipgui.worker import get_worker
+            get_worker().stop()
+
+
+class _ThreadQueue(Queue):
+
+    def close(self):
+        pass
+
+
+def _work(queue, pdb, kwargs):
+    from plipgui.analysis import analyze_with_plip
+    try:
+        analysis = analyze_with_plip(pdb, progress=lambda stage: queue.put(('progress', stage)),
+                                     **kwargs)
+    except Exception:
+        queue.put(('error', traceback.format_exc()))
+    else:
+        queue.put(('done', analysis))
+
+
+def _call(callback, *args):
+    if callback is not None:
+        callback(*args)
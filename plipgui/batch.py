@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Headless PLIP analysis of many structures.
+
+Reads PDB files straight from disk, analyzes them across a pool of
+worker processes and writes one text report per structure plus a
+tab-separated summary. Nothing is opened in Chimera nor depicted.
+
+Usage::
+
+    python -m plipgui.batch [options] <dir|glob> ...
+    chimera --nogui --script "/path/to/plipgui/batch.py [options] <dir|glob> ..."
+
+Chimera is not needed; only PLIP and OpenBabel.
+"""
+
+from __future__ import print_function, division
+# Python stdlib
+import argparse
+import functools
+import glob
+import gzip
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+
+EXTENSIONS = ('.pdb', '.ent', '.pdb.gz', '.ent.gz')
+#: Default limit, in seconds, for the analysis of one structure
+DEFAULT_TIMEOUT = 900
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='plipgui.batch', description='Analyze PDB files with PLIP, without depiction.')
+    parser.add_argument('inputs', nargs='+', metavar='PATH',
+                        help='PDB files, directories or glob patterns')
+    parser.add_argument('-o', '--output', default='plip_reports',
+                        help='Directory for the reports (default: %(default)s)')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='Number of worker processes (default: one per CPU)')
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help='Do not use the on-disk result cache')
+    parser.add_argument('-t', '--types', default=None,
+                        help='Comma-separated interaction types to detect (default: all)')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help='Seconds after which an analysis is stopped and recorded as '
+                             'failed; 0 for no limit (default: %(default)s)')
+    return parser.parse_args(argv)
+
+
+def collect_structures(inputs):
+    """
+    Expand directories and glob patterns into a sorted list of files
+    """
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.update(os.path.join(item, name) for name in os.listdir(item)
+                         if name.lower().endswith(EXTENSIONS))
+        else:
+            paths.update(p for p in glob.glob(item) if os.path.isfile(p))
+    return sorted(paths)
+
+
+def analyze_file(path, output, cache=True, types=None):
+    """
+    Analyze one structure and write its report to `output`.
+
+    Returns a row for the summary table; errors are recorded in it
+    instead of being raised, so a bad file does not stop the batch.
+    """
+    from plipgui.analysis import analyze_with_plip, INTERACTIONS
+    row = _empty_row(path)
+    t0 = time.time()
+    try:
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            analysis = analyze_with_plip(f.read(), cache=cache, types=types)
+        with open(os.path.join(output, row['structure'] + '.txt'), 'w') as f:
+            f.write('\n'.join(analysis.txtreport))
+    except Exception as e:
+        row['status'] = 'error'
+        row['error'] = _one_line(e)
+        traceback.print_exc()
+    else:
+        row['binding_sites'] = len(analysis.sites)
+        for report, _ in analysis.sites.values():
+            for interaction in INTERACTIONS:
+                row[interaction] += len(getattr(report, interaction + '_info', None) or ())
+    row['seconds'] = round(time.time() - t0, 3)
+    return row
+
+
+def run(paths, output, processes=None, cache=True, types=None, timeout=DEFAULT_TIMEOUT):
+    """
+    Analyze all `paths`, writing reports and ``summary.tsv`` in `output`.
+    Returns the summary rows, in completion order.
+
+    Structures are analyzed in a `CrashSafePool` of `processes` workers:
+    if PLIP crashes on a structure, or takes longer than `timeout`
+    seconds on it (None or 0 for no limit), it is recorded as an error
+    and the batch goes on.
+    """
+    from plipgui.analysis import INTERACTIONS, interaction_types
+    from plipgui.pool import CrashSafePool, PoolError
+    types = interaction_types(types)
+    if not os.path.isdir(output):
+        os.makedirs(output)
+    columns = ('structure', 'status', 'seconds', 'binding_sites') + INTERACTIONS + ('error',)
+    worker = functools.partial(analyze_file, output=output, cache=cache, types=types)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    rows = []
+    with CrashSafePool(min(processes, len(paths)), timeout=timeout or None) as pool, \
+            open(os.path.join(output, 'summary.tsv'), 'w') as summary:
+        summary.write('\t'.join(columns) + '\n')
+        for i, (index, row) in enumerate(pool.imap_unordered(worker, paths), 1):
+            if isinstance(row, PoolError):
+                row = _empty_row(paths[index], status='error', error=row,
+                                 seconds=round(row.seconds, 3))
+            summary.write('\t'.join(str(row[c]) for c in columns) + '\n')
+            summary.flush()
+            rows.append(row)
+            print('[{}/{}] {} {} ({} s)'.format(i, len(paths), row['structure'],
+                                                row['status'], row['seconds']))
+    return rows
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = collect_structures(args.inputs)
+    if not paths:
+        print('No structures found in', ' '.join(args.inputs), file=sys.stderr)
+        return 1
+    rows = run(paths, args.output, processes=args.processes, cache=args.cache,
+               types=args.types, timeout=args.timeout)
+    failed = sum(1 for row in rows if row['status'] != 'ok')
+    print('Analyzed {} structures ({} failed). Reports in {}'.format(
+          len(rows), failed, os.path.abspath(args.output)))
+    return 1 if failed else 0
+
+
+def _empty_row(path, status='ok', error='', seconds=0.0):
+    from plipgui.analysis import INTERACTIONS
+    row = {'structure': _structure_name(path), 'status': status, 'binding_sites': 0,
+           'seconds': seconds, 'error': _one_line(error)}
+    row.update((interaction, 0) for interaction in INTERACTIONS)
+    return row
+
+
+def _one_line(error):
+    if isinstance(error, Exception):
+        error = '{}: {}'.format(type(error).__name__, error)
+    return error.replace('\t', ' ').replace('\n', ' ')
+
+
+def _structure_name(path):
+    name = os.path.basename(path)
+    for ext in sorted(EXTENSIONS, key=len, reverse=True):
+        if name.lower().endswith(ext):
+            return name[:-len(ext)]
+    return name
+
+
+# Chimera runs --script files in a sandbox module, so import main from the
+# package: pool workers must be able to unpickle functions by module name
+if __name__ == '__main__' or __name__.startswith('ChimeraOpenSandbox'):
+    from plipgui.batch import main as _main
+    sys.exit(_main(sys.argv[1:]))
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Persistent, content-addressed cache for PLIP results
+"""
+
+from __future__ import print_function, division
+# Python stdlib
+import cPickle as pickle
+import hashlib
+import os
+import tempfile
+import zlib
+
+
+#: Bump this whenever the pickled objects change their layout
+CACHE_FORMAT = 2
+DEFAULT_PATH = os.environ.get(
+    'TANGRAM_PLIPGUI_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'tangram_plipgui'))
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024  # bytes
+#: Puts after which the cache directory is measured again, since other
+#: processes sharing it add entries too
+RESCAN_PUTS = 256
+#: Fraction of `max_size` left after an eviction, so that the next puts
+#: do not have to evict again
+EVICT_TO = 0.9
+_SUFFIX = '.pickle.z'
+
+
+def cache_key(pdb, config=None, **options):
+    """
+    Hash of the PDB contents plus every setting that may change
+    the analysis (PLIP thresholds in `config`, extra `options`).
+    """
+    sha = hashlib.sha1()
+    sha.update('format={}\n'.format(CACHE_FORMAT))
+    for name, value in sorted((config or {}).items()):
+        sha.update('{}={!r}\n'.format(name, value))
+    for name, value in sorted(options.items()):
+        sha.update('{}={!r}\n'.format(name, value))
+    sha.update(pdb)
+    return sha.hexdigest()
+
+
+class ResultCache(object):
+
+    """
+    Size-capped LRU store of picklable objects, one compressed file per key.
+
+    Recency is tracked with file modification times, so the same directory
+    can be shared by the GUI, the ``plip`` command and worker processes.
+    The directory is only listed when a running estimate of its size goes
+    past `max_size`, or every `RESCAN_PUTS` puts.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_size=DEFAULT_MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self._size = None  # estimate, in bytes; unknown until measured
+        self._puts = 0
+
+    def __contains__(self, key):
+        return os.path.isfile(self._filename(key))
+
+    def get(self, key, default=None):
+        path = self._filename(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.loads(zlib.decompress(f.read()))
+        except (IOError, OSError):
+            return default
+        except Exception:  # truncated or stale entry
+            _remove(path)
+            return default
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key, value):
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        data = zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        path = self._filename(key)
+        if os.name == 'nt':
+            _remove(path)
+        os.rename(tmp, path)
+        self._puts += 1
+        if self._size is not None:
+            self._size += len(data)
+        if self._size is None or self._size > self.max_size or self._puts >= RESCAN_PUTS:
+            self.evict()
+
+    def evict(self):
+        """
+        Remove least recently used entries, if the cache is larger than
+        `max_size`, until it fits in `EVICT_TO` of it
+        """
+        entries, total = [], 0
+        for path in self._entries():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        entries.sort()
+        limit = self.max_size if total <= self.max_size else self.max_size * EVICT_TO
+        for _, size, path in entries:
+            if total <= limit:
+                break
+            _remove(path)
+            total -= size
+        self._size, self._puts = total, 0
+
+    def clear(self):
+        for path in self._entries():
+            _remove(path)
+        self._size = 0
+
+    def _filename(self, key):
+        return os.path.join(self.path, key + _SUFFIX)
+
+    def _entries(self):
+        if not os.path.isdir(self.path):
+            return []
+        return [os.path.join(self.path, name) for name in os.listdir(self.path)
+                if name.endswith(_SUFFIX)]
+
+
+_default_cache = None
+def default_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResultCache()
+    return _default_cache
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
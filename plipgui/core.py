@@ -4,55 +4,17 @@
 
 from __future__ import print_function, division
 # Python stdlib
+from collections import OrderedDict
 import contextlib
-from cStringIO import StringIO
+import os
 import sys
-from tkFileDialog import asksaveasfilename
-import Tkinter as tk
+import traceback
 # Chimera stuff
 import chimera
 from Midas import MidasError
-# Additional 3rd parties
-
-
-class _Mock(object):
-
-    def __init__(self, *args, **kwargs):
-        pass
-
-    def __call__(self, *args, **kwargs):
-        return _Mock()
-
-    @classmethod
-    def __getattr__(cls, name):
-        if name in ('__file__', '__path__'):
-            return '.',
-        elif name == '__all__':
-            return []
-        elif name[0] == name[0].upper():
-            mockType = type(name, (), {})
-            mockType.__module__ = __name__
-            return mockType
-        else:
-            return _Mock()
-
-    def __getitem__(self, *args, **kwargs):
-        return
-
-    def __setitem__(self, *args, **kwargs):
-        return
-
-
-# Patch unneeded PLIP dependencies
-MOCK_MODULES = ['pymol']
-sys.modules.update((mod_name, _Mock()) for mod_name in MOCK_MODULES)
-
-from plip.modules.preparation import PDBComplex
-from plip.modules.chimeraplip import ChimeraVisualizer
-from plip.modules.plipremote import VisualizerData
-from plip.modules.report import StructureReport, BindingSiteReport
-from plip.modules import config as plip_config
-plip_config.PLUGIN_MODE = True
+# Own
+from plipgui.stats import STATS
+# plip4chimera (and with it PLIP and OpenBabel) is imported where first needed
 
 
 class Controller(object):
@@ -69,36 +31,188 @@ class Controller(object):
     _PBNAMES_TO_INTERACTIONS = dict((p, i) for (p, i) in zip(_PBNAMES, _INTERACTIONS))
     _INTERACTIONS_TO_PBNAMES = dict((i, p) for (p, i) in zip(_PBNAMES, _INTERACTIONS))
 
-    def __init__(self, gui, model=None, *args, **kwargs):
+    #: Binding sites whose visualizers are kept in memory
+    SITE_CACHE_SIZE = 8
+
+    def __init__(self, gui, model=None, prefetch=True, *args, **kwargs):
         self.gui = gui
         self.gui_results = None
         self.model = None
+        self.prefetch = prefetch
         self._molecule = None
         self._interactions = None
+        self._depicted = {}
+        self._current_site = None
+        self.hidden_interactions = set()
+        self._prefetch_id = None
+        self.task = None
         self.set_mvc()
 
     def set_mvc(self):
         # Buttons callbacks
         self.gui.buttonWidgets['Run'].configure(command=self.run)
+        self.gui.buttonWidgets['Cancel'].configure(command=self.cancel)
+        self.gui.set_running(False)
 
     def run(self):
-        from gui import PLIPResultsDialog
         self.check()
-        self.model = Model(self.molecule)
+        if self.task is not None:
+            return
+        self.model = Model(self.molecule, run=False, copy=self.gui.use_copy.get(),
+                           pocket=self.gui.pocket, types=self.gui.interaction_types,
+                           # Profiles must see PLIP at work
+                           backend='local' if self.gui.profile.get() else self.gui.backend)
+        self._interactions = None
+        self._depicted = {}
+        self._current_site = None
+        self.hidden_interactions.clear()
+        STATS.begin_run(command='gui', models=1)
+        if self.gui.profile.get():
+            # Background workers would escape the profiler
+            from plipgui.profiling import Profile
+            with Profile() as profiler:
+                self._run_foreground()
+            chimera.replyobj.info(profiler.report())
+        elif self.gui.background.get():
+            self._run_background()
+        else:
+            self._run_foreground()
+
+    def _prepare(self):
+        self.gui.set_progress('Exporting structure')
+        return self.model.prepare()
 
+    def _run_foreground(self):
+        from plipgui.plip4chimera import analyze_with_plip
+        pdb = self._prepare()
+        try:
+            self.model.analysis = analyze_with_plip(pdb, cache=self.model.cache,
+                                                    types=self.model.types,
+                                                    backend=self.model.backend,
+                                                    progress=self.gui.set_progress)
+        except Exception:
+            # e.g. WorkerError or ServerError: clean up as for background runs
+            self._on_task_error_cb(traceback.format_exc())
+            return
+        self.gui.set_progress('')
+        self.show_results()
+
+    def _run_background(self):
+        from plipgui.background import BackgroundAnalysis
+        pdb = self._prepare()
+        self.task = BackgroundAnalysis(pdb, on_progress=self.gui.set_progress,
+                                       on_done=self._on_task_done_cb,
+                                       on_error=self._on_task_error_cb,
+                                       cache=self.model.cache, types=self.model.types,
+                                       backend=self.model.backend)
+        self.gui.set_running(True)
+        self.task.start(self.gui.uiMaster())
+
+    def cancel(self):
+        if self.task is None:
+            return
+        STATS.end_run()
+        self.task.cancel()
+        self.task = None
+        self.model.discard()
+        self.model = None
+        self.gui.set_running(False)
+        self.gui.set_progress('Cancelled')
+
+    def show_results(self):
+        from gui import PLIPResultsDialog
+        STATS.add_analysis(self.model.analysis, atoms=len(self.model.atoms))
         dialog = PLIPResultsDialog(molecule=self.molecule, controller=self)
         dialog.enter()
         dialog.buttonWidgets['Close'].configure(command=self._on_close_cb)
         dialog.buttonWidgets['Save'].configure(command=self._on_save_cb)
-        dialog.fillInData(self.binding_sites)
         self.gui_results = dialog
+        dialog.fillInData(self.binding_sites)
+        STATS.end_run()
+
+    def _on_task_done_cb(self, analysis):
+        self.task = None
+        self.model.analysis = analysis
+        self.gui.set_running(False)
+        self.gui.set_progress('')
+        self.show_results()
+
+    def _on_task_error_cb(self, error):
+        STATS.end_run()
+        self.task = None
+        self.model.discard()
+        self.model = None
+        self.gui.set_running(False)
+        self.gui.set_progress('PLIP failed! Check the Reply Log')
+        chimera.replyobj.error(error)
 
     def depict(self, binding_site):
-        interaction_set, viewer, view_data = self.interactions[binding_site]
-        for method in self._METHODS:
-            getattr(viewer, 'show_' + method)()
+        """
+        Show the interactions of `binding_site` and hide the rest.
+
+        Each site is drawn once, in its own pseudobond groups, which
+        are indexed by interaction type; afterwards, switching sites
+        only toggles the groups of the previous and the new site.
+        """
+        if binding_site not in self._depicted:
+            interaction_set, viewer, view_data = self.interactions[binding_site]
+            with STATS.timer('drawing'):
+                for method in self._METHODS:
+                    getattr(viewer, 'show_' + method)()
+            self._depicted[binding_site] = viewer.groups_by_interaction
+        if binding_site != self._current_site:
+            if self._current_site in self._depicted:
+                self._set_display(self._current_site, False)
+            self._set_display(binding_site, True)
+            self._current_site = binding_site
 
         self.focus_binding_site(binding_site)
+        if self.prefetch:
+            self._schedule_prefetch(binding_site)
+
+    def show_interaction(self, interaction, visible=True):
+        """
+        Show or hide one interaction type, now and in sites depicted later.
+        """
+        if visible:
+            self.hidden_interactions.discard(interaction)
+        else:
+            self.hidden_interactions.add(interaction)
+        if self._current_site in self._depicted:
+            for group in self._depicted[self._current_site].get(interaction, ()):
+                group.display = visible
+
+    def _set_display(self, binding_site, visible):
+        """
+        Toggle the groups of `binding_site`. Hidden interaction types are never shown.
+        """
+        for interaction, groups in self._depicted[binding_site].items():
+            display = visible and interaction not in self.hidden_interactions
+            for group in groups:
+                group.display = display
+
+    def _schedule_prefetch(self, binding_site):
+        """
+        Build the visualizer of the next site in the dropdown
+        while the user looks at the current one.
+        """
+        sites = sorted(self.binding_sites)
+        next_site = sites[(sites.index(binding_site) + 1) % len(sites)]
+        if self.interactions.cached(next_site):
+            return
+        self._cancel_prefetch()
+        widget = self.gui_results.uiMaster()
+
+        def prefetch():
+            self._prefetch_id = None
+            if self.model is not None:
+                self.interactions.prefetch(next_site)
+        self._prefetch_id = widget.after_idle(prefetch)
+
+    def _cancel_prefetch(self):
+        if self._prefetch_id is not None:
+            self.gui_results.uiMaster().after_cancel(self._prefetch_id)
+            self._prefetch_id = None
 
     def focus_binding_site(self, binding_site):
         resname, chain, resid = binding_site.split(':')
@@ -124,23 +238,19 @@ class Controller(object):
     def binding_sites(self):
         if self.model is None:
             raise ValueError("You must run .run() first!")
-        return self.model.complex.interaction_sets.keys()
+        return self.model.analysis.sites.keys()
 
     @property
     def interactions(self):
+        """
+        Mapping of binding site to ``(report, viewer, view_data)``,
+        built lazily site by site (see `SiteCache`).
+        """
         if self.model is None:
             raise ValueError("You must run .run() first!")
-        if self._interactions is not None:
-            return self._interactions
-
-        interactions = {}
-        for binding_site, interaction_set in self.model.complex.interaction_sets.items():
-            report = BindingSiteReport(interaction_set)
-            view_data = VisualizerData(self.model.complex, binding_site)
-            viewer = ChimeraVisualizer(view_data, chimera, self.molecule.id)
-            interactions[binding_site] = report, viewer, view_data
-        self._interactions = interactions
-        return interactions
+        if self._interactions is None:
+            self._interactions = SiteCache(self.model, maxsize=self.SITE_CACHE_SIZE)
+        return self._interactions
 
     def check(self):
         """
@@ -148,24 +258,22 @@ class Controller(object):
         """
         if not self.molecule:
             raise ValueError("No molecule selected")
+        if self.gui.interaction_types == []:
+            raise ValueError("No interaction types selected")
         return True
 
     def _on_close_cb(self, *args):
-
-
-        manager = self.model.molecule_copy.pseudoBondMgr()
-        for group in manager.pseudoBondGroups:
-            if group.category.rsplit('-', 1)[0] in self._PBNAMES_TO_METHODS:
-                manager.deletePseudoBondGroup(group)
-
-        self.model.molecule.display = True
-        chimera.openModels.remove(self.model.molecule_copy)
+        self._cancel_prefetch()
+        self._depicted.clear()
+        self._current_site = None
+        self.model.discard()
         self.gui_results.Close()
 
     def _on_save_cb(self, *args):
+        from tkFileDialog import asksaveasfilename
         path = asksaveasfilename(parent=self.gui_results.canvas)
         with open(path, 'w') as f:
-            lines = self.model.report().txtreport
+            lines = self.model.report()
             for i, line in enumerate(lines):
                 line = line.strip()
                 if line.startswith('**') and line.endswith('**'):
@@ -175,35 +283,116 @@ class Controller(object):
         chimera.statusline.show_message('Report written to {}'.format(path),
                                         blankAfter=5)
 
+class SiteCache(object):
+
+    """
+    Lazy mapping of binding site to ``(report, viewer, view_data)``.
+
+    The visualizer of a site is only built when the site is first
+    requested, and only the `maxsize` most recently used are kept.
+    Evicting one is harmless: whatever it drew stays in Chimera.
+    """
+
+    def __init__(self, model, maxsize=8):
+        self.model = model
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+
+    def __getitem__(self, site):
+        try:
+            value = self._cache.pop(site)
+        except KeyError:
+            from plipgui.plip4chimera import Visualizer
+            report, view_data = self.model.analysis.sites[site]
+            with STATS.timer('visualizer'):
+                viewer = Visualizer(view_data, self.model.target, self.model.atoms, site=site)
+            value = report, viewer, view_data
+        self._cache[site] = value
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return value
+
+    def __contains__(self, site):
+        return site in self.model.analysis.sites
+
+    def __len__(self):
+        return len(self.model.analysis.sites)
+
+    def keys(self):
+        return self.model.analysis.sites.keys()
+
+    def cached(self, site):
+        return site in self._cache
+
+    def prefetch(self, site):
+        if site not in self._cache:
+            self[site]
+
+
 class Model(object):
 
 
-    def __init__(self, molecule, *args, **kwargs):
+    def __init__(self, molecule, cache=True, copy=True, pocket=None, types=None, backend=None,
+                 run=True, *args, **kwargs):
         self.molecule = molecule
         self.molecule_copy = None
-        self.complex = None
-        self.run()
+        self.atoms = None
+        self.analysis = None
+        self.cache = cache
+        self.copy = copy
+        self.pocket = pocket
+        self.types = types
+        self.backend = backend
+        if run:
+            self.run()
 
     def run(self):
-        stream = self._patch_molecule()
-        pdbcomplex = PDBComplex()
-        pdbcomplex.load_pdb(stream.getvalue(), as_string=True)
-        pdbcomplex.analyze()
-        pdbcomplex.sourcefiles['filename'] = '/dev/null'
-        stream.close()
-        self.complex = pdbcomplex
+        from plipgui.plip4chimera import analyze_with_plip
+        self.analysis = analyze_with_plip(self.prepare(), cache=self.cache, types=self.types,
+                                          backend=self.backend)
+
+    @property
+    def target(self):
+        """
+        Molecule the interactions are drawn on
+        """
+        return self.molecule_copy if self.copy else self.molecule
+
+    def prepare(self):
+        """
+        Create the PLIP copy of the molecule (if requested) and return
+        the PDB contents that must be analyzed.
+        """
+        return self._patch_molecule()
+
+    def discard(self):
+        """
+        Remove the PLIP copy or the depicted interactions,
+        and show the original molecule again
+        """
+        if self.atoms is not None:
+            from plipgui.plip4chimera import registry
+            registry.teardown([self.target])
+        self.molecule.display = True
+        self.atoms = None
+        self.molecule_copy = None
 
     def report(self):
-        if self.complex is not None:
-            return StructureReport(self.complex)
+        """
+        Lines of the PLIP text report (a copy; callers may edit it)
+        """
+        if self.analysis is not None:
+            return list(self.analysis.txtreport)
 
     def _patch_molecule(self):
         # Create copies of original models in Chimera &
         # Patch molecule names to work with PLIP
-        self.molecule_copy, stream = _duplicate_molecule(self.molecule)
-        self.molecule_copy.name = 'PLIP-{}'.format(self.molecule.id)
-        self.molecule.display = False
-        return stream
+        from plipgui.plip4chimera import prepare_molecule
+        pdb, target, self.atoms = prepare_molecule(self.molecule, copy=self.copy,
+                                                   pocket=self.pocket)
+        if self.copy:
+            self.molecule_copy = target
+        return pdb
 
 
 ###########
@@ -211,42 +400,127 @@ class Model(object):
 ###########
 
 
-def _duplicate_molecule(molecule):
-    """
-    Export a PDB copy of the given molecule to a StringIO object
-    and load it back. We use this instead of Molecule.copy_molecule
-    because PLIP gets the very same PDB copy, and sometimes this
-    results in different serial numbers
-    """
-    stream = StringIO()
-    chimera.pdbWrite([molecule], molecule.openState.xform, stream)
-    stream.seek(0)
-    pdb = chimera.PDBio()
-    molcopy, _ = pdb.readPDBstream(stream, '{}.pdb'.format(molecule.name), 0)
-    chimera.openModels.add(molcopy, sameAs=molecule)
-    return molcopy[0], stream
-
-
-def cmd_plip(selection, report=True):
+def cmd_plip(selection, report=True, cache=True, processes=None, copy=True, pocket=None,
+             types=None, profile=None, backend=None):
     from plipgui.plip4chimera import do as do_plip
+    from plipgui.profiling import Profile, profile_path
     molecules = selection.molecules()
-    interactions, reporter = do_plip(molecules)
-    msg = 'Analyzed {} interaction sets!'.format(len(interactions.keys()))
-    if report in (True, 'stdout'):
-        reporter.write_txt(as_string=True)
-    elif report.lower in ('replylog', 'log', 'reply'):
-        chimera.replyobj.info(''.join(reporter.txtreport))
+    profile = profile_path(profile)
+    profiler = None
+    if profile is not None:
+        profiler = Profile(profile)
+        # Pool and persistent workers would escape the profiler
+        processes, backend = 1, 'local'
+    STATS.begin_run(command='plip', models=len(molecules))
+    try:
+        with profiler or ignored():
+            results = do_plip(molecules, cache=cache, processes=processes, copy=copy,
+                              pocket=pocket, residues=selection.residues(), types=types,
+                              backend=backend)
+    finally:
+        STATS.end_run()
+    if profiler is not None:
+        chimera.replyobj.info(profiler.report())
+    n_sites = sum(len(interactions) for (_, (interactions, _)) in results)
+    msg = 'Analyzed {} interaction sets in {} model(s)!'.format(n_sites, len(results))
+    text = _combined_report(results)
+    # The Reply Log by default: the Chimera GUI does not show stdout
+    if report is True or report.lower() in ('replylog', 'log', 'reply'):
+        chimera.replyobj.info(text + '\n')
         chimera.replyobj.status(msg)
+    elif report.lower() == 'stdout':
+        print(text)
     elif report:
         with open(report, 'w') as f:
-            f.write(''.join(reporter.txtreport))
+            f.write(text)
 
     chimera.statusline.show_message(msg, blankAfter=5)
 
 
-def cmd_unplip(*args):
-    from plipgui.plip4chimera import undo
-    undo()
+def _combined_report(results):
+    if len(results) == 1:
+        (_, (_, analysis)), = results
+        return '\n'.join(analysis.txtreport)
+    sections = []
+    for molecule, (_, analysis) in results:
+        header = '{} {} ({})'.format('=' * 8, molecule.name, molecule.oslIdent())
+        sections.append('\n'.join([header.ljust(80, '=')] + analysis.txtreport))
+    return '\n\n'.join(sections)
+
+
+def cmd_pliptraj(selection, output, start=None, end=None, stride=1, processes=None,
+                 pocket=None, types=None, backend=None, depict=True, occupancy=0.1,
+                 tolerance=0.0):
+    """
+    Analyze the frames of the trajectory (ensemble or MD Movie) of the
+    selected model and write their interactions to `output`, as JSON lines.
+
+    The occupancy of each contact is written next to it (``.occupancy.tsv``)
+    and, if `depict` is True, contacts present in at least `occupancy` of
+    the frames are drawn on a PLIP copy of the model. Frames whose pocket
+    is within `tolerance` RMSD (A) of a recently analyzed frame reuse its
+    interactions; with 0, only identical pockets do.
+    """
+    from plipgui.occupancy import OccupancyAggregator, depict_occupancy
+    from plipgui.reuse import FrameReuse
+    from plipgui.trajectory import analyze_trajectory
+    molecules = selection.molecules()
+    if len(molecules) != 1:
+        raise MidasError('Select a single model (got {}).'.format(len(molecules)))
+    molecule, = molecules
+
+    def progress(done, total):
+        chimera.statusline.show_message('PLIP trajectory: {} of {} frames'.format(done, total))
+
+    aggregator = OccupancyAggregator()
+    STATS.begin_run(command='pliptraj', models=1)
+    try:
+        reuse = FrameReuse(tolerance=float(tolerance))
+        analyzed, failed, interactions = analyze_trajectory(
+            molecule, output, start=start, end=end, stride=stride, processes=processes,
+            pocket=pocket, residues=selection.residues(), types=types, backend=backend,
+            progress=progress, aggregator=aggregator, reuse=reuse)
+    except ValueError as e:
+        raise MidasError(str(e))
+    finally:
+        STATS.end_run()
+    summary = os.path.splitext(os.path.expanduser(output))[0] + '.occupancy.tsv'
+    aggregator.write_tsv(summary)
+    msg = 'Found {} interactions in {} frames of {}'.format(interactions, analyzed,
+                                                          molecule.name)
+    if failed:
+        msg += ' ({} frames failed, see {})'.format(failed, output)
+    msg += '; {} of {} frames ({:.0%}) reused the results of a similar frame'.format(
+        reuse.reused, reuse.checked, reuse.ratio)
+    if depict and aggregator.frames:
+        _, drawn = depict_occupancy(aggregator, molecule, min_occupancy=float(occupancy))
+        msg += '; {} contacts in at least {:.0%} of them depicted'.format(drawn,
+                                                                          float(occupancy))
+    msg += '. Occupancies written to {}'.format(summary)
+    chimera.replyobj.status(msg)
+    chimera.statusline.show_message(msg, blankAfter=5)
+
+
+def cmd_plipstats(reset=False, log=None):
+    """
+    Show the timing statistics of this session in the Reply Log. `log`
+    sets the file where one JSON line per run is appended (``off`` stops it).
+    """
+    if log is not None:
+        STATS.log_path = None if log.lower() in ('off', 'none', 'false') else log
+    chimera.replyobj.info(STATS.report() + '\n')
+    chimera.replyobj.status('PLIP statistics written to the Reply Log')
+    if reset:
+        STATS.reset()
+
+
+def cmd_unplip(selection=None):
+    if 'plipgui.plip4chimera' in sys.modules:
+        from plipgui.plip4chimera import undo
+        n = undo(selection.molecules() if selection is not None else None)
+    else:  # Nothing can have been drawn yet; don't load PLIP to find out
+        n = 0
+    chimera.statusline.show_message('Removed {} PLIP depiction(s)'.format(n), blankAfter=5)
 
 
 @contextlib.contextmanager
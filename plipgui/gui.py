@@ -4,6 +4,7 @@
 
 from __future__ import print_function, division
 # Python stdlib
+import sys
 import Tkinter as tk
 from Pmw import OptionMenu
 from operator import itemgetter
@@ -16,6 +17,14 @@ from chimera.widgets import MoleculeScrolledListBox, SortableTable
 # Own
 from libtangram.ui import TangramBaseDialog
 from core import Controller
+from plip4chimera import POCKET_RADIUS, INTERACTIONS, DEFAULT_BACKEND
+from widgets import VirtualTable
+from stats import STATS
+
+
+#: Choices of the backend menu
+BACKEND_LABELS = (('local', 'in Chimera'), ('worker', 'in a persistent process'),
+                  ('remote', 'on the analysis server'))
 
 
 ui = None
@@ -25,13 +34,13 @@ def showUI():
     global ui
     if not ui:
         ui = PLIPInputDialog()
-    _ = Controller(gui=ui)
+    ui.controller = Controller(gui=ui)
     ui.enter()
 
 
 class PLIPInputDialog(TangramBaseDialog):
 
-    buttons = ('Run', 'Close')
+    buttons = ('Run', 'Cancel', 'Close')
 
     def __init__(self, *args, **kwargs):
         # GUI init
@@ -50,6 +59,89 @@ class PLIPInputDialog(TangramBaseDialog):
 
         input_frame.pack(padx=5, pady=5, expand=True, fill='both')
 
+        # Background runs use plipgui.worker, whose pipes need close_fds (not on Windows)
+        self.background = tk.IntVar()
+        self.background.set(sys.platform != 'win32')
+        self.ui_background = tk.Checkbutton(self.canvas, text='Run in background',
+                                            variable=self.background)
+        self.ui_background.pack(padx=5, anchor='w')
+
+        # A persistent process keeps PLIP loaded between runs, and its crashes out of Chimera
+        self.ui_backend = OptionMenu(self.canvas, labelpos='w', label_text='Run PLIP',
+                                     items=[label for (_, label) in BACKEND_LABELS],
+                                     initialitem=dict(BACKEND_LABELS)[DEFAULT_BACKEND])
+        self.ui_backend.pack(padx=5, anchor='w')
+
+        # Drawing on the original saves a full copy of big assemblies
+        self.use_copy = tk.IntVar()
+        self.use_copy.set(1)
+        self.ui_use_copy = tk.Checkbutton(self.canvas, text='Depict on a copy of the molecule',
+                                          variable=self.use_copy)
+        self.ui_use_copy.pack(padx=5, anchor='w')
+
+        pocket_frame = tk.Frame(self.canvas)
+        self.use_pocket = tk.IntVar()
+        self.ui_use_pocket = tk.Checkbutton(pocket_frame, variable=self.use_pocket,
+                                            text='Only analyze residues within')
+        self.ui_pocket_radius = tk.Spinbox(pocket_frame, from_=8, to=30, increment=0.5,
+                                           width=5)
+        self.ui_pocket_radius.delete(0, 'end')
+        self.ui_pocket_radius.insert(0, POCKET_RADIUS)
+        self.ui_use_pocket.pack(side='left')
+        self.ui_pocket_radius.pack(side='left')
+        tk.Label(pocket_frame, text=u'\N{ANGSTROM SIGN} of ligands').pack(side='left')
+        pocket_frame.pack(padx=5, anchor='w')
+
+        # Unchecked types are not computed at all
+        types_frame = tk.LabelFrame(self.canvas, text='Interactions to detect')
+        self.types = {}
+        for i, interaction in enumerate(INTERACTIONS):
+            var = self.types[interaction] = tk.IntVar()
+            var.set(1)
+            tk.Checkbutton(types_frame, text=interaction.title(),
+                           variable=var).grid(row=i // 4, column=i % 4, sticky='w')
+        types_frame.pack(padx=5, pady=5, fill='x')
+
+        # Profiling always runs in the foreground
+        self.profile = tk.IntVar()
+        self.ui_profile = tk.Checkbutton(self.canvas, variable=self.profile,
+                                         text='Profile the run (report in the Reply Log)')
+        self.ui_profile.pack(padx=5, anchor='w')
+
+        self._progress = tk.StringVar()
+        self.ui_progress = tk.Label(self.canvas, textvariable=self._progress)
+        self.ui_progress.pack(padx=5, pady=5, anchor='w')
+
+    @property
+    def pocket(self):
+        """
+        Radius of the exported shell around ligands, or None for the whole molecule
+        """
+        if self.use_pocket.get():
+            return float(self.ui_pocket_radius.get())
+
+    @property
+    def backend(self):
+        labels = dict((label, backend) for (backend, label) in BACKEND_LABELS)
+        return labels[self.ui_backend.getvalue()]
+
+    @property
+    def interaction_types(self):
+        """
+        Checked interaction types, or None if all of them are
+        """
+        types = [t for t in INTERACTIONS if self.types[t].get()]
+        if len(types) < len(INTERACTIONS):
+            return types
+
+    def set_progress(self, stage):
+        self._progress.set(stage)
+        self.ui_progress.update_idletasks()
+
+    def set_running(self, running):
+        self.buttonWidgets['Run'].configure(state='disabled' if running else 'normal')
+        self.buttonWidgets['Cancel'].configure(state='normal' if running else 'disabled')
+
     def Apply(self):
         pass
 
@@ -57,9 +149,14 @@ class PLIPInputDialog(TangramBaseDialog):
         self.Apply()
         self.Close()
 
+    def Cancel(self):
+        if self.controller is not None:
+            self.controller.cancel()
+
     def Close(self):
         global ui
         ui = None
+        self.Cancel()
         super(PLIPInputDialog, self).Close()
 
     def load_controller(self):
@@ -69,6 +166,8 @@ class PLIPInputDialog(TangramBaseDialog):
 class PLIPResultsDialog(TangramBaseDialog):
 
     buttons = ('Save', 'Close')
+    # Above this many rows, SortableTable (one Tk row per record) gets too slow
+    VIRTUAL_ROWS = 200
 
     def __init__(self, molecule=None, controller=None, *args, **kwargs):
         self.molecule = molecule
@@ -92,6 +191,8 @@ class PLIPResultsDialog(TangramBaseDialog):
 
         self.ui_tables_frame = tk.LabelFrame(self.canvas, text='Found interactions')
         self.tables = {}
+        self._created_tables = {}
+        self._checkboxes = {}
 
     def fillInData(self, binding_sites):
         binding_sites.sort()
@@ -99,54 +200,79 @@ class PLIPResultsDialog(TangramBaseDialog):
         self._binding_site.set(binding_sites[0])
         self._binding_site_cb(binding_sites[0])
 
-    def _clear_tables(self):
-        for table in self.tables.values():
-            table.label.destroy()
-            del table.checked
-            table.destroy()
-        self.tables.clear()
-
     def _binding_site_cb(self, binding_site):
-        self._clear_tables()
+        """
+        Show the tables of `binding_site`. There is one table per
+        interaction type and kind (plain or virtual, depending on the
+        number of rows), created the first time it is needed; later
+        switches only swap their data.
+        """
         report = self.controller.interactions[binding_site][0]
+        for table in self._created_tables.values():
+            table.label.pack_forget()
+            table.pack_forget()
+        self.tables.clear()
+        with STATS.timer('tables'):
+            for interaction in self.controller._INTERACTIONS:
+                info = getattr(report, interaction + '_info', None)
+                if not info:
+                    continue
+                virtual = len(info) > self.VIRTUAL_ROWS
+                t = self._created_tables.get((interaction, virtual))
+                if t is None:
+                    t = self._create_table(interaction,
+                                           getattr(report, interaction + '_features'),
+                                           info, virtual=virtual)
+                else:
+                    t.setData(info)
+                self.tables[interaction] = t
+                t.label.pack()
+                t.pack(expand=True, fill='both', padx=5, pady=5)
+
+        self.ui_tables_frame.pack(expand=True, fill='both', padx=5, pady=5)
+        self.controller.depict(binding_site)
+
+    def _create_table(self, interaction, features, info, virtual=False):
+        if virtual:
+            t = VirtualTable(self.ui_tables_frame, features)
+            t.setData(info)
+        else:
+            t = self._create_sortable_table(features, info)
+        self._created_tables[interaction, virtual] = t
+        # Both kinds of table share the checkbox of their interaction type
+        if interaction not in self._checkboxes:
+            checked = tk.IntVar()
+            checked.set(1)
+            label = tk.Checkbutton(self.ui_tables_frame, text=interaction.title(),
+                                   variable=checked,
+                                   command=lambda: self._on_checkbox_cb(interaction))
+            self._checkboxes[interaction] = checked, label
+        t.checked, t.label = self._checkboxes[interaction]
+        return t
+
+    def _create_sortable_table(self, features, info):
         kw = {'headerAnchor': 'center',
               'font': ('Courier', 10),
               'anchor': 'e',
               'format': '%s',
               'refresh': False}
-        for interaction in self.controller._INTERACTIONS:
-            info = getattr(report, interaction + '_info', None)
-            if not info:
-                continue
-            t = self.tables[interaction] = SortableTable(self.ui_tables_frame)
-            t.checked = tk.IntVar()
-            t.checked.set(1)
-            t.label = tk.Checkbutton(self.ui_tables_frame, text=interaction.title(),
-                                     variable=t.checked, command=self._on_checkbox_cb)
-            t.label.pack()
-
-            # Add columns
-            for i, header in enumerate(getattr(report, interaction + '_features')):
-                t.addColumn(header, _itemgetter(i), **kw)
-            # Populate table data
-            t.setData(info)
-            try:
-                t.launch(selectMode='single')
-            except tk.TclError:
-                t.refresh(rebuild=True)
-            t.pack(expand=True, fill='both', padx=5, pady=5)
-            self.canvas.after(500, t.requestFullWidth)
-
-        self.ui_tables_frame.pack(expand=True, fill='both', padx=5, pady=5)
-        self.controller.depict(binding_site)
-
-    def _on_checkbox_cb(self, *args):
-        mgr = self.controller.model.molecule_copy.pseudoBondMgr()
-        for title, table in self.tables.items():
-            key = self.controller._INTERACTIONS_TO_PBNAMES[title.lower()]
-            for name, pbgroup in mgr.pseudoBondGroupsMap.items():
-                if name.lower().startswith(key.lower()):
-                    pbgroup.display = True if table.checked.get() else False
+        t = SortableTable(self.ui_tables_frame)
+        # Add columns
+        for i, header in enumerate(features):
+            t.addColumn(header, _itemgetter(i), **kw)
+        # Populate table data
+        t.setData(info)
+        try:
+            t.launch(selectMode='single')
+        except tk.TclError:
+            t.refresh(rebuild=True)
+        # Columns are fixed per interaction type, so widths only need one pass
+        self.canvas.after(500, t.requestFullWidth)
+        return t
+
+    def _on_checkbox_cb(self, interaction):
+        checked = self._checkboxes[interaction][0]
+        self.controller.show_interaction(interaction, bool(checked.get()))
 
 
 def _itemgetter(i):
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Interaction occupancy over a trajectory, computed online.
+
+`OccupancyAggregator` is fed the `Analysis` of one frame at a time and
+only keeps, for each distinct contact, how many frames it was found in and
+running statistics of its distance, so memory depends on the number of
+different contacts and not on the number of frames.
+"""
+
+from __future__ import print_function, division
+# Python stdlib
+from collections import defaultdict, namedtuple
+import math
+# Own
+from plipgui.analysis import INTERACTIONS
+
+
+#: Column holding the distance of each interaction type (DIST by default)
+DISTANCE_COLUMNS = {'hbond': 'DIST_D-A', 'waterbridge': 'DIST_A-W', 'pistacking': 'CENTDIST'}
+#: Atom index columns left out of contact identities: bridging waters exchange
+TRANSIENT_COLUMNS = ('WATER_IDX', 'WATERIDX')
+#: Pseudobond color of each interaction type in `depict_occupancy`
+COLORS = {'hbond': 'blue', 'hydrophobic': 'gray', 'waterbridge': 'cornflower blue',
+          'saltbridge': 'yellow', 'pistacking': 'forest green', 'pication': 'orange',
+          'halogen': 'cyan', 'metal': 'magenta'}
+
+#: Identity of a contact across frames. `residue` and `ligand` are
+#: ``(chain, number, name)``; `atoms` are the identities of the atoms in
+#: its index columns (or their serial numbers, if no table is given).
+Contact = namedtuple('Contact', 'site type residue ligand atoms')
+
+
+class ContactStats(object):
+
+    """
+    Frames in which a contact was found, and its distance statistics,
+    updated with Welford's algorithm
+    """
+
+    __slots__ = ('count', 'samples', 'mean', 'm2', 'min', 'max', '_frame')
+
+    def __init__(self):
+        self.count, self.samples, self.mean, self.m2 = 0, 0, 0.0, 0.0
+        self.min = self.max = self._frame = None
+
+    def add(self, frame, distance=None):
+        if frame != self._frame:  # a contact counts once per frame
+            self._frame = frame
+            self.count += 1
+        if distance is None:
+            return
+        self.samples += 1
+        delta = distance - self.mean
+        self.mean += delta / self.samples
+        self.m2 += delta * (distance - self.mean)
+        self.min = distance if self.min is None else min(self.min, distance)
+        self.max = distance if self.max is None else max(self.max, distance)
+
+    @property
+    def std(self):
+        if self.samples > 1:
+            return math.sqrt(self.m2 / (self.samples - 1))
+        return 0.0 if self.samples else None
+
+
+class OccupancyAggregator(object):
+
+    """
+    Occupancy of every contact in the frames fed with `add`.
+
+    The occupancy of a contact is the fraction of those frames in which
+    it was found. Contacts are told apart by binding site, interaction
+    type, protein and ligand residues and the atoms involved.
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.contacts = {}
+
+    def add(self, frame, analysis, atoms=None):
+        """
+        Account for the `Analysis` of `frame`. `atoms` maps the serial
+        numbers of that frame's export to atom identities, which keeps
+        contacts apart when serials change between frames (pocket mode).
+        """
+        self.frames += 1
+        for site, (report, _) in analysis.sites.items():
+            for interaction in INTERACTIONS:
+                features = getattr(report, interaction + '_features', ())
+                for row in getattr(report, interaction + '_info', ()):
+                    self.add_contact(frame, site, interaction, dict(zip(features, row)), atoms)
+
+    def add_contact(self, frame, site, interaction, record, atoms=None):
+        """
+        Account for one row (as a column -> value dict) of a PLIP table
+        """
+        key = contact_key(site, interaction, record, atoms)
+        stats = self.contacts.get(key)
+        if stats is None:
+            stats = self.contacts[key] = ContactStats()
+        column = DISTANCE_COLUMNS.get(interaction, 'DIST')
+        distance = record.get(column)
+        stats.add(frame, float(distance) if distance is not None else None)
+
+    def occupancy(self, contact):
+        return self.contacts[contact].count / self.frames if self.frames else 0.0
+
+    def summary(self, min_occupancy=0.0):
+        """
+        ``(contact, occupancy, stats)`` for the contacts with at least
+        `min_occupancy`, most frequent first
+        """
+        rows = [(contact, self.occupancy(contact), stats)
+                for contact, stats in self.contacts.items()]
+        rows = [row for row in rows if row[1] >= min_occupancy]
+        rows.sort(key=lambda row: (-row[1], row[0].site, row[0].type, row[0].residue))
+        return rows
+
+    def write_tsv(self, path, min_occupancy=0.0):
+        columns = ('site', 'type', 'residue', 'ligand', 'atoms', 'occupancy', 'frames',
+                   'mean_dist', 'std_dist', 'min_dist', 'max_dist')
+        with open(path, 'w') as f:
+            f.write('\t'.join(columns) + '\n')
+            for contact, occupancy, stats in self.summary(min_occupancy):
+                values = (contact.site, contact.type, _residue_text(contact.residue),
+                          _residue_text(contact.ligand),
+                          ','.join(_atom_text(a) for a in contact.atoms),
+                          '{:.4f}'.format(occupancy), stats.count) + tuple(
+                          '' if v is None else '{:.3f}'.format(v)
+                          for v in (stats.mean if stats.samples else None, stats.std,
+                                    stats.min, stats.max))
+                f.write('\t'.join(str(v) for v in values) + '\n')
+
+
+def contact_key(site, interaction, record, atoms=None):
+    """
+    `Contact` of a PLIP table row. Serial numbers in its ``*IDX*`` columns
+    are replaced by their entry in `atoms`, if given.
+    """
+    residue = tuple(record.get(c) for c in ('RESCHAIN', 'RESNR', 'RESTYPE'))
+    ligand = tuple(record.get(c) for c in ('RESCHAIN_LIG', 'RESNR_LIG', 'RESTYPE_LIG'))
+    serials = set()
+    for column, value in record.items():
+        if 'IDX' in column and column not in TRANSIENT_COLUMNS:
+            serials.update(_serials(value))
+    if atoms is not None:
+        serials = (atoms.get(serial, serial) for serial in serials)
+    return Contact(site, interaction, residue, ligand, tuple(sorted(serials)))
+
+
+def depict_occupancy(aggregator, molecule, min_occupancy=0.1):
+    """
+    Draw the contacts of `aggregator` with at least `min_occupancy` on a new
+    PLIP copy of `molecule`: one stick pseudobond per contact, between its
+    closest protein and ligand atoms, as thick as its occupancy and labeled
+    with it. Returns the copy and the number of pseudobonds.
+    """
+    import chimera
+    from plipgui.plip4chimera import copy_molecule, registry, model_tag, _atom_identity
+    target = copy_molecule(molecule)
+    by_identity, by_residue = {}, defaultdict(list)
+    for atom in target.atoms:
+        by_identity[_atom_identity(atom)] = atom
+        rid = atom.residue.id
+        by_residue[rid.chainId, rid.position].append(atom)
+    groups, drawn = {}, 0
+    for contact, occupancy, _ in aggregator.summary(min_occupancy):
+        ends = _endpoints(contact, by_identity, by_residue)
+        if ends is None:
+            continue
+        group = groups.get(contact.type)
+        if group is None:
+            name = 'PLIP occupancy {}-{}'.format(contact.type, model_tag(target))
+            group = groups[contact.type] = chimera.misc.getPseudoBondGroup(
+                name, associateWith=[target])
+            group.color = chimera.colorTable.getColorByName(COLORS.get(contact.type, 'white'))
+            registry.add_group(target, group)
+        pseudobond = group.newPseudoBond(*ends)
+        pseudobond.drawMode = chimera.Bond.Stick
+        pseudobond.radius = 0.03 + 0.22 * occupancy
+        pseudobond.label = '{:.0%}'.format(occupancy)
+        drawn += 1
+    return target, drawn
+
+
+def _endpoints(contact, by_identity, by_residue):
+    """
+    Closest pair of protein and ligand atoms of `contact`. Sides without
+    known atoms (e.g. the protein in salt bridges) use their whole residue.
+    """
+    ligand_key = contact.ligand[0], _int(contact.ligand[1])
+    residue_key = contact.residue[0], _int(contact.residue[1])
+    atoms = [by_identity[a] for a in contact.atoms if a in by_identity]
+    ligand = [a for a in atoms if (a.residue.id.chainId, a.residue.id.position) == ligand_key]
+    protein = [a for a in atoms if a not in ligand]
+    ligand = ligand or by_residue.get(ligand_key)
+    protein = protein or by_residue.get(residue_key)
+    if not ligand or not protein:
+        return None
+    pairs = [(_distance2(a.coord(), b.coord()), a, b) for a in protein for b in ligand]
+    _, a, b = min(pairs, key=lambda pair: pair[0])
+    return a, b
+
+
+def _serials(value):
+    if isinstance(value, basestring):
+        return [int(v) for v in value.replace(',', ' ').split()]
+    if isinstance(value, (list, tuple, set)):
+        return [int(v) for v in value]
+    return [int(value)]
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _distance2(a, b):
+    return (a.x - b.x) ** 2 + (a.y - b.y) ** 2 + (a.z - b.z) ** 2
+
+
+def _residue_text(residue):
+    chain, number, name = residue
+    return '{}{}.{}'.format(name or '', number if number is not None else '', chain or '')
+
+
+def _atom_text(atom):
+    if isinstance(atom, tuple):
+        chain, position, insertion, name, altloc = atom
+        return '{}{}.{}@{}{}'.format(position, (insertion or '').strip(), chain, name,
+                                     '.' + altloc if altloc else '')
+    return str(atom)
@@ -5,125 +5,538 @@
 A functional wrapper for UCSF Chimera & PLIP
 """
 
-import sys
+from collections import defaultdict
 from cStringIO import StringIO
 
 
-class Mock(object):
+import chimera
+# The Chimera-free part of the pipeline, re-exported for compatibility
+from plipgui.analysis import (INTERACTIONS, DETECTORS, BACKENDS, DEFAULT_BACKEND, SiteReport,
+                              Analysis, analyze_with_plip, plip_complex, analyze_many,
+                              interaction_types, only_interactions, config_snapshot,
+                              plip_config)
+from plip.modules.chimeraplip import ChimeraVisualizer
+from plipgui.stats import STATS
+
+#: Pseudobond group names used by ChimeraVisualizer, in the same order
+PBNAMES = ('Water Bridges', 'Salt Bridges', 'Hydrophobic Interactions',
+           'HalogenBonds', 'pi-Stacking', 'Hydrogen Bonds', 'Metal Coordination',
+           'Cation-Pi')
+PBNAMES_TO_INTERACTIONS = dict(zip(PBNAMES, INTERACTIONS))
+#: Residue names treated as solvent when looking for ligands
+WATERS = ('HOH', 'WAT', 'H2O', 'DOD', 'TIP', 'TIP3', 'SOL')
+#: Default radius (A) of the shell exported in pocket-only mode
+POCKET_RADIUS = 12.0
+
+
+class Depiction(object):
+
+    """
+    Objects created to show the PLIP results of `molecule` on `target`,
+    which is either its PLIP copy or `molecule` itself.
+    """
+
+    def __init__(self, molecule, target):
+        self.molecule = molecule
+        self.target = target
+        self.groups = []
+
+    @property
+    def is_copy(self):
+        return self.target is not self.molecule
+
+
+class Registry(object):
 
-    def __init__(self, *args, **kwargs):
-        pass
+    """
+    Every `Depiction` created by this extension, indexed by target model.
 
-    def __call__(self, *args, **kwargs):
-        return Mock()
+    Objects are recorded when they are created, so tearing them down
+    never scans the open models or the pseudobond managers: it costs the
+    same with hundreds of models open, and objects of other tools are
+    never touched.
+    """
 
-    @classmethod
-    def __getattr__(cls, name):
-        if name in ('__file__', '__path__'):
-            return '.',
-        elif name == '__all__':
-            return []
-        elif name[0] == name[0].upper():
-            mockType = type(name, (), {})
-            mockType.__module__ = __name__
-            return mockType
+    def __init__(self):
+        self._depictions = {}
+
+    def __contains__(self, molecule):
+        """
+        Whether `molecule` is depicted, or is the target of a depiction
+        """
+        return any(molecule in (d.molecule, d.target) for d in self._depictions.values())
+
+    def __len__(self):
+        return len(self._depictions)
+
+    def register(self, molecule, target):
+        depiction = self._depictions[target] = Depiction(molecule, target)
+        return depiction
+
+    def add_group(self, target, group):
+        depiction = self._depictions.get(target)
+        if depiction is not None:
+            depiction.groups.append(group)
+
+    def teardown(self, molecules=None):
+        """
+        Remove the depictions of `molecules` (originals or their copies;
+        all of them by default) and show the original molecules again.
+        Returns the number of depictions removed.
+        """
+        if molecules is None:
+            depictions = list(self._depictions.values())
         else:
-            return Mock()
+            molecules = set(molecules)
+            depictions = [d for d in self._depictions.values()
+                          if d.molecule in molecules or d.target in molecules]
+        if not depictions:
+            return 0
+        manager = chimera.PseudoBondMgr.mgr()
+        copies = []
+        for depiction in depictions:
+            del self._depictions[depiction.target]
+            for group in depiction.groups:
+                if not group.__destroyed__:
+                    manager.deletePseudoBondGroup(group)
+            if depiction.target.__destroyed__:
+                continue
+            if depiction.is_copy:
+                copies.append(depiction.target)
+            else:
+                _remove_pseudoatoms(depiction.target)
+            if not depiction.molecule.__destroyed__:
+                depiction.molecule.display = True
+        if copies:
+            chimera.openModels.close(copies)
+        chimera.viewer.updateCB(chimera.viewer)
+        return len(depictions)
 
-    def __getitem__(self, *args, **kwargs):
-        return
 
-    def __setitem__(self, *args, **kwargs):
-        return
+#: Depictions created in this session
+registry = Registry()
 
 
-# Patch unneeded PLIP dependencies
-MOCK_MODULES = ('pymol',)
-sys.modules.update((mod_name, Mock()) for mod_name in MOCK_MODULES)
+class Visualizer(ChimeraVisualizer):
 
+    """
+    ChimeraVisualizer bound to a given model.
 
-import chimera
-from plip.modules.preparation import PDBComplex
-from plip.modules.chimeraplip import ChimeraVisualizer
-from plip.modules.plipremote import VisualizerData
-from plip.modules.report import StructureReport
-from plip.modules import config as plip_config
-plip_config.PLUGIN_MODE = True
-
-
-def export_temporary_pdbstream(molecule):
-    temp = StringIO()
-    chimera.pdbWrite([molecule], molecule.openState.xform, temp)
-    temp.seek(0)
-    return temp
-
-
-def analyze_with_plip(pdb):
-    pdbcomplex = PDBComplex()
-    pdbcomplex.load_pdb(pdb, as_string=True)
-    pdbcomplex.analyze()
-    pdbcomplex.sourcefiles['filename'] = '/dev/null'
-    return pdbcomplex
-
-
-def patch_molecule(molecule):
-    # Create copies of original models in Chimera &
-    # Patch molecule names to work with PLIP
-    stream = export_temporary_pdbstream(molecule)
-    pdb = chimera.PDBio()
-    molcopy, _ = pdb.readPDBstream(stream, '{}.pdb'.format(molecule.name), 0)
-    chimera.openModels.add(molcopy, sameAs=molecule)
-    molcopy, = molcopy
-    molcopy.name = 'PLIP-{}'.format(molecule.id)
-    molecule.display = False
-    return stream, molcopy
+    PLIP looks the model up by its ``PLIP-<id>`` name, which is ambiguous
+    when several models share the same id (e.g. docking poses opened as
+    #0.1, #0.2...). Pseudobond groups are also named after the full model
+    id, so each model gets its own set.
+
+    `atoms` maps PLIP serial numbers to atoms of `model`. Pass the table
+    from `prepare_molecule` to share it between binding sites, or to draw
+    on a model whose own serial numbers differ from PLIP's.
+
+    If `site` is given, its interactions get their own pseudobond groups,
+    so each binding site can be shown or hidden separately. All the groups
+    used by this visualizer are listed in `groups`, and indexed by
+    interaction type in `groups_by_interaction`. Groups drawn on a
+    registered target are also recorded in the `registry`.
+
+    ChimeraVisualizer stores ``chimera.misc.getPseudoBondGroup`` as an
+    instance attribute, which would hide the method below, so it is
+    removed once the base class is initialized.
+    """
+
+    def __init__(self, plcomplex, model, atoms=None, site=None):
+        self._model = model
+        self._atoms = atoms
+        self._tag = model_tag(model)
+        self.site = site
+        self.groups = []
+        self.groups_by_interaction = defaultdict(list)
+        ChimeraVisualizer.__init__(self, plcomplex, chimera, model.id)
+        vars(self).pop('getPseudoBondGroup', None)
+
+    def atom_by_serialnumber(self):
+        self.model = self._model
+        if self._atoms is None:
+            self._atoms = dict((atom.serialNumber, atom) for atom in self.model.atoms)
+        return self._atoms
+
+    def getPseudoBondGroup(self, name, *args, **kwargs):
+        basename = name.rsplit('-', 1)[0]
+        name = '{}-{}'.format(basename, self._tag)
+        if self.site is not None:
+            name = '{} {}'.format(name, self.site)
+        group = chimera.misc.getPseudoBondGroup(name, *args, **kwargs)
+        if group not in self.groups:
+            self.groups.append(group)
+            self.groups_by_interaction[PBNAMES_TO_INTERACTIONS.get(basename)].append(group)
+            registry.add_group(self._model, group)
+        return group
+
+
+def model_tag(molecule):
+    if molecule.subid:
+        return '{}.{}'.format(molecule.id, molecule.subid)
+    return str(molecule.id)
+
+
+def plip_name(molecule):
+    return 'PLIP-' + model_tag(molecule)
+
+
+def prepare_molecule(molecule, copy=True, pocket=None, ligands=None):
+    """
+    Export `molecule` for PLIP and choose where results will be drawn.
+
+    Returns ``(pdb, target, atoms)``: the PDB contents to analyze, the model
+    to depict on and the table mapping PLIP serial numbers to its atoms.
+    The target is a new PLIP copy (see `patch_molecule`), or `molecule`
+    itself if `copy` is False, which saves a full duplicate of the model.
+    `pocket` and `ligands` are passed to `export_pdb`. The target is
+    recorded in the `registry`.
+    """
+    if copy:
+        pdb, target, atoms = patch_molecule(molecule, pocket=pocket, ligands=ligands)
+    else:
+        with STATS.timer('export_pdb'):
+            pdb, serials = export_pdb(molecule, pocket=pocket, ligands=ligands)
+        target, atoms = molecule, serial_table(molecule, pdb, serials)
+    registry.register(molecule, target)
+    return pdb, target, atoms
+
+
+def serial_table(molecule, pdb, serials=None):
+    """
+    Map the serial numbers in `pdb` back to the atoms of `molecule`.
+
+    `serials` is the atom -> serial dict returned by `export_pdb`. If it
+    is not available, `pdb` is read into temporary molecules (never shown)
+    and atoms are matched by chain, residue, name and alternate location.
+    """
+    if serials is not None:
+        return dict((serial, atom) for (atom, serial) in serials.iteritems())
+    with STATS.timer('readPDBstream'):
+        parsed = chimera.PDBio().readPDBstream(StringIO(pdb), 'plip.pdb', 0)[0]
+    by_identity = {}
+    for m in parsed:
+        by_identity.update((_atom_identity(a), a.serialNumber) for a in m.atoms)
+        m.destroy()
+    table = {}
+    for atom in molecule.atoms:
+        serial = by_identity.get(_atom_identity(atom))
+        if serial is not None:
+            table[serial] = atom
+    return table
+
+
+def export_temporary_pdbstream(molecule, pocket=None):
+    return StringIO(export_pdb(molecule, pocket=pocket)[0])
+
+
+def export_pdb(molecule, pocket=None, ligands=None):
+    """
+    Write `molecule` as PDB contents for PLIP.
+
+    Returns the PDB text and a dict mapping each exported Chimera atom to
+    the serial number it got in that text. Atoms are written directly from
+    Chimera, numbered sequentially. If the residues do not fit in the
+    fixed PDB columns, ``chimera.pdbWrite`` is used instead and the dict is
+    None: serials are then only known by reading the text back.
+
+    If `pocket` is a radius (A), only the residues returned by
+    `pocket_residues` around `ligands` (all hetero groups by default)
+    are written. The pdbWrite fallback always writes the whole molecule.
+    """
+    residues = molecule.residues
+    if pocket:
+        residues = pocket_residues(molecule, pocket, ligands=ligands)
+    if not _fits_pdb_columns(residues):
+        stream = StringIO()
+        chimera.pdbWrite([molecule], molecule.openState.xform, stream)
+        return stream.getvalue(), None
 
+    lines, serials, conect = [], {}, []
+    serial, polymer_chain = 0, None
+    for residue in residues:
+        rid = residue.id
+        chain = rid.chainId or ' '
+        het = getattr(residue, 'isHet', False)
+        if polymer_chain is not None and (het or chain != polymer_chain):
+            lines.append('TER\n')
+        polymer_chain = None if het else chain
+        resname = residue.type.rjust(3) + ' ' if len(residue.type) < 4 else residue.type
+        prefix = '{:1}{:4d}{:1}'.format(chain, rid.position, rid.insertionCode or ' ')
+        record = 'HETATM' if het else 'ATOM  '
+        for atom in sorted(residue.atoms, key=_by_serial):
+            serial += 1
+            serials[atom] = serial
+            element = atom.element.name.upper()
+            name = atom.name if len(atom.name) > 3 or len(element) > 1 else ' ' + atom.name
+            coord = atom.coord()
+            lines.append(_PDB_ATOM_LINE % (
+                record, serial, name, atom.altLoc or ' ', resname, prefix,
+                coord.x, coord.y, coord.z, getattr(atom, 'occupancy', 1.0),
+                getattr(atom, 'bfactor', 0.0), element))
+            if het:
+                conect.append(atom)
+    if polymer_chain is not None:
+        lines.append('TER\n')
+    for atom in conect:
+        bonded = sorted(serials[a] for a in atom.neighbors if a in serials)
+        for i in range(0, len(bonded), 4):
+            lines.append('CONECT{:5d}{}\n'.format(
+                serials[atom], ''.join('{:5d}'.format(s) for s in bonded[i:i+4])))
+    lines.append('END\n')
+    return ''.join(lines), serials
 
-def depict_analysis(pdbcomplex, molecule):
+
+def patch_molecule(molecule, pocket=None, ligands=None):
+    """
+    Create the PLIP copy of `molecule` and return the PDB contents
+    to analyze, the copy and the serial -> atom table for the copy.
+
+    Serial numbers in the copy match those in the PDB text, which is how
+    ChimeraVisualizer maps PLIP results back to Chimera atoms. The copy
+    is made in memory when possible; otherwise, the PDB text is read back.
+    """
+    with STATS.timer('export_pdb'):
+        pdb, serials = export_pdb(molecule, pocket=pocket, ligands=ligands)
+    molcopy = atoms = None
+    if serials is not None:
+        molcopy, atoms = _copy_with_serials(molecule, serials)
+    if molcopy is None:
+        with STATS.timer('readPDBstream'):
+            molcopy, = chimera.PDBio().readPDBstream(StringIO(pdb),
+                                                     '{}.pdb'.format(molecule.name), 0)[0]
+        atoms = dict((atom.serialNumber, atom) for atom in molcopy.atoms)
+    _show_copy(molecule, molcopy)
+    return pdb, molcopy, atoms
+
+
+def copy_molecule(molecule):
+    """
+    Create the PLIP copy of `molecule` in memory, without exporting it,
+    for depictions that match atoms by identity instead of PLIP serial
+    numbers. The copy is recorded in the `registry`.
+    """
+    import Molecule
+    molcopy = Molecule.copy_molecule(molecule)
+    _show_copy(molecule, molcopy)
+    registry.register(molecule, molcopy)
+    return molcopy
+
+
+def pocket_residues(molecule, radius=POCKET_RADIUS, ligands=None):
+    """
+    Hetero groups of `molecule` (or the given `ligands` residues) plus the
+    residues and waters with any atom within `radius` A of them, in
+    molecule order.
+
+    Neighbors are found with a uniform grid of `radius`-sized cells, so the
+    cost grows linearly with the number of atoms. Only atoms within
+    `radius` of the sphere around the ligands' centroid enter the grid,
+    which keeps each call cheap when it is repeated on every frame of a
+    trajectory. PLIP only looks for interactions among residues closer
+    than its binding site cutoff (``BS_DIST``) to the ligand, so smaller
+    radii are raised to it: the interactions found in the pocket are the
+    same as in the full structure.
+    """
+    radius = max(float(radius), plip_config.BS_DIST)
+    centers = ligands
+    if centers is None:
+        centers = [r for r in molecule.residues if is_ligand(r)]
+    keep = set(centers)
+    points = [atom.coord() for residue in centers for atom in residue.atoms]
+    if not points:
+        return [r for r in molecule.residues if r in keep]
+    cx = sum(p.x for p in points) / len(points)
+    cy = sum(p.y for p in points) / len(points)
+    cz = sum(p.z for p in points) / len(points)
+    reach = radius + max((p.x - cx) ** 2 + (p.y - cy) ** 2 + (p.z - cz) ** 2
+                         for p in points) ** 0.5
+    sqreach = reach * reach
+    cells = defaultdict(list)
+    for atom in molecule.atoms:
+        c = atom.coord()
+        x, y, z = c.x, c.y, c.z
+        if (x - cx) ** 2 + (y - cy) ** 2 + (z - cz) ** 2 > sqreach:
+            continue
+        cells[int(x // radius), int(y // radius), int(z // radius)].append((x, y, z, atom.residue))
+
+    sqradius = radius * radius
+    offsets = [(i, j, k) for i in (-1, 0, 1) for j in (-1, 0, 1) for k in (-1, 0, 1)]
+    for residue in centers:
+        for atom in residue.atoms:
+            c = atom.coord()
+            x, y, z = c.x, c.y, c.z
+            ci, cj, ck = int(x // radius), int(y // radius), int(z // radius)
+            for i, j, k in offsets:
+                for ax, ay, az, neighbor in cells.get((ci + i, cj + j, ck + k), ()):
+                    if neighbor not in keep and \
+                            (ax - x) ** 2 + (ay - y) ** 2 + (az - z) ** 2 <= sqradius:
+                        keep.add(neighbor)
+    return [r for r in molecule.residues if r in keep]
+
+
+def is_ligand(residue):
+    return getattr(residue, 'isHet', False) and residue.type not in WATERS
+
+
+def selected_ligands(molecule, residues):
+    """
+    Ligand residues of `molecule` among `residues`, or None if all its
+    ligands (or none of them) are there, meaning no restriction.
+    """
+    ligands = [r for r in molecule.residues if is_ligand(r)]
+    residues = set(residues)
+    selected = [r for r in ligands if r in residues]
+    if selected and len(selected) < len(ligands):
+        return selected
+
+
+def unpatch_molecule(molecule):
+    """
+    Undo `do` for `molecule`: remove its PLIP copy, or the
+    depiction drawn on the molecule itself.
+    """
+    registry.teardown([molecule])
+
+
+def depict_analysis(analysis, molecule, atoms=None):
     # Export analysis back to Chimera
     interactions = {}
-    for interaction in pdbcomplex.interaction_sets:
-        view_data = VisualizerData(pdbcomplex, interaction)
-        viewer = ChimeraVisualizer(view_data, chimera, molecule.id)
-        interactions[interaction] = viewer
-        for method in ('cationpi', 'halogen', 'hbonds', 'hydrophobic',
-                       'metal', 'sbridges', 'stacking', 'wbridges'):
-            getattr(viewer, 'show_' + method)()
-
-    report = StructureReport(pdbcomplex)
-
-    return interactions, report
-
-
-def do(molecules):
-    molecules = [m for m in molecules if not getattr(m, 'plip_copy', None)]
-    if len(molecules) != 1:
-        raise ValueError('Only one model can be analyzed at the same time.')
-    molecule = molecules[0]
-    stream, patched_molecule = patch_molecule(molecule)
-    molecule.plip_copy = patched_molecule
-    analyzed = analyze_with_plip(stream.getvalue())
-    stream.close()
-    return depict_analysis(analyzed, patched_molecule)
-
-
-def undo():
-    pbnames = ['Water Bridges', 'Salt Bridges', 'Hydrophobic Interactions',
-               'HalogenBonds', 'pi-Stacking', 'Hydrogen Bonds',
-               'Metal Coordination', 'Cation-Pi']
-
-    for m in chimera.openModels.list(modelTypes=[chimera.Molecule]):
-        manager = m.pseudoBondMgr()
-        for group in manager.pseudoBondGroups:
-            if group.category.rsplit('-')[0] in pbnames:
-                manager.deletePseudoBondGroup(group)
-        if hasattr(m, 'plip_copy'):
-            m.display = True
-            delattr(m, 'plip_copy')
-        if m.name.startswith('PLIP-'):
-            m.destroy()
-
-    chimera.viewer.updateCB(chimera.viewer)
+    for site, (report, view_data) in analysis.sites.items():
+        with STATS.timer('visualizer'):
+            viewer = Visualizer(view_data, molecule, atoms)
+        interactions[site] = viewer
+        with STATS.timer('drawing'):
+            for method in ('cationpi', 'halogen', 'hbonds', 'hydrophobic',
+                           'metal', 'sbridges', 'stacking', 'wbridges'):
+                getattr(viewer, 'show_' + method)()
+
+    return interactions, analysis
+
+
+def do(molecules, cache=True, processes=None, copy=True, pocket=None, residues=None,
+       types=None, backend=None):
+    """
+    Analyze and depict each of `molecules`, on its own PLIP copy
+    or, if `copy` is False, on the molecule itself. If `pocket` is
+    given, only a shell of that radius around ligands is analyzed.
+    If the `residues` (e.g. the current selection) include some of the
+    ligands of a molecule, only those are analyzed and depicted.
+    `types` limits the detected interaction types (see `interaction_types`).
+
+    Analyses run in parallel, or in the persistent worker if `backend`
+    is ``'worker'`` (see `analyze_many`). Returns a list of
+    ``(molecule, (interactions, analysis))`` for the successful ones;
+    failures are sent to the Reply Log and their copies removed. If the
+    whole batch fails (e.g. the analysis server cannot be reached), every
+    copy is removed and the error is raised.
+    """
+    molecules = [m for m in molecules if m not in registry and not m.name.startswith('PLIP-')]
+    if not molecules:
+        raise ValueError('No models to analyze.')
+    types = interaction_types(types)
+    pdbs, targets, ligand_ids = [], [], []
+    try:
+        for molecule in molecules:
+            ligands = selected_ligands(molecule, residues) if residues is not None else None
+            ligand_ids.append(ligands and [(r.type, r.id.chainId, r.id.position)
+                                           for r in ligands])
+            pdb, target, atoms = prepare_molecule(molecule, copy=copy, pocket=pocket,
+                                                  ligands=ligands)
+            pdbs.append(pdb)
+            targets.append((target, atoms))
+        analyses = analyze_many(pdbs, processes=processes, cache=cache, ligands=ligand_ids,
+                                types=types, backend=backend)
+    except Exception:
+        # e.g. ServerError: no copies are left behind
+        for molecule in molecules[:len(targets)]:
+            unpatch_molecule(molecule)
+        raise
+    del pdbs
+
+    results = []
+    for molecule, (target, atoms), analyzed in zip(molecules, targets, analyses):
+        if isinstance(analyzed, basestring):
+            chimera.replyobj.error('PLIP failed for {} ({}):\n{}'.format(
+                molecule.name, molecule.oslIdent(), analyzed))
+            unpatch_molecule(molecule)
+            continue
+        STATS.add_analysis(analyzed, atoms=len(atoms))
+        results.append((molecule, depict_analysis(analyzed, target, atoms)))
+    return results
+
+
+def undo(molecules=None):
+    """
+    Remove the PLIP depictions of `molecules`, or all of them.
+    Returns how many were removed.
+    """
+    return registry.teardown(molecules)
+
+
+_PDB_ATOM_LINE = '%s%5d %-4s%1s%s%s   %8.3f%8.3f%8.3f%6.2f%6.2f          %2s\n'
+
+
+def _by_serial(atom):
+    return atom.serialNumber
+
+
+def _remove_pseudoatoms(molecule):
+    # Ring centroids added by ChimeraVisualizer
+    for residue in list(molecule.residues):
+        if residue.type == 'pseudoatoms':
+            for atom in list(residue.atoms):
+                molecule.deleteAtom(atom)
+
+
+def _atom_identity(atom):
+    rid = atom.residue.id
+    return rid.chainId, rid.position, rid.insertionCode, atom.name, atom.altLoc
+
+
+def _fits_pdb_columns(residues):
+    if sum(len(residue.atoms) for residue in residues) > 99999:
+        return False
+    for residue in residues:
+        rid = residue.id
+        if len(rid.chainId) > 1 or len(residue.type) > 4 or not -999 <= rid.position <= 9999:
+            return False
+    return True
+
+
+def _show_copy(molecule, molcopy):
+    chimera.openModels.add([molcopy], sameAs=molecule)
+    molcopy.name = plip_name(molecule)
+    molecule.display = False
+
+
+def _copy_with_serials(molecule, serials):
+    """
+    Copy `molecule` in memory and renumber the copy's atoms with `serials`
+    (atoms missing from it, if the export was partial, are left untouched).
+    Returns the copy and its serial -> atom table, or ``(None, None)`` if
+    the copy cannot be matched atom by atom.
+    """
+    from Molecule import copy_molecule
+    molcopy = copy_molecule(molecule)
+    table = {}
+    if len(molcopy.residues) == len(molecule.residues):
+        try:
+            for residue, residue_copy in zip(molecule.residues, molcopy.residues):
+                atoms = dict(((a.name, a.altLoc), a) for a in residue_copy.atoms)
+                for atom in residue.atoms:
+                    serial = serials.get(atom)
+                    if serial is not None:
+                        atom_copy = atoms[(atom.name, atom.altLoc)]
+                        atom_copy.serialNumber = serial
+                        table[serial] = atom_copy
+        except KeyError:
+            pass
+        else:
+            return molcopy, table
+    molcopy.destroy()
+    return None, None
+
 
 if __name__ == '__main__':
     do()
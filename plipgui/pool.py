@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Process pool that survives crashes of its workers.
+
+`multiprocessing.Pool` replaces a worker that dies (e.g. when OpenBabel
+segfaults) but never returns the task it was running, so whoever waits
+for it hangs forever. `CrashSafePool` gives each worker process its own
+pipe and watches it while it runs a job: if the process dies, or the job
+takes longer than `timeout`, that job fails with a `PoolError` and a new
+process takes the place of the old one.
+
+Processes are only ever forked from the threads that call the pool, never
+from the threads the pool runs to watch them, so that a fork does not
+copy a lock held by one of those.
+"""
+
+from __future__ import print_function, division
+# Python stdlib
+import multiprocessing
+import os
+from Queue import Queue
+import threading
+import time
+import traceback
+
+
+class PoolError(RuntimeError):
+
+    """
+    A job was lost because its worker process died or timed out.
+    `seconds` is how long the job ran.
+    """
+
+    def __init__(self, message, seconds=0.0):
+        RuntimeError.__init__(self, message)
+        self.seconds = seconds
+
+
+class CrashSafePool(object):
+
+    """
+    Pool of `processes` forked workers (one per CPU by default), each
+    running one job at a time. Jobs running for more than `timeout`
+    seconds are killed. Functions and jobs must be picklable, as with
+    `multiprocessing.Pool`.
+
+    Processes are started on first use (or by `start`) and kept until
+    `close`, so a pool can be reused for several batches of jobs. Batches
+    go through `map` or `imap_unordered`; long-running services submit
+    single jobs with `apply_async` instead, and call `start` now and then
+    from their own threads to replace lost processes. Do not mix both at
+    once.
+    """
+
+    def __init__(self, processes=None, timeout=None):
+        self.processes = max(1, processes or multiprocessing.cpu_count())
+        self.timeout = timeout
+        self._workers = [_Worker() for _ in range(self.processes)]
+        self._tasks = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Start the worker processes that are not running, e.g. before the
+        caller starts threads, or to replace those lost since `apply_async`
+        """
+        with self._lock:
+            for worker in self._workers:
+                if not worker.alive:
+                    worker.start()
+                if self._tasks is not None and not worker.serving:
+                    worker.thread = _thread(worker.serve, self._tasks, self.timeout)
+
+    def apply_async(self, function, job, callback):
+        """
+        Queue ``function(job)`` and call ``callback(result)`` from a pool
+        thread when it is done. As in `imap_unordered`, `result` is a
+        `PoolError` if the job was lost; it is also one if `function` raised.
+
+        Lost processes are replaced by this call and by `start`, so whoever
+        waits for queued jobs should call `start` while waiting.
+        """
+        with self._lock:
+            if self._tasks is None:
+                self._tasks = Queue()
+        self.start()
+        self._tasks.put((function, job, callback))
+
+    def imap_unordered(self, function, jobs):
+        """
+        Yield ``(index, result)`` for each of `jobs` as soon as it is done,
+        where `result` is ``function(job)`` or, if the job was lost, a
+        `PoolError`. Exceptions raised by `function` itself are re-raised
+        here, so it should catch its own.
+        """
+        jobs = list(jobs)
+        pending, done = Queue(), Queue()
+        for item in enumerate(jobs):
+            pending.put(item)
+        workers = self._workers[:len(jobs)]
+        for worker in workers:
+            if not worker.alive:
+                worker.start()
+        for worker in workers:
+            pending.put(None)
+            _thread(worker.run_all, function, pending, done, self.timeout)
+        remaining = len(jobs)
+        while remaining:
+            index, kind, value = done.get()
+            if kind == 'lost':
+                # Replace the process from this thread, not the pool's
+                worker, item = value
+                worker.start()
+                _thread(worker.run_all, function, pending, done, self.timeout, [item])
+                continue
+            remaining -= 1
+            if kind == 'raised':
+                raise RuntimeError('Job {} failed in the pool:\n{}'.format(index, value))
+            yield index, value
+
+    def map(self, function, jobs):
+        """
+        List of the results of `imap_unordered`, in the order of `jobs`
+        """
+        jobs = list(jobs)
+        results = [None] * len(jobs)
+        for index, result in self.imap_unordered(function, jobs):
+            results[index] = result
+        return results
+
+    def close(self):
+        with self._lock:
+            if self._tasks is not None:
+                for _ in self._workers:
+                    self._tasks.put(None)
+                self._tasks = None
+        for worker in self._workers:
+            worker.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _Worker(object):
+
+    """
+    One process of a `CrashSafePool` and the pipe to talk to it
+    """
+
+    def __init__(self):
+        self.process = self.connection = self.thread = None
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    @property
+    def serving(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def run_all(self, function, pending, done, timeout, items=()):
+        """
+        Run `items`, then jobs from `pending` until it yields None, putting
+        ``(index, kind, value)`` in `done`. If the process is lost, put
+        ``(None, 'lost', (self, item))`` instead and stop, for the caller to
+        `start` the process again and run `item` on it.
+        """
+        items = list(items)
+        while True:
+            item = items.pop() if items else pending.get()
+            if item is None:
+                return
+            if not self.alive:
+                done.put((None, 'lost', (self, item)))
+                return
+            index, job = item
+            try:
+                done.put((index,) + self.run(function, job, timeout))
+            except Exception:
+                done.put((index, 'raised', traceback.format_exc()))
+
+    def serve(self, tasks, timeout):
+        """
+        Run tasks from `tasks` until it yields None, or until the process
+        is lost and `CrashSafePool.start` has to replace it
+        """
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            if not self.alive:
+                tasks.put(task)
+                return
+            function, job, callback = task
+            try:
+                kind, value = self.run(function, job, timeout)
+            except Exception:
+                kind, value = 'raised', traceback.format_exc()
+            if kind == 'raised':
+                value = PoolError('Job failed in the pool:\n{}'.format(value))
+            try:
+                callback(value)
+            except Exception:
+                traceback.print_exc()
+
+    def run(self, function, job, timeout=None):
+        """
+        Run ``function(job)`` in the (started) process and return ``(kind, value)``
+        """
+        start = time.time()
+        self.connection.send((function, job))
+        while not self.connection.poll(0.1):
+            seconds = time.time() - start
+            if not self.process.is_alive():
+                return 'done', PoolError(self._lost(), seconds)
+            if timeout is not None and seconds > timeout:
+                self.process.terminate()
+                self._lost()
+                return 'done', PoolError('Timed out after {:.0f} s'.format(timeout), seconds)
+        try:
+            return self.connection.recv()
+        except (EOFError, IOError):
+            return 'done', PoolError(self._lost(), time.time() - start)
+
+    def start(self):
+        self._lost()
+        self.connection, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_serve,
+                                               args=(child, self.connection, os.getpid()))
+        self.process.daemon = True
+        self.process.start()
+        child.close()
+
+    def stop(self):
+        if self.process is None:
+            return
+        if self.process.is_alive():
+            try:
+                self.connection.send(None)
+            except (IOError, OSError):
+                pass
+            self.process.join(1)
+        self._lost()
+
+    def _lost(self):
+        """
+        Clean up after the process, killing it if needed, and describe its end
+        """
+        process, self.process = self.process, None
+        if process is None:
+            return
+        if process.is_alive():
+            process.terminate()
+        process.join()
+        self.connection.close()
+        code = process.exitcode
+        if code < 0:
+            return 'Worker process was killed by signal {}'.format(-code)
+        return 'Worker process exited with code {}'.format(code)
+
+
+def _thread(target, *args):
+    thread = threading.Thread(target=target, args=args)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def _serve(connection, parent_end, parent):
+    parent_end.close()
+    while True:
+        # Other workers may hold our pipe open: do not outlive the parent
+        while not connection.poll(1):
+            if os.getppid() != parent:
+                return
+        try:
+            message = connection.recv()
+        except (EOFError, IOError):
+            return
+        if message is None:
+            return
+        function, job = message
+        try:
+            connection.send(('done', function(job)))
+        except Exception:
+            connection.send(('raised', traceback.format_exc()))
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Profile PLIP runs from within the user's session
+"""
+
+from __future__ import print_function, division
+# Python stdlib
+import cProfile
+import os
+import pstats
+import tempfile
+import time
+from cStringIO import StringIO
+try:
+    import tracemalloc  # Python 3, or the pytracemalloc backport
+except ImportError:
+    tracemalloc = None
+
+
+class Profile(object):
+
+    """
+    Context manager that runs its block under cProfile and, if available
+    and `memory` is True, tracemalloc.
+
+    On exit, the raw profile is dumped to `path` (readable with `pstats`
+    or snakeviz) and `report` returns the `top` functions by cumulative
+    and own time, plus the `top` allocation sites.
+    """
+
+    def __init__(self, path=None, memory=True, top=25):
+        if not path:
+            path = os.path.join(tempfile.gettempdir(),
+                                time.strftime('plip-%Y%m%d-%H%M%S.prof'))
+        self.path = path
+        self.memory = memory and tracemalloc is not None
+        self.top = top
+        self.profiler = cProfile.Profile()
+        self.snapshot = None
+        self.peak_memory = None
+
+    def __enter__(self):
+        if self.memory:
+            tracemalloc.start()
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.disable()
+        if self.memory:
+            self.snapshot = tracemalloc.take_snapshot()
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.profiler.dump_stats(self.path)
+
+    def report(self):
+        stream = StringIO()
+        stats = pstats.Stats(self.profiler, stream=stream)
+        stats.strip_dirs()
+        for order in ('cumulative', 'tottime'):
+            stream.write('Top {} functions by {} time\n'.format(self.top, order))
+            stats.sort_stats(order).print_stats(self.top)
+        if self.snapshot is not None:
+            stream.write('Top {} allocation sites (peak traced memory: {:.1f} MB)\n'.format(
+                         self.top, self.peak_memory / 2 ** 20))
+            for stat in self.snapshot.statistics('lineno')[:self.top]:
+                stream.write('  {}\n'.format(stat))
+        elif tracemalloc is None:
+            stream.write('Memory profiling needs tracemalloc (pytracemalloc on Python 2)\n')
+        stream.write('Profile saved to {}\n'.format(self.path))
+        return stream.getvalue()
+
+
+def profile_path(profile):
+    """
+    Interpret a ``profile`` command argument: a boolean-like value or a
+    path for the ``.prof`` file. Returns None when not profiling, '' to
+    use the default location or the path.
+    """
+    if profile is None or profile is False:
+        return None
+    if profile is True:
+        return ''
+    value = str(profile).strip()
+    if value.lower() in ('false', 'no', 'off', '0', ''):
+        return None
+    if value.lower() in ('true', 'yes', 'on', '1'):
+        return ''
+    return os.path.expanduser(value)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Reuse of PLIP results between similar frames.
+
+Consecutive frames of an equilibrated trajectory often differ by a few
+hundredths of an Angstrom in the binding pocket, and PLIP finds the same
+interactions in them. `FrameReuse` remembers the pocket atoms and their
+coordinates in the last few analyzed frames: a frame whose pocket has the
+same atoms as one of them, at the same coordinates (at PDB precision) or
+within an RMSD tolerance of them, can take that frame's results instead of
+going through PLIP again.
+"""
+
+from __future__ import print_function, division
+# Python stdlib
+from collections import OrderedDict
+import math
+
+
+#: Frames analyzed by PLIP that are remembered for reuse
+DEFAULT_WINDOW = 8
+
+
+class FrameReuse(object):
+
+    """
+    Recently analyzed frames, looked up by pocket atoms and coordinates.
+
+    Parameters
+    ----------
+    tolerance : float, optional
+        Largest pocket RMSD (A) at which a frame reuses a reference frame.
+        With 0 (the default), only identical pockets are reused, which does
+        not change the results as long as the pocket holds every atom PLIP
+        looks at (see `trajectory.pocket_atoms`).
+    window : int, optional
+        Number of reference frames remembered. Older ones are forgotten.
+
+    The RMSD is computed without superposition, so the pocket must not
+    drift as a whole: align the trajectory first to get the most reuse.
+    """
+
+    def __init__(self, tolerance=0.0, window=DEFAULT_WINDOW):
+        if tolerance < 0:
+            raise ValueError('tolerance must not be negative')
+        if window < 1:
+            raise ValueError('window must hold at least one frame')
+        self.tolerance = float(tolerance)
+        self.window = int(window)
+        self.checked = self.reused = 0
+        self._references = OrderedDict()  # key -> (members, coordinate hash, coordinates)
+
+    @property
+    def ratio(self):
+        """
+        Fraction of the frames looked up that reused a reference
+        """
+        return self.reused / self.checked if self.checked else 0.0
+
+    def lookup(self, coords, members=None):
+        """
+        Key of the most recent reference frame that `coords` (a sequence of
+        ``(x, y, z)``) can reuse, or None if the frame has to be analyzed.
+        `members` identifies the atoms of `coords`, in order; only frames
+        with the same `members` are compared.
+        """
+        self.checked += 1
+        members = _members(members, coords)
+        digest = coordinate_hash(coords)
+        for key, (reference_members, reference_hash, reference) in reversed(
+                self._references.items()):
+            if reference_members != members:
+                continue
+            if digest == reference_hash or (self.tolerance and
+                                             rmsd(coords, reference) <= self.tolerance):
+                self.reused += 1
+                return key
+
+    def add(self, key, coords, members=None):
+        """
+        Remember the frame `key`, analyzed with pocket `coords` of `members`
+        """
+        self._references.pop(key, None)
+        self._references[key] = (_members(members, coords), coordinate_hash(coords),
+                                 list(coords))
+        while len(self._references) > self.window:
+            self._references.popitem(last=False)
+
+    def discard(self, key):
+        """
+        Forget the frame `key` (e.g. because its analysis failed)
+        """
+        self._references.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self._references
+
+
+def _members(members, coords):
+    # Without identities, pockets can only be told apart by size
+    return tuple(members) if members is not None else len(coords)
+
+
+def coordinate_hash(coords):
+    """
+    Hash of `coords` rounded to the precision of PDB files
+    """
+    return hash(tuple((round(x, 3), round(y, 3), round(z, 3)) for (x, y, z) in coords))
+
+
+def rmsd(a, b):
+    """
+    Root mean square deviation of two equally long sequences of
+    ``(x, y, z)``, without superposition
+    """
+    if len(a) != len(b):
+        raise ValueError('Coordinate sets differ in length')
+    if not a:
+        return 0.0
+    total = 0.0
+    for (ax, ay, az), (bx, by, bz) in zip(a, b):
+        total += (ax - bx) ** 2 + (ay - by) ** 2 + (az - bz) ** 2
+    return math.sqrt(total / len(a))
@@ -0,0 +1,375 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Shared PLIP analysis server.
+
+One server, on a many-core machine, analyzes structures for several Chimera
+sessions: concurrent requests are spread over a pool of worker processes,
+identical submissions (same PDB contents, PLIP settings, ligands and
+interaction types) are analyzed once, and results are kept in the server's
+result cache for later requests. Start it with::
+
+    python -m plipgui.server [--host 0.0.0.0] [--port 8791] [-j 16] [--timeout 900] [--no-cache]
+
+and point clients to it with the TANGRAM_PLIPGUI_SERVER environment
+variable (``http://host:port``; localhost by default) and the ``remote``
+backend (``plip <spec> backend remote``, or the PLIP dialog).
+
+Clients POST a JSON document to ``/analyze``::
+
+    {"jobs": [{"pdb": "...", "config": {...}, "ligands": [...], "types": [...]}],
+     "cache": true}
+
+and the response streams one frame per job as soon as it is done, in
+completion order: a 4-byte length and a zlib-compressed pickle of
+``(index, 'done', Analysis)`` or ``(index, 'error', traceback)``. Jobs
+whose worker process crashes or runs past the timeout are answered with an
+error frame, and the worker is replaced.
+Results are pickles, so only point clients to servers you trust.
+``GET /status`` returns the server counters as JSON.
+"""
+
+from __future__ import print_function, division
+# Python stdlib
+import argparse
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from collections import defaultdict
+import contextlib
+import cPickle as pickle
+import json
+import os
+from Queue import Empty, Queue
+import socket
+from SocketServer import ThreadingMixIn
+import struct
+import sys
+import threading
+import traceback
+import urllib2
+import zlib
+# Own
+from plipgui.pool import CrashSafePool, PoolError
+
+
+#: Where clients find the server
+DEFAULT_URL = os.environ.get('TANGRAM_PLIPGUI_SERVER', 'http://127.0.0.1:8791')
+DEFAULT_PORT = 8791
+#: Seconds an analysis may run on the server before its worker is killed
+DEFAULT_TIMEOUT = 900
+#: Seconds a client waits for the server to connect or send the next result
+CLIENT_TIMEOUT = float(os.environ.get('TANGRAM_PLIPGUI_SERVER_TIMEOUT', 3600))
+_HEADER = struct.Struct('!I')
+
+
+class ServerError(RuntimeError):
+
+    """
+    The server could not be reached, or the analysis failed on it
+    """
+
+
+##########
+# Client #
+##########
+
+
+def analyze_remote(pdb, ligands=None, types=None, cache=True, url=None, timeout=None):
+    """
+    Analyze `pdb` on the server and return the `Analysis`. Failures
+    raise `ServerError`. Arguments as in `analysis.analyze_with_plip`;
+    `cache` tells whether the server may answer from its cache.
+    """
+    (_, kind, value), = submit([pdb], ligands=[ligands], types=types, cache=cache, url=url,
+                               timeout=timeout)
+    if kind == 'error':
+        raise ServerError('PLIP failed on the analysis server:\n' + value)
+    return value
+
+
+def analyze_batch(pdbs, ligands=None, types=None, cache=True, url=None, timeout=None):
+    """
+    Analyze several PDB strings on the server, in one request. Returns a
+    list aligned with `pdbs` holding an `Analysis` or, for failed analyses,
+    the formatted traceback, like `analysis.analyze_many`.
+    """
+    results = [None] * len(pdbs)
+    for index, kind, value in submit(pdbs, ligands=ligands, types=types, cache=cache,
+                                     url=url, timeout=timeout):
+        results[index] = value
+    return results
+
+
+def submit(pdbs, ligands=None, types=None, cache=True, url=None, timeout=None):
+    """
+    Send `pdbs` to the server and yield ``(index, kind, value)`` for
+    each of them as soon as it is done. `ServerError` is raised if the
+    server does not connect, or send the next result, within `timeout`
+    seconds (`CLIENT_TIMEOUT` by default).
+    """
+    from plipgui.analysis import config_snapshot
+    url = (url or DEFAULT_URL).rstrip('/') + '/analyze'
+    timeout = timeout or CLIENT_TIMEOUT
+    config = config_snapshot()
+    jobs = [{'pdb': pdb, 'config': config, 'ligands': ligands_, 'types': types}
+            for pdb, ligands_ in zip(pdbs, ligands or [None] * len(pdbs))]
+    request = urllib2.Request(url, json.dumps({'jobs': jobs, 'cache': bool(cache)}),
+                              {'Content-Type': 'application/json'})
+    try:
+        response = urllib2.urlopen(request, timeout=timeout)
+    except (urllib2.URLError, IOError) as e:
+        raise ServerError('Could not reach the PLIP analysis server at {}: {}'.format(
+                          url, getattr(e, 'reason', e)))
+    with contextlib.closing(response):
+        for _ in jobs:
+            try:
+                yield _receive(response)
+            except socket.timeout:
+                raise ServerError('The PLIP analysis server sent nothing for {:.0f} s'.format(
+                                  timeout))
+            except (EOFError, IOError) as e:
+                raise ServerError('Connection to the PLIP analysis server was lost '
+                                  '({})'.format(e or 'incomplete response'))
+
+
+##########
+# Server #
+##########
+
+
+class AnalysisService(object):
+
+    """
+    Runs analyses on a `CrashSafePool` of `processes`, merging identical jobs.
+
+    Jobs are identified by `cache.cache_key`, so a job already queued or
+    running is not submitted again: every request for it waits for the
+    same result. Jobs whose worker crashes or runs for more than `timeout`
+    seconds fail with an error result. Finished analyses are stored in
+    `cache` (a `ResultCache`, True for the default one or False for none).
+    """
+
+    def __init__(self, processes=None, cache=True, timeout=DEFAULT_TIMEOUT):
+        from plipgui.cache import default_cache
+        self.pool = CrashSafePool(processes, timeout=timeout or None)
+        self.pool.start()
+        self.processes = self.pool.processes
+        self.cache = default_cache() if cache is True else cache
+        self.counters = defaultdict(int)
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def submit(self, job, cache=True):
+        """
+        Queue `job` (a dict with ``pdb`` and, optionally, ``config``,
+        ``ligands`` and ``types``) and return its `_Job`
+        """
+        from plipgui.analysis import config_snapshot, interaction_types, _ligand_id
+        from plipgui.cache import cache_key
+        pdb = _text(job['pdb'])
+        # The server's own PLIP version and known settings make up the key
+        config = config_snapshot(job.get('config'))
+        ligands = job.get('ligands')
+        if ligands is not None:
+            ligands = sorted(set(_ligand_id(*ligand) for ligand in ligands))
+        types = interaction_types(job.get('types'))
+        key = cache_key(pdb, config, ligands=ligands, types=types)
+        with self._lock:
+            self.counters['jobs'] += 1
+            pending = self._pending.get(key)
+            if pending is not None:
+                self.counters['deduplicated'] += 1
+                return pending
+            pending = self._pending[key] = _Job()
+        use_cache = cache and self.cache
+        analysis = self.cache.get(key) if use_cache else None
+        with self._lock:
+            self.counters['cache_hits' if analysis is not None else 'analyses'] += 1
+        if analysis is not None:
+            self._finish(key, pending, ('done', analysis), store=False)
+        else:
+            self.pool.apply_async(_run_job, (pdb, config, ligands, types),
+                                  lambda result: self._finish(key, pending, result,
+                                                              store=use_cache))
+        return pending
+
+    def wait(self, results):
+        """
+        Next item of the `results` queue. Meanwhile, worker processes lost
+        to crashes are replaced from this thread, as the pool's own threads
+        do not fork.
+        """
+        while True:
+            try:
+                return results.get(timeout=1)
+            except Empty:
+                self.pool.start()
+
+    def status(self):
+        with self._lock:
+            status = dict(self.counters)
+            status['in_progress'] = len(self._pending)
+        status['processes'] = self.processes
+        return status
+
+    def close(self):
+        self.pool.close()
+
+    def _finish(self, key, pending, result, store):
+        if isinstance(result, PoolError):
+            from plipgui.analysis import lost_job_message
+            result = 'error', lost_job_message(result)
+        kind, value = result
+        if kind == 'done' and store:
+            try:
+                self.cache.put(key, value)
+            except Exception:  # a full disk must not lose the result
+                traceback.print_exc()
+        with self._lock:
+            if kind == 'error':
+                self.counters['errors'] += 1
+            del self._pending[key]
+        pending.set(result)
+
+
+class _Job(object):
+
+    """
+    Result of a queued analysis, delivered to every listener
+    """
+
+    def __init__(self):
+        self.result = None
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def listen(self, callback):
+        with self._lock:
+            if self.result is None:
+                self._listeners.append(callback)
+                return
+        callback(self.result)
+
+    def set(self, result):
+        with self._lock:
+            self.result = result
+            listeners, self._listeners = self._listeners, []
+        for callback in listeners:
+            callback(result)
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.rstrip('/') != '/status':
+            return self.send_error(404)
+        body = json.dumps(self.server.service.status(), indent=2, sort_keys=True)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/analyze':
+            return self.send_error(404)
+        try:
+            request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            jobs, cache = request['jobs'], request.get('cache', True)
+            done = Queue()
+            for index, job in enumerate(jobs):
+                pending = self.server.service.submit(job, cache=cache)
+                pending.listen(lambda result, index=index: done.put((index,) + result))
+        except Exception as e:
+            return self.send_error(400, 'Bad analysis request: {}'.format(e))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.end_headers()
+        for _ in jobs:
+            _send(self.wfile, self.server.service.wait(done))
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class AnalysisServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, address, service, verbose=False):
+        HTTPServer.__init__(self, address, _Handler)
+        self.service = service
+        self.verbose = verbose
+
+
+def _run_job(job):
+    pdb, config, ligands, types = job
+    from plipgui.analysis import analyze_with_plip, plip_settings
+    try:
+        with plip_settings(config):
+            return 'done', analyze_with_plip(pdb, cache=False, ligands=ligands, types=types,
+                                             backend='local')
+    except Exception:
+        return 'error', traceback.format_exc()
+
+
+def _text(value):
+    # JSON strings arrive as unicode; keys and cache hashes use str
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+def _send(stream, message):
+    data = zlib.compress(pickle.dumps(message, pickle.HIGHEST_PROTOCOL))
+    stream.write(_HEADER.pack(len(data)))
+    stream.write(data)
+    stream.flush()
+
+
+def _receive(stream):
+    size, = _HEADER.unpack(_read(stream, _HEADER.size))
+    return pickle.loads(zlib.decompress(_read(stream, size)))
+
+
+def _read(stream, size):
+    data = stream.read(size)
+    if len(data) < size:
+        raise EOFError
+    return data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m plipgui.server',
+                                     description='Serve PLIP analyses to Chimera sessions.')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='Interface to listen on (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help='Port to listen on (default: %(default)s)')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='Worker processes (default: one per CPU)')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help='Seconds before an analysis is stopped, 0 for no limit '
+                             '(default: %(default)s)')
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help='Do not keep results in the result cache')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log every request')
+    args = parser.parse_args(argv)
+
+    # The pool must be forked before the server starts any thread
+    service = AnalysisService(processes=args.processes, cache=args.cache,
+                              timeout=args.timeout)
+    server = AnalysisServer((args.host, args.port), service, verbose=args.verbose)
+    print('Serving PLIP analyses on http://{}:{} with {} processes'.format(
+          args.host, server.server_address[1], service.processes), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
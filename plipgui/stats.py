@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Timing and counters for the stages of the PLIP pipeline
+"""
+
+from __future__ import print_function, division
+# Python stdlib
+from collections import defaultdict, deque
+import contextlib
+import json
+import os
+import time
+
+
+#: Stages in pipeline order, for reports. Unknown stages are listed after them.
+STAGES = ('export_pdb', 'readPDBstream', 'cache', 'load_pdb', 'protonation', 'analyze',
+          'report', 'visualizer', 'drawing', 'tables')
+#: Durations kept per stage to compute percentiles
+WINDOW = 1000
+
+
+class Timings(dict):
+
+    """
+    Seconds spent per stage. A plain dict, so it can travel back
+    from worker processes inside an `Analysis`.
+    """
+
+    @contextlib.contextmanager
+    def time(self, stage):
+        t0 = time.time()
+        try:
+            yield
+        finally:
+            self[stage] = self.get(stage, 0.0) + time.time() - t0
+
+
+class Stats(object):
+
+    """
+    Cumulative statistics of this session: number of runs, analyses,
+    cache hits and atoms processed, plus the duration of each stage.
+
+    A run is one ``plip`` command or one Run in the dialog. If `log_path`
+    is set, a JSON line with the run's counters and stage durations is
+    appended to it when the run ends.
+    """
+
+    def __init__(self, log_path=None):
+        self.log_path = log_path
+        self.reset()
+
+    def reset(self):
+        self.counters = defaultdict(int)
+        self.totals = defaultdict(float)
+        self.durations = defaultdict(lambda: deque(maxlen=WINDOW))
+        self._run = None
+
+    @contextlib.contextmanager
+    def timer(self, stage):
+        """
+        Add the time spent in the block to `stage`
+        """
+        t0 = time.time()
+        try:
+            yield
+        finally:
+            self.add({stage: time.time() - t0})
+
+    def add(self, timings):
+        """
+        Merge a `Timings` dict (e.g. the one of an `Analysis`)
+        """
+        for stage, seconds in timings.items():
+            self.totals[stage] += seconds
+            self.durations[stage].append(seconds)
+            if self._run is not None:
+                stages = self._run['stages']
+                stages[stage] = stages.get(stage, 0.0) + seconds
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+        if self._run is not None:
+            self._run[name] = self._run.get(name, 0) + n
+
+    def add_analysis(self, analysis, atoms=0):
+        """
+        Account for an `Analysis` returned by `analyze_with_plip`
+        """
+        self.count('analyses')
+        self.count('atoms', atoms)
+        if getattr(analysis, 'cached', False):
+            self.count('cache_hits')
+        self.add(getattr(analysis, 'timings', None) or {})
+
+    def begin_run(self, **info):
+        self.end_run()
+        self.counters['runs'] += 1
+        self._run = dict(info, start=time.time(), stages={})
+
+    def end_run(self):
+        """
+        Close the current run, if any, and log it
+        """
+        run, self._run = self._run, None
+        if run is None:
+            return
+        run['seconds'] = round(time.time() - run['start'], 4)
+        run['stages'] = dict((k, round(v, 4)) for (k, v) in run['stages'].items())
+        if self.log_path:
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps(run, sort_keys=True) + '\n')
+        return run
+
+    def report(self):
+        """
+        Human readable summary, with a row per stage
+        """
+        c = self.counters
+        lines = ['PLIP statistics: {} runs, {} analyses ({} cache hits), {} atoms'.format(
+                 c['runs'], c['analyses'], c['cache_hits'], c['atoms']),
+                 '{:<14}{:>6}{:>11}{:>9}{:>9}{:>9}{:>9}'.format(
+                 'stage', 'n', 'total (s)', 'mean', 'p50', 'p90', 'p99')]
+        stages = [s for s in STAGES if s in self.durations]
+        stages += sorted(set(self.durations).difference(STAGES))
+        for stage in stages:
+            values = sorted(self.durations[stage])
+            lines.append('{:<14}{:>6}{:>11.3f}{:>9.3f}{:>9.3f}{:>9.3f}{:>9.3f}'.format(
+                stage, len(values), self.totals[stage], sum(values) / len(values),
+                percentile(values, 50), percentile(values, 90), percentile(values, 99)))
+        if self.log_path:
+            lines.append('Logging runs to {}'.format(self.log_path))
+        return '\n'.join(lines)
+
+
+def percentile(values, q):
+    """
+    Linearly interpolated `q`-th percentile of the sorted `values`
+    """
+    if not values:
+        return 0.0
+    position = (len(values) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+#: Statistics of this session. Set TANGRAM_PLIPGUI_STATS_LOG to log every run.
+STATS = Stats(log_path=os.environ.get('TANGRAM_PLIPGUI_STATS_LOG'))
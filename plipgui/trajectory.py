@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+PLIP analysis of every frame of a trajectory.
+
+Frames are the coordinate sets of a molecule: those of an ensemble, or
+the ones an MD Movie dialog loads for its model. Each frame is exported
+like a single structure (see `plip4chimera.export_pdb`), frames are
+analyzed in parallel a window at a time, on one process pool for the whole
+trajectory, and the interactions found are written to a JSON lines file as
+each window finishes, so memory use does not grow with the length of the
+trajectory. Frames whose binding pocket
+barely moved since a recently analyzed frame can reuse its results (see
+`reuse.FrameReuse`).
+"""
+
+from __future__ import print_function, division
+# Python stdlib
+import contextlib
+import json
+import multiprocessing
+import os
+# Chimera stuff
+import chimera
+# Own
+from plipgui.analysis import INTERACTIONS, analyze_many, check_backend
+from plipgui.pool import CrashSafePool
+from plipgui.plip4chimera import (export_pdb, is_ligand, pocket_residues, selected_ligands,
+                                  serial_table, _atom_identity)
+from plipgui.stats import STATS
+
+
+def md_movie(molecule):
+    """
+    The MD Movie dialog that plays `molecule`, if any
+    """
+    try:
+        from Movie.gui import MovieDialog
+    except ImportError:
+        return None
+    for instance in getattr(chimera.extension.manager, 'instances', ()):
+        if isinstance(instance, MovieDialog) and getattr(instance, 'model', None) is molecule:
+            return instance
+
+
+def trajectory_frames(molecule, start=None, end=None, stride=1, movie=None):
+    """
+    Frame numbers of `molecule` from `start` to `end` (both included,
+    first and last by default), every `stride` frames. Frames are those of
+    `movie` (an MD Movie dialog) if given, or the molecule's coordinate sets.
+    """
+    if stride < 1:
+        raise ValueError('stride must be a positive number of frames')
+    if movie is not None:
+        frames = range(movie.startFrame, movie.endFrame + 1)
+    else:
+        frames = sorted(molecule.coordSets)
+    frames = [f for f in frames if (start is None or f >= start) and (end is None or f <= end)]
+    return frames[::stride]
+
+
+def export_frame(molecule, frame, movie=None, pocket=None, ligands=None):
+    """
+    PDB contents of `molecule` at `frame` and the atom -> serial dict (see
+    `export_pdb`). Frames that `movie` has not loaded yet are loaded first
+    and dropped afterwards.
+    """
+    with frame_active(molecule, frame, movie=movie):
+        with STATS.timer('export_pdb'):
+            return export_pdb(molecule, pocket=pocket, ligands=ligands)
+
+
+@contextlib.contextmanager
+def frame_active(molecule, frame, movie=None):
+    """
+    Make `frame` the active coordinate set of `molecule` within the block,
+    loading it from `movie` if needed (see `export_frame`)
+    """
+    coordset = molecule.coordSets.get(frame)
+    loaded = coordset is None and movie is not None
+    if loaded:
+        movie.LoadFrame(frame)
+        coordset = molecule.coordSets[frame]
+    if coordset is None:
+        raise ValueError('{} has no frame {}'.format(molecule.name, frame))
+    active = molecule.activeCoordSet
+    molecule.activeCoordSet = coordset
+    try:
+        yield coordset
+    finally:
+        molecule.activeCoordSet = active
+        if loaded and coordset is not active and hasattr(molecule, 'deleteCoordSet'):
+            molecule.deleteCoordSet(coordset)
+
+
+def interaction_records(frame, analysis):
+    """
+    One dict per interaction in `analysis`, with the frame, the binding
+    site, the interaction type and the columns of its PLIP table
+    """
+    for site, (report, _) in sorted(analysis.sites.items()):
+        for interaction in INTERACTIONS:
+            features = getattr(report, interaction + '_features', ())
+            for row in getattr(report, interaction + '_info', ()):
+                record = dict(zip(features, row))
+                record.update(frame=frame, site=site, type=interaction)
+                yield record
+
+
+def pocket_atoms(molecule, ligands=None):
+    """
+    Atoms whose coordinates tell frames of `molecule` apart for reuse: those
+    of the ligands and of the residues within PLIP's binding site cutoff
+    of them in the active frame, or every atom if there are no ligands.
+    PLIP only looks for interactions among these, so frames with the same
+    pocket atoms at the same coordinates get the same results.
+    """
+    residues = pocket_residues(molecule, 0, ligands=ligands)
+    return [atom for residue in residues for atom in residue.atoms] or list(molecule.atoms)
+
+
+def analyze_trajectory(molecule, output, start=None, end=None, stride=1, processes=None,
+                       pocket=None, residues=None, types=None, backend=None, window=None,
+                       progress=None, aggregator=None, reuse=None):
+    """
+    Analyze the frames of `molecule` selected by `start`, `end` and `stride`
+    (see `trajectory_frames`) and write their interactions to the file
+    `output` (replacing it), one JSON record per line (see
+    `interaction_records`).
+    Frames that fail are recorded as ``{"frame": N, "error": traceback}``.
+
+    `processes`, `types` and `backend` are passed to `analyze_many`, and
+    `pocket` and the ligands among `residues` to `export_pdb`. Frames are
+    exported and analyzed `window` at a time (four per process by default),
+    with local analyses running on a single `CrashSafePool`. Results are
+    not cached. `progress`, if given, is called with the number
+    of frames done and the total after each window. Each analyzed frame is
+    also fed to `aggregator` (an `occupancy.OccupancyAggregator`), if given.
+
+    If `reuse` (a `reuse.FrameReuse`) is given, frames whose `pocket_atoms`
+    (found again in every frame) are the same atoms as in a recently analyzed
+    frame, and close enough to them, are not analyzed:
+    they take that frame's interactions, and their records say which frame
+    in ``reused``.
+
+    Returns the number of frames analyzed (reused ones included), failed,
+    and interactions found.
+    """
+    movie = md_movie(molecule)
+    frames = trajectory_frames(molecule, start=start, end=end, stride=stride, movie=movie)
+    if not frames:
+        raise ValueError('No frames to analyze in {}.'.format(molecule.name))
+    ligands = selected_ligands(molecule, residues) if residues is not None else None
+    ligand_ids = ligands and [(r.type, r.id.chainId, r.id.position) for r in ligands]
+    # Residues do not change between frames, so ligands are only found once
+    pocket_ligands = ligands
+    if pocket_ligands is None and reuse is not None:
+        pocket_ligands = [r for r in molecule.residues if is_ligand(r)]
+    if window is None:
+        window = 4 * (processes or multiprocessing.cpu_count())
+    analyzed = failed = interactions = 0
+    n_atoms = len(molecule.atoms)
+    references = {}  # frame -> (result, atom identities), for frames `reuse` remembers
+    with open(os.path.expanduser(output), 'w') as f, \
+            _trajectory_pool(processes, backend) as pool:
+        for i in range(0, len(frames), window):
+            chunk = frames[i:i + window]
+            sources, exported = {}, []
+            for frame in chunk:
+                with frame_active(molecule, frame, movie=movie):
+                    if reuse is not None:
+                        atoms = pocket_atoms(molecule, ligands=pocket_ligands)
+                        coords = [(c.x, c.y, c.z) for c in (a.coord() for a in atoms)]
+                        sources[frame] = reuse.lookup(coords, members=atoms)
+                        if sources[frame] is not None:
+                            STATS.count('reused_frames')
+                            continue
+                        reuse.add(frame, coords, members=atoms)
+                    with STATS.timer('export_pdb'):
+                        pdb, serials = export_pdb(molecule, pocket=pocket, ligands=ligands)
+                exported.append((frame, pdb, serials))
+            results = analyze_many([pdb for (_, pdb, _) in exported], processes=processes,
+                                   cache=False, ligands=[ligand_ids] * len(exported),
+                                   types=types, backend=backend, pool=pool) if exported else []
+            for (frame, pdb, serials), result in zip(exported, results):
+                identities = None
+                if isinstance(result, basestring):
+                    if reuse is not None:
+                        reuse.discard(frame)
+                else:
+                    STATS.add_analysis(result, atoms=n_atoms)
+                    if aggregator is not None:
+                        identities = _identities(molecule, pdb, serials)
+                references[frame] = result, identities
+            for frame in chunk:
+                source = sources.get(frame)
+                result, identities = references[frame if source is None else source]
+                extra = {} if source is None else {'reused': source}
+                if isinstance(result, basestring):
+                    failed += 1
+                    f.write(json.dumps(dict(extra, frame=frame, error=result)) + '\n')
+                    continue
+                analyzed += 1
+                if aggregator is not None:
+                    aggregator.add(frame, result, atoms=identities)
+                for record in interaction_records(frame, result):
+                    interactions += 1
+                    record.update(extra)
+                    f.write(json.dumps(record, sort_keys=True, default=str) + '\n')
+            del exported, results
+            references = dict((frame, value) for (frame, value) in references.items()
+                              if reuse is not None and frame in reuse)
+            f.flush()
+            if progress is not None:
+                progress(i + len(chunk), len(frames))
+    return analyzed, failed, interactions
+
+
+@contextlib.contextmanager
+def _trajectory_pool(processes, backend):
+    """
+    Pool shared by the windows of a local trajectory analysis, or None if
+    `analyze_many` does not need one. Forking a pool per window would cost
+    as much as the analysis of a few frames.
+    """
+    if processes == 1 or check_backend(backend) != 'local':
+        yield None
+        return
+    with CrashSafePool(processes) as pool:
+        yield pool
+
+
+def _identities(molecule, pdb, serials):
+    """
+    Serial number -> atom identity table of one exported frame
+    """
+    return dict((serial, _atom_identity(atom))
+                for (serial, atom) in serial_table(molecule, pdb, serials).items())
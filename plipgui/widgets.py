@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Tk widgets for large PLIP result sets
+"""
+
+from __future__ import print_function, division
+# Python stdlib
+import operator
+import re
+import Tkinter as tk
+import tkFont
+
+
+class VirtualTable(tk.Frame):
+
+    """
+    Read-only table that only creates canvas items for the rows in view,
+    so it stays responsive with thousands of records.
+
+    Sort keys are computed once per column when data is set. Click a header
+    to sort by that column (click again to reverse it). The filter box takes
+    comma-separated conditions such as ``DIST < 3.5`` or ``RESTYPE = LEU``
+    (``~`` matches substrings); any other text is searched in every cell.
+
+    Parameters
+    ----------
+    parent : Tk widget
+    headers : list of str
+        Column names. Each data row must be a sequence of the same length.
+    font : tuple, optional
+        A monospaced font is assumed to estimate column widths.
+    height : int, optional
+        Visible rows when the table is not stretched by its geometry manager.
+    """
+
+    PAD = 6
+    _CONDITION = re.compile(r'^\s*([\w\-]+)\s*(<=|>=|==|!=|<|>|=|~)\s*(.+?)\s*$')
+    _OPERATORS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+                  '=': operator.eq, '==': operator.eq, '!=': operator.ne}
+
+    def __init__(self, parent, headers, font=('Courier', 10), height=15, **kwargs):
+        tk.Frame.__init__(self, parent, **kwargs)
+        self.headers = list(headers)
+        self.font = tkFont.Font(font=font)
+        self.row_height = self.font.metrics('linespace') + 4
+        self.data = []
+        self._texts = []
+        self._keys = []
+        self._view = []
+        self._widths = []
+        self._sort_column, self._reverse = None, False
+        self._top = 0
+
+        bar = tk.Frame(self)
+        tk.Label(bar, text='Filter:').pack(side='left')
+        self._filter = tk.StringVar()
+        entry = tk.Entry(bar, textvariable=self._filter)
+        entry.pack(side='left', expand=True, fill='x', padx=5)
+        entry.bind('<Return>', lambda e: self.apply_filter())
+        self._status = tk.Label(bar)
+        self._status.pack(side='left')
+        bar.grid(row=0, column=0, columnspan=2, sticky='ew', pady=2)
+
+        self.header = tk.Canvas(self, height=self.row_height, highlightthickness=0)
+        self.body = tk.Canvas(self, height=height * self.row_height, highlightthickness=0,
+                              background='white')
+        self.vbar = tk.Scrollbar(self, orient='vertical', command=self._yview)
+        self.hbar = tk.Scrollbar(self, orient='horizontal', command=self._xview)
+        self.body.configure(xscrollcommand=self.hbar.set)
+        self.header.grid(row=1, column=0, sticky='ew')
+        self.body.grid(row=2, column=0, sticky='nsew')
+        self.vbar.grid(row=2, column=1, sticky='ns')
+        self.hbar.grid(row=3, column=0, sticky='ew')
+        self.grid_rowconfigure(2, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.body.bind('<Configure>', lambda e: self._redraw())
+        for widget in (self.body, self.header):
+            widget.bind('<MouseWheel>', self._on_wheel)
+            widget.bind('<Button-4>', lambda e: self._yview('scroll', -3, 'units'))
+            widget.bind('<Button-5>', lambda e: self._yview('scroll', 3, 'units'))
+
+    def setData(self, data):
+        self.data = list(data)
+        self._texts = [tuple(_cell_text(value) for value in row) for row in self.data]
+        self._keys = [[_sort_key(row[i]) for row in self.data]
+                      for i in range(len(self.headers))]
+        char = self.font.measure('0')
+        self._widths = [char * max([len(header) + 2] + [len(t[i]) for t in self._texts])
+                        + 2 * self.PAD for (i, header) in enumerate(self.headers)]
+        self._top = 0
+        self._draw_header()
+        self.apply_filter()
+
+    def sort_by(self, column):
+        if column == self._sort_column:
+            self._reverse = not self._reverse
+        else:
+            self._sort_column, self._reverse = column, False
+        self._sort()
+        self._draw_header()
+        self._redraw()
+
+    def apply_filter(self, text=None):
+        if text is not None:
+            self._filter.set(text)
+        predicates = self._parse_filter(self._filter.get())
+        self._view = [i for i in range(len(self.data)) if all(p(i) for p in predicates)]
+        self._sort()
+        self._top = 0
+        self._status.configure(text='{} of {} rows'.format(len(self._view), len(self.data)))
+        self._redraw()
+
+    @property
+    def visible_rows(self):
+        return max(1, self.body.winfo_height() // self.row_height)
+
+    def _parse_filter(self, text):
+        predicates = []
+        names = dict((h.upper(), i) for (i, h) in enumerate(self.headers))
+        for condition in filter(None, (c.strip() for c in text.split(','))):
+            match = self._CONDITION.match(condition)
+            if match and match.group(1).upper() in names:
+                column, op, value = match.groups()
+                predicates.append(self._predicate(names[column.upper()], op, value))
+            else:
+                needle = condition.lower()
+                predicates.append(lambda i, needle=needle:
+                                  any(needle in t.lower() for t in self._texts[i]))
+        return predicates
+
+    def _predicate(self, column, op, value):
+        keys, texts = self._keys[column], self._texts
+        if op == '~':
+            value = value.lower()
+            return lambda i: value in texts[i][column].lower()
+        compare, value = self._OPERATORS[op], _sort_key(value)
+        return lambda i: keys[i][0] == value[0] and compare(keys[i][1], value[1])
+
+    def _sort(self):
+        if self._sort_column is not None:
+            self._view.sort(key=self._keys[self._sort_column].__getitem__,
+                            reverse=self._reverse)
+
+    def _draw_header(self):
+        self.header.delete('all')
+        x = 0
+        for i, (header, width) in enumerate(zip(self.headers, self._widths)):
+            if i == self._sort_column:
+                header += u' ▼' if self._reverse else u' ▲'
+            tag = 'column{}'.format(i)
+            self.header.create_rectangle(x, 0, x + width, self.row_height,
+                                         fill='gray85', outline='gray60', tags=tag)
+            self.header.create_text(x + width // 2, self.row_height // 2, text=header,
+                                    font=self.font, tags=tag)
+            self.header.tag_bind(tag, '<Button-1>', lambda e, i=i: self.sort_by(i))
+            x += width
+        self.header.configure(scrollregion=(0, 0, x, self.row_height))
+
+    def _redraw(self):
+        body, rh = self.body, self.row_height
+        body.delete('all')
+        n, visible = len(self._view), self.visible_rows
+        total_width = sum(self._widths)
+        for r, index in enumerate(self._view[self._top:self._top + visible + 1]):
+            y = r * rh
+            if (self._top + r) % 2:
+                body.create_rectangle(0, y, total_width, y + rh, fill='gray95', width=0)
+            x = 0
+            for text, width in zip(self._texts[index], self._widths):
+                body.create_text(x + width - self.PAD, y + rh // 2, text=text, anchor='e',
+                                 font=self.font)
+                x += width
+        body.configure(scrollregion=(0, 0, total_width, visible * rh))
+        if n:
+            self.vbar.set(self._top / n, min(1.0, (self._top + visible) / n))
+        else:
+            self.vbar.set(0, 1)
+
+    def _yview(self, *args):
+        n, visible = len(self._view), self.visible_rows
+        if args[0] == 'moveto':
+            top = int(float(args[1]) * n)
+        else:
+            step = int(args[1]) * (visible if args[2] == 'pages' else 1)
+            top = self._top + step
+        top = max(0, min(top, n - visible))
+        if top != self._top:
+            self._top = top
+            self._redraw()
+
+    def _xview(self, *args):
+        self.body.xview(*args)
+        self.header.xview(*args)
+
+    def _on_wheel(self, event):
+        self._yview('scroll', -3 if event.delta > 0 else 3, 'units')
+
+
+def _cell_text(value):
+    if isinstance(value, (tuple, list)):
+        return ', '.join(str(v) for v in value)
+    return str(value)
+
+
+def _sort_key(value):
+    """
+    Numbers sort before (and apart from) text
+    """
+    try:
+        return 0, float(value)
+    except (TypeError, ValueError):
+        return 1, _cell_text(value).lower()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Persistent PLIP worker process.
+
+A `Worker` starts ``python -m plipgui.worker`` once and reuses it, so PLIP
+and OpenBabel are imported and initialized once per session instead of in
+every analysis, and never in the calling (Chimera) process. PDB contents
+go to the worker through its stdin; progress messages and the resulting
+`Analysis` come back through its stdout. Each message is a pickle
+preceded by its length.
+
+If the worker dies (e.g. OpenBabel crashes), the analysis in progress
+raises `WorkerError` and the next one starts a fresh worker.
+
+The worker runs on the interpreter given in TANGRAM_PLIPGUI_PYTHON or, by
+default, the current one. It must be able to import PLIP and OpenBabel,
+which do not need to be importable next to RDKit in Chimera.
+"""
+
+from __future__ import print_function, division
+# Python stdlib
+import atexit
+import contextlib
+import cPickle as pickle
+import os
+import struct
+import subprocess
+import sys
+import threading
+import time
+import traceback
+
+
+#: Environment variable with the interpreter of the worker
+PYTHON_ENV = 'TANGRAM_PLIPGUI_PYTHON'
+_HEADER = struct.Struct('!I')
+
+
+class WorkerError(RuntimeError):
+
+    """
+    The analysis failed in the worker, or the worker itself died
+    """
+
+
+class Worker(object):
+
+    """
+    Client of a persistent worker process, started on first use.
+
+    Parameters
+    ----------
+    python : str, optional
+        Interpreter for the worker. Defaults to TANGRAM_PLIPGUI_PYTHON
+        or `sys.executable`.
+    """
+
+    def __init__(self, python=None):
+        self.python = python or os.environ.get(PYTHON_ENV) or sys.executable
+        self.process = None
+        self.starts = 0
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        """
+        Start the worker, if it is not running, and wait until PLIP is loaded
+        """
+        if self.alive:
+            return
+        self._reap()
+        # The worker must import this very plipgui
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(p for p in (root, env.get('PYTHONPATH')) if p)
+        try:
+            self.process = subprocess.Popen([self.python, '-m', 'plipgui.worker'],
+                                            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                            env=env, close_fds=True)
+        except OSError as e:
+            raise WorkerError('Could not start the PLIP worker with {}: {}'.format(
+                              self.python, e))
+        self.starts += 1
+        self._request(('ping',))
+
+    def analyze(self, pdb, progress=None, **kwargs):
+        """
+        Analyze `pdb` in the worker and return the `Analysis`. `kwargs`
+        are passed to `analysis.analyze_with_plip`; the worker does not use
+        the result cache and applies this process' PLIP settings first.
+        """
+        from plipgui.analysis import config_snapshot
+        with self._lock:
+            self.start()
+            return self._request(('analyze', pdb, config_snapshot(), kwargs), progress)
+
+    def stop(self, wait=False):
+        """
+        Stop the worker. Does not wait for an analysis in progress, which
+        fails with `WorkerError`.
+
+        Unless `wait` is True, this returns at once (e.g. when cancelling
+        from the GUI thread) and a daemon thread reaps the process.
+        """
+        process, self.process = self.process, None
+        if process is None:
+            return
+        # Closing stdin ends an idle worker; a busy one is killed
+        with _ignored(IOError, OSError):
+            process.stdin.close()
+        if wait:
+            _close(process)
+        else:
+            reaper = threading.Thread(target=_close, args=(process,))
+            reaper.daemon = True
+            reaper.start()
+
+    def _request(self, message, progress=None):
+        process = self.process
+        try:
+            _send(process.stdin, message)
+            while True:
+                kind, value = _receive(process.stdout)
+                if kind != 'progress':
+                    break
+                if progress is not None:
+                    progress(value)
+        except (EOFError, IOError, OSError, pickle.UnpicklingError):
+            raise WorkerError(self._reap() or 'PLIP worker stopped')
+        if kind == 'error':
+            raise WorkerError('PLIP failed in the worker:\n' + value)
+        return value
+
+    def _reap(self):
+        """
+        Clean up after a dead worker and describe how it died
+        """
+        process, self.process = self.process, None
+        if process is None:
+            return
+        code = _close(process)
+        if code < 0:
+            return 'PLIP worker was killed by signal {}'.format(-code)
+        return 'PLIP worker exited with code {}'.format(code)
+
+
+_worker = None
+
+
+def get_worker():
+    """
+    The worker shared by this process, stopped at exit
+    """
+    global _worker
+    if _worker is None:
+        _worker = Worker()
+        atexit.register(_worker.stop, wait=True)
+    return _worker
+
+
+def serve(stdin, stdout):
+    """
+    Answer requests from `stdin` on `stdout` until `stdin` is closed
+    """
+    from plipgui.analysis import analyze_with_plip, plip_settings
+    # Import everything an analysis needs now, not in the first request
+    from plip.modules import preparation, plipremote, report
+
+    def progress(stage):
+        _send(stdout, ('progress', stage))
+
+    while True:
+        try:
+            message = _receive(stdin)
+        except EOFError:
+            return
+        if message[0] == 'ping':
+            _send(stdout, ('pong', os.getpid()))
+            continue
+        _, pdb, config, kwargs = message
+        try:
+            with plip_settings(config):
+                analysis = analyze_with_plip(pdb, cache=False, progress=progress,
+                                             backend='local', **kwargs)
+        except Exception:
+            _send(stdout, ('error', traceback.format_exc()))
+        else:
+            _send(stdout, ('done', analysis))
+
+
+def _send(stream, message):
+    data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+    stream.write(_HEADER.pack(len(data)))
+    stream.write(data)
+    stream.flush()
+
+
+def _receive(stream):
+    size, = _HEADER.unpack(_read(stream, _HEADER.size))
+    return pickle.loads(_read(stream, size))
+
+
+def _read(stream, size):
+    data = stream.read(size)
+    if len(data) < size:
+        raise EOFError
+    return data
+
+
+def _finish(process, timeout=1.0):
+    """
+    Wait up to `timeout` seconds for `process` to exit, then kill it.
+    Returns its exit code.
+    """
+    deadline = time.time() + timeout
+    while process.poll() is None and time.time() < deadline:
+        time.sleep(0.02)
+    if process.poll() is None:
+        process.kill()
+    return process.wait()
+
+
+def _close(process):
+    """
+    `_finish` `process` and close its pipes, which a thread waiting for an
+    answer may still be reading. Returns its exit code.
+    """
+    code = _finish(process)
+    for stream in (process.stdin, process.stdout):
+        with _ignored(IOError, OSError):
+            stream.close()
+    return code
+
+
+@contextlib.contextmanager
+def _ignored(*exceptions):
+    try:
+        yield
+    except exceptions:
+        pass
+
+
+def main():
+    # Messages go through private copies of stdin and stdout, so that
+    # whatever PLIP or OpenBabel print ends up in stderr instead
+    stdin = os.fdopen(os.dup(0), 'rb')
+    stdout = os.fdopen(os.dup(1), 'wb')
+    os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+    os.dup2(2, 1)
+    serve(stdin, stdout)
+
+
+if __name__ == '__main__':
+    main()
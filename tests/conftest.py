@@ -0,0 +1,95 @@
+# encoding: utf-8
+
+"""
+Tests run on `headless`, the Chimera stand-in. Those that import
+`plipgui.analysis` or `plipgui.plip4chimera` need PLIP to be importable
+(OpenBabel is only needed to run actual analyses).
+"""
+
+from __future__ import print_function, division
+# Python stdlib
+import sys
+# Own
+import headless
+
+chimera = headless.install()
+import pytest
+
+
+#: Three alanines around a ligand, a water near it and another far away
+COMPLEX = [('ATOM  ', 'ALA', 'A', 1, [('N', 'N', 0.0), ('CA', 'C', 1.2), ('CB', 'C', 2.4)]),
+           ('ATOM  ', 'ALA', 'A', 2, [('N', 'N', 4.0), ('CA', 'C', 5.2), ('CB', 'C', 6.4)]),
+           ('ATOM  ', 'ALA', 'A', 3, [('N', 'N', 30.0), ('CA', 'C', 31.2), ('CB', 'C', 32.4)]),
+           ('HETATM', 'LIG', 'L', 1, [('C1', 'C', 3.0), ('C2', 'C', 4.2), ('O1', 'O', 5.4)]),
+           ('HETATM', 'HOH', 'W', 1, [('O', 'O', 7.0)]),
+           ('HETATM', 'HOH', 'W', 2, [('O', 'O', 60.0)])]
+
+
+def complex_pdb():
+    """
+    PDB contents of `COMPLEX`. Protein atoms lie on y = 0 and the rest on
+    y = 2, so every residue but ALA 3 and the far water is in the pocket.
+    """
+    lines, serial = [], 0
+    for record, resname, chain, position, atoms in COMPLEX:
+        y = 0.0 if record == 'ATOM  ' else 2.0
+        for name, element, x in atoms:
+            serial += 1
+            lines.append('%s%5d  %-3s %3s %s%4d    %8.3f%8.3f%8.3f  1.00  0.00          %2s\n' % (
+                record, serial, name, resname, chain, position, x, y, 0.0, element))
+    ligand = [i + 1 for i, line in enumerate(lines) if ' LIG ' in line]
+    lines.append('CONECT%5d%5d\n' % (ligand[0], ligand[1]))
+    lines.append('CONECT%5d%5d%5d\n' % (ligand[1], ligand[0], ligand[2]))
+    lines.append('END\n')
+    return ''.join(lines)
+
+
+@pytest.fixture(autouse=True)
+def session():
+    """
+    A clean Chimera session for each test
+    """
+    yield chimera
+    plip4chimera = sys.modules.get('plipgui.plip4chimera')
+    if plip4chimera is not None:
+        plip4chimera.registry.teardown()
+    chimera.openModels.close(chimera.openModels.list())
+    chimera.PseudoBondMgr._global = None
+    del headless.commands[:]
+
+
+@pytest.fixture
+def open_complex():
+    """
+    Factory of `COMPLEX` molecules, opened as new models or, with
+    ``sameAs``, as submodels of another one (like docking poses)
+    """
+    def open_complex(sameAs=None):
+        molecule, = headless.read_pdb(complex_pdb(), 'complex.pdb')
+        chimera.openModels.add([molecule], sameAs=sameAs)
+        return molecule
+    return open_complex
+
+
+class _Pairs(object):
+
+    def __init__(self, **tables):
+        self.__dict__.update(tables)
+
+
+@pytest.fixture
+def view_data():
+    """
+    Factory of minimal stand-ins for PLIP's VisualizerData, with the
+    given hydrophobic contacts and ligand-donor hydrogen bonds (pairs
+    of PLIP serial numbers) and pi-stacking (pairs of ring centers)
+    """
+    def view_data(uid='LIG:L:1', hydrophobic=(), hbonds=(), stacking=()):
+        pistacking = [_Pairs(proteinring_center=protein, ligandring_center=ligand,
+                             proteinring_atoms=[]) for (protein, ligand) in stacking]
+        return _Pairs(uid=uid, pdbid='TEST', hetid=uid.split(':')[0], metal_ids=[],
+                      hydrophobic_contacts=_Pairs(pairs_ids=list(hydrophobic)),
+                      hbonds=_Pairs(ldon_id=list(hbonds), pdon_id=[]),
+                      halogen_bonds=[], pistacking=pistacking, pication=[], saltbridges=[],
+                      waterbridges=[], metal_complexes=[])
+    return view_data
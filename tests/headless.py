@@ -0,0 +1,536 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Lightweight stand-in for the parts of the UCSF Chimera API used by this
+package and by PLIP's ChimeraVisualizer, so `core` and `plip4chimera` can
+be run, timed and tested on machines without Chimera or a display::
+
+    import headless  # with this directory in sys.path
+    headless.install()
+    from plipgui import core, plip4chimera
+
+It lives with the tests, and is not part of the installed package.
+
+It provides molecules, residues and atoms (read from PDB files or streams),
+``openModels``, pseudobond groups and managers, ``pdbWrite``/``PDBio``,
+``runCommand`` (commands are only recorded, in `commands`), ``replyobj``,
+``statusline`` and the ``Molecule.copy_molecule`` and ``Midas.MidasError``
+bits. Molecules can hold several coordinate sets (``coordSets``, e.g. the
+frames of a trajectory), of which ``activeCoordSet`` gives the coordinates
+atoms report. Nothing is drawn.
+"""
+
+from __future__ import print_function, division
+# Python stdlib
+import sys
+import types
+
+
+#: Commands passed to runCommand, in order
+commands = []
+
+
+class Point(object):
+
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.x, self.y, self.z = x, y, z
+
+    def __iter__(self):
+        return iter((self.x, self.y, self.z))
+
+    def __repr__(self):
+        return 'Point({:.3f}, {:.3f}, {:.3f})'.format(self.x, self.y, self.z)
+
+
+Coord = Point
+
+
+class Xform(object):
+
+    @staticmethod
+    def identity():
+        return Xform()
+
+    def apply(self, point):
+        return point
+
+
+class OpenState(object):
+
+    def __init__(self):
+        self.xform = Xform()
+
+
+class Element(object):
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return 'Element({})'.format(self.name)
+
+
+class MaterialColor(object):
+
+    def __init__(self, name):
+        self.name = name
+
+
+class MolResId(object):
+
+    def __init__(self, chainId, position, insertionCode=' '):
+        self.chainId = chainId
+        self.position = position
+        self.insertionCode = insertionCode
+
+    def __str__(self):
+        return '{}{}.{}'.format(self.position, self.insertionCode.strip(), self.chainId)
+
+
+class Atom(object):
+
+    __destroyed__ = False
+
+    def __init__(self, name, element, coord=None):
+        self.name = name
+        self.element = element if isinstance(element, Element) else Element(element)
+        self._coord = coord or Point()
+        self.serialNumber = 0
+        self.altLoc = ''
+        self.occupancy = 1.0
+        self.bfactor = 0.0
+        self.residue = None
+        self.molecule = None
+        self.neighbors = []
+        self.display = True
+        self.color = None
+
+    def coord(self):
+        coordset = self.molecule and self.molecule.activeCoordSet
+        if coordset is not None:
+            return coordset.coords.get(self, self._coord)
+        return self._coord
+
+    def xformCoord(self):
+        return self.coord()
+
+    def setCoord(self, coord, coordSet=None):
+        """
+        Set the coordinates of the atom in `coordSet` (the active one by
+        default). Coordinate sets without their own fall back to the
+        coordinates the atom was read with.
+        """
+        coordset = coordSet or (self.molecule and self.molecule.activeCoordSet)
+        if coordset is None:
+            self._coord = coord
+        else:
+            coordset.coords[self] = coord
+
+    def oslIdent(self):
+        return '{}@{}'.format(self.residue.oslIdent(), self.name)
+
+    def __repr__(self):
+        return '<Atom {}>'.format(self.oslIdent() if self.residue else self.name)
+
+
+class Residue(object):
+
+    __destroyed__ = False
+
+    def __init__(self, type, id, molecule=None, isHet=False):
+        self.type = type
+        self.id = id
+        self.molecule = molecule
+        self.isHet = isHet
+        self.atoms = []
+
+    def addAtom(self, atom):
+        atom.residue = self
+        atom.molecule = self.molecule
+        self.atoms.append(atom)
+
+    def oslIdent(self):
+        return '{}:{}'.format(self.molecule.oslIdent() if self.molecule else '', self.id)
+
+
+class Bond(object):
+
+    Wire, Stick, Spring = 0, 1, 2
+
+
+class PseudoBond(object):
+
+    def __init__(self, atom1, atom2):
+        self.atoms = atom1, atom2
+        self.display = True
+        self.color = None
+        self.drawMode = Bond.Wire
+        self.radius = 0.2
+        self.label = ''
+
+
+class PseudoBondGroup(object):
+
+    __destroyed__ = False
+
+    def __init__(self, category):
+        self.category = category
+        self.name = category
+        self.pseudoBonds = []
+        self.display = True
+        self.lineType = Solid
+        self.lineWidth = 1
+        self.color = None
+        self.id, self.subid = -1, 0
+
+    def newPseudoBond(self, atom1, atom2):
+        bond = PseudoBond(atom1, atom2)
+        self.pseudoBonds.append(bond)
+        return bond
+
+    def destroy(self):
+        self.__destroyed__ = True
+
+
+class PseudoBondMgr(object):
+
+    _global = None
+
+    def __init__(self):
+        self.pseudoBondGroupsMap = {}
+
+    @classmethod
+    def mgr(cls):
+        if cls._global is None:
+            cls._global = cls()
+        return cls._global
+
+    @property
+    def pseudoBondGroups(self):
+        return list(self.pseudoBondGroupsMap.values())
+
+    def newPseudoBondGroup(self, category):
+        group = self.pseudoBondGroupsMap[category] = PseudoBondGroup(category)
+        return group
+
+    def findPseudoBondGroup(self, category):
+        return self.pseudoBondGroupsMap.get(category)
+
+    def deletePseudoBondGroup(self, group):
+        if self.pseudoBondGroupsMap.get(group.category) is group:
+            del self.pseudoBondGroupsMap[group.category]
+        group.destroy()
+
+
+class CoordSet(object):
+
+    def __init__(self, id):
+        self.id = id
+        self.coords = {}
+
+
+class Molecule(object):
+
+    __destroyed__ = False
+
+    def __init__(self, name=''):
+        self.name = name
+        self.id, self.subid = -1, 0
+        self.residues = []
+        self.display = True
+        self.openState = OpenState()
+        self.coordSets = {}
+        self.activeCoordSet = None
+        self._pbmgr = None
+
+    @property
+    def atoms(self):
+        return [atom for residue in self.residues for atom in residue.atoms]
+
+    @property
+    def numAtoms(self):
+        return sum(len(residue.atoms) for residue in self.residues)
+
+    def newResidue(self, type, chainId, position=1, insertionCode=' '):
+        if isinstance(chainId, MolResId):
+            rid = chainId
+        else:
+            rid = MolResId(chainId, position, insertionCode)
+        residue = Residue(type, rid, molecule=self)
+        self.residues.append(residue)
+        return residue
+
+    def newCoordSet(self, key, size=0):
+        coordset = self.coordSets[key] = CoordSet(key)
+        if self.activeCoordSet is None:
+            self.activeCoordSet = coordset
+        return coordset
+
+    def findCoordSet(self, key):
+        return self.coordSets.get(key)
+
+    def deleteCoordSet(self, coordset):
+        if self.coordSets.get(coordset.id) is coordset:
+            del self.coordSets[coordset.id]
+        if self.activeCoordSet is coordset:
+            self.activeCoordSet = None
+
+    def newAtom(self, name, element):
+        atom = Atom(name, element)
+        atom.molecule = self
+        return atom
+
+    def newBond(self, atom1, atom2):
+        if atom2 not in atom1.neighbors:
+            atom1.neighbors.append(atom2)
+            atom2.neighbors.append(atom1)
+
+    def deleteAtom(self, atom):
+        residue = atom.residue
+        if residue is not None:
+            residue.atoms.remove(atom)
+            if not residue.atoms:
+                self.residues.remove(residue)
+        for other in atom.neighbors:
+            other.neighbors.remove(atom)
+        atom.__destroyed__ = True
+
+    def pseudoBondMgr(self):
+        if self._pbmgr is None:
+            self._pbmgr = PseudoBondMgr()
+        return self._pbmgr
+
+    def oslIdent(self):
+        if self.subid:
+            return '#{}.{}'.format(self.id, self.subid)
+        return '#{}'.format(self.id)
+
+    def destroy(self):
+        self.__destroyed__ = True
+
+    def __repr__(self):
+        return '<Molecule {} {}>'.format(self.oslIdent(), self.name)
+
+
+class OpenModels(object):
+
+    def __init__(self):
+        self._models = []
+
+    def list(self, modelTypes=None, id=None, subid=None, **kwargs):
+        models = [m for m in self._models if not m.__destroyed__]
+        if modelTypes:
+            models = [m for m in models if isinstance(m, tuple(modelTypes))]
+        if id is not None:
+            models = [m for m in models if m.id == id]
+        if subid is not None:
+            models = [m for m in models if m.subid == subid]
+        return models
+
+    def add(self, models, sameAs=None, baseId=None, hidden=False, **kwargs):
+        for model in models:
+            if sameAs is not None:
+                model.id = sameAs.id
+                model.subid = max(m.subid for m in self.list(id=sameAs.id)) + 1
+            else:
+                used = set(m.id for m in self._models if not m.__destroyed__)
+                model.id = baseId or 0
+                while model.id in used:
+                    model.id += 1
+                model.subid = 0
+            self._models.append(model)
+
+    def open(self, path, type='PDB', **kwargs):
+        import gzip
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            text = f.read()
+        if not isinstance(text, str):
+            text = text.decode('ascii', 'replace')
+        name = path.replace('\\', '/').rsplit('/', 1)[-1]
+        molecules = read_pdb(text, name)
+        self.add(molecules)
+        return molecules
+
+    def close(self, models):
+        for model in models:
+            model.destroy()
+            if isinstance(model, Molecule) and model._pbmgr is not None:
+                for group in model._pbmgr.pseudoBondGroups:
+                    group.destroy()
+        self._models = [m for m in self._models if not m.__destroyed__]
+
+
+class PDBio(object):
+
+    def readPDBstream(self, stream, name, lineNumber=0):
+        return read_pdb(stream.read(), name), {}
+
+
+class _Viewer(object):
+
+    def updateCB(self, viewer):
+        pass
+
+
+class _ReplyObj(object):
+
+    def info(self, text):
+        sys.stdout.write(text)
+
+    def message(self, text):
+        sys.stdout.write(text)
+
+    def status(self, text, **kwargs):
+        pass
+
+    def warning(self, text):
+        sys.stderr.write(text + '\n')
+
+    def error(self, text):
+        sys.stderr.write(text + '\n')
+
+
+class _StatusLine(object):
+
+    def show_message(self, text, **kwargs):
+        pass
+
+
+class MidasError(Exception):
+    pass
+
+
+Solid, Dash = 0, 1
+
+
+def runCommand(command):
+    commands.append(command)
+
+
+def getPseudoBondGroup(category, associateWith=None, modelID=None, hidden=True, **kwargs):
+    mgr = PseudoBondMgr.mgr()
+    group = mgr.findPseudoBondGroup(category)
+    if group is None:
+        group = mgr.newPseudoBondGroup(category)
+    return group
+
+
+def getColorByName(name):
+    return MaterialColor(name)
+
+
+def read_pdb(text, name='structure.pdb'):
+    """
+    Molecules (one per MODEL) in the PDB `text`. Only coordinates and
+    CONECT records are read; residues follow the order of the file.
+    """
+    molecules, molecule, residue, key = [], None, None, None
+    by_serial = {}
+    for line in text.splitlines():
+        record = line[:6]
+        if record in ('ATOM  ', 'HETATM'):
+            if molecule is None:
+                molecule = Molecule(name)
+                molecule.newCoordSet(0)
+                molecules.append(molecule)
+            resname, chain = line[17:21].strip(), line[21].strip()
+            position, icode = int(line[22:26]), line[26:27] or ' '
+            if (resname, chain, position, icode) != key:
+                key = resname, chain, position, icode
+                residue = molecule.newResidue(resname, MolResId(chain, position, icode))
+                residue.isHet = record == 'HETATM'
+            name_ = line[12:16].strip()
+            element = line[76:78].strip() or name_.lstrip('0123456789')[:1]
+            atom = Atom(name_, element.capitalize() if len(element) > 1 else element,
+                        Point(float(line[30:38]), float(line[38:46]), float(line[46:54])))
+            atom.serialNumber = int(line[6:11])
+            atom.altLoc = line[16].strip()
+            atom.occupancy = float(line[54:60] or 1.0)
+            atom.bfactor = float(line[60:66] or 0.0)
+            residue.addAtom(atom)
+            by_serial[atom.serialNumber] = atom
+        elif record == 'ENDMDL':
+            molecule, key = None, None
+        elif record == 'CONECT':
+            fields = [line[i:i + 5] for i in range(6, 31, 5)]
+            serials = [int(f) for f in fields if f.strip()]
+            atom = by_serial.get(serials[0]) if serials else None
+            for serial in serials[1:]:
+                other = by_serial.get(serial)
+                if atom is not None and other is not None:
+                    atom.molecule.newBond(atom, other)
+    return molecules
+
+
+def pdbWrite(molecules, xform, stream, **kwargs):
+    serial = 0
+    for molecule in molecules:
+        for residue in molecule.residues:
+            record = 'HETATM' if residue.isHet else 'ATOM  '
+            for atom in residue.atoms:
+                serial += 1
+                c = atom.coord()
+                name = atom.name if len(atom.name) > 3 else ' ' + atom.name
+                stream.write('{}{:5d} {:<4}{:1}{:>3} {:1}{:4d}{:1}   {:8.3f}{:8.3f}{:8.3f}'
+                             '{:6.2f}{:6.2f}          {:>2}\n'.format(
+                                 record, serial, name, atom.altLoc or ' ', residue.type,
+                                 residue.id.chainId or ' ', residue.id.position,
+                                 residue.id.insertionCode or ' ', c.x, c.y, c.z,
+                                 atom.occupancy, atom.bfactor, atom.element.name.upper()))
+    stream.write('END\n')
+
+
+def copy_molecule(molecule):
+    copy = Molecule(molecule.name)
+    copy.newCoordSet(0)
+    atoms = {}
+    for residue in molecule.residues:
+        residue_copy = copy.newResidue(residue.type, MolResId(
+            residue.id.chainId, residue.id.position, residue.id.insertionCode))
+        residue_copy.isHet = residue.isHet
+        for atom in residue.atoms:
+            atom_copy = atoms[atom] = Atom(atom.name, atom.element.name, Point(*atom.coord()))
+            for attr in ('serialNumber', 'altLoc', 'occupancy', 'bfactor'):
+                setattr(atom_copy, attr, getattr(atom, attr))
+            residue_copy.addAtom(atom_copy)
+    for atom, atom_copy in atoms.items():
+        atom_copy.neighbors = [atoms[a] for a in atom.neighbors if a in atoms]
+    return copy
+
+
+def install(force=False):
+    """
+    Register the stand-in ``chimera``, ``chimera.misc``, ``chimera.colorTable``,
+    ``Molecule`` and ``Midas`` modules, unless the real Chimera is importable
+    (or `force` is True). Returns the ``chimera`` module in use.
+    """
+    if not force:
+        try:
+            import chimera
+            return chimera
+        except ImportError:
+            pass
+    chimera = _module('chimera', nogui=True, Point=Point, Coord=Coord, Xform=Xform,
+                      Element=Element, MaterialColor=MaterialColor, MolResId=MolResId,
+                      Atom=Atom, Residue=Residue, Molecule=Molecule, CoordSet=CoordSet,
+                      Bond=Bond,
+                      PseudoBond=PseudoBond, PseudoBondGroup=PseudoBondGroup,
+                      PseudoBondMgr=PseudoBondMgr, PDBio=PDBio, pdbWrite=pdbWrite,
+                      runCommand=runCommand,
+                      openModels=OpenModels(), viewer=_Viewer(), replyobj=_ReplyObj(),
+                      statusline=_StatusLine(), Solid=Solid, Dash=Dash)
+    chimera.__path__ = []
+    chimera.misc = _module('chimera.misc', getPseudoBondGroup=getPseudoBondGroup)
+    chimera.colorTable = _module('chimera.colorTable', getColorByName=getColorByName)
+    _module('Molecule', copy_molecule=copy_molecule)
+    _module('Midas', MidasError=MidasError, runCommand=runCommand)
+    return chimera
+
+
+def _module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    return module
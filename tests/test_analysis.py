@@ -0,0 +1,72 @@
+# encoding: utf-8
+
+from __future__ import print_function, division
+from collections import namedtuple
+import sys
+import types
+import pytest
+
+analysis = pytest.importorskip('plipgui.analysis')
+
+Interaction = namedtuple('Interaction', 'resnr reschain restype')
+
+
+def test_required_interactions():
+    assert analysis.required_interactions(None) is None
+    assert analysis.required_interactions(['halogen']) == {'halogen'}
+    assert analysis.required_interactions(['hydrophobic']) == {'hydrophobic', 'pistacking'}
+    assert analysis.required_interactions(['waterbridge']) == {'waterbridge', 'hbond',
+                                                                'saltbridge'}
+
+
+def test_only_interactions_keeps_dependencies():
+    preparation = pytest.importorskip('plip.modules.preparation')
+    detectors = dict((t, getattr(preparation, analysis.DETECTORS[t]))
+                     for t in analysis.INTERACTIONS)
+    with analysis.only_interactions(['hbond', 'pication']):
+        running = set(t for t in analysis.INTERACTIONS
+                      if getattr(preparation, analysis.DETECTORS[t]) is detectors[t])
+    assert running == {'hbond', 'saltbridge', 'pication', 'pistacking'}
+    for interaction, detector in detectors.items():
+        assert getattr(preparation, analysis.DETECTORS[interaction]) is detector
+
+
+def test_only_interactions_with_stub_detectors(monkeypatch):
+    # A stand-in for plip.modules.preparation, which needs OpenBabel
+    import plip.modules
+    preparation = types.ModuleType('plip.modules.preparation')
+    detectors = {}
+    for interaction in analysis.INTERACTIONS:
+        detectors[interaction] = lambda *args: ['found']
+        setattr(preparation, analysis.DETECTORS[interaction], detectors[interaction])
+    monkeypatch.setitem(sys.modules, 'plip.modules.preparation', preparation)
+    monkeypatch.setattr(plip.modules, 'preparation', preparation, raising=False)
+    loaded = set(sys.modules)
+    with analysis.only_interactions(('hbond',)):
+        running = set(t for t in analysis.INTERACTIONS
+                      if getattr(preparation, analysis.DETECTORS[t])() == ['found'])
+    assert running == {'hbond', 'saltbridge'}
+    assert 'pistacking' not in running
+    for interaction, detector in detectors.items():
+        assert getattr(preparation, analysis.DETECTORS[interaction]) is detector
+    assert not set(sys.modules).difference(loaded).intersection(['openbabel', 'pybel'])
+
+
+def test_drop_interactions():
+    class InteractionSet(object):
+        pass
+
+    interaction_set = InteractionSet()
+    for names in analysis.INTERACTION_ATTRIBUTES.values():
+        for name in names:
+            setattr(interaction_set, name, [])
+    interaction_set.saltbridge_lneg = [Interaction(1, 'A', 'ARG')]
+    interaction_set.hbonds_ldon = [Interaction(2, 'B', 'SER'), Interaction(3, 'W', 'HOH')]
+    analysis.drop_interactions(interaction_set, ['hbond'])
+    assert interaction_set.saltbridge_lneg == []
+    assert len(interaction_set.hbonds_ldon) == 2
+    assert interaction_set.interacting_chains == ['B', 'W']
+    assert interaction_set.interacting_res == ['2B']
+    assert not interaction_set.no_interactions
+    analysis.drop_interactions(interaction_set, ['halogen'])
+    assert interaction_set.no_interactions and interaction_set.all_itypes == []
@@ -0,0 +1,70 @@
+# encoding: utf-8
+
+from __future__ import print_function, division
+import threading
+import time
+import pytest
+
+from plipgui import background
+
+
+class FakeWidget(object):
+
+    def __init__(self):
+        self.pending = []
+
+    def after(self, ms, callback):
+        self.pending.append(callback)
+        return callback
+
+    def after_cancel(self, after_id):
+        self.pending.remove(after_id)
+
+    def run(self, seconds=10):
+        deadline = time.time() + seconds
+        while self.pending and time.time() < deadline:
+            time.sleep(0.01)
+            self.pending.pop(0)()
+
+
+@pytest.fixture
+def fake_plip(monkeypatch):
+    analysis = pytest.importorskip('plipgui.analysis')
+    calls, release = [], threading.Event()
+
+    def analyze(pdb, progress=None, **kwargs):
+        calls.append(kwargs)
+        progress('Detecting interactions')
+        release.wait(10)
+        return 'analysis of ' + pdb
+
+    monkeypatch.setattr(analysis, 'analyze_with_plip', analyze)
+    return calls, release
+
+
+def test_local_analyses_run_in_the_worker(fake_plip):
+    calls, release = fake_plip
+    events = []
+    task = background.BackgroundAnalysis('ATOM', backend='local', on_progress=events.append,
+                                         on_done=events.append, on_error=events.append)
+    widget = FakeWidget()
+    task.start(widget)
+    release.set()
+    widget.run()
+    assert events == ['Detecting interactions', 'analysis of ATOM']
+    assert calls == [{'backend': 'worker'}] and not task.running
+
+
+def test_cancel_does_not_wait(fake_plip, monkeypatch):
+    from plipgui import worker
+    calls, release = fake_plip
+    stopped = []
+    monkeypatch.setattr(worker, 'get_worker', lambda: stopped.append(True) or worker.Worker())
+    task = background.BackgroundAnalysis('ATOM', backend='worker')
+    widget = FakeWidget()
+    task.start(widget)
+    t0 = time.time()
+    task.cancel()
+    assert time.time() - t0 < 0.5
+    assert stopped and not task.running and not widget.pending
+    release.set()
@@ -0,0 +1,41 @@
+# encoding: utf-8
+
+from __future__ import print_function, division
+import os
+import pytest
+
+from plipgui import cache as cache_module
+from plipgui.cache import ResultCache, cache_key
+
+
+def test_eviction_lists_the_directory_rarely(tmpdir, monkeypatch):
+    listings = []
+    listdir = os.listdir
+    monkeypatch.setattr(os, 'listdir', lambda path: listings.append(path) or listdir(path))
+    cache = ResultCache(str(tmpdir), max_size=50000)
+    for i in range(300):
+        cache.put(str(i), os.urandom(500))
+    # Once to measure the cache, then once per eviction to ~90% of max_size
+    assert 1 < len(listings) < 30
+    size = sum(os.path.getsize(str(path)) for path in tmpdir.listdir())
+    assert size <= 50000
+    assert cache.get('299') is not None and cache.get('0') is None
+
+
+def test_rescan_after_other_processes_add_entries(tmpdir, monkeypatch):
+    monkeypatch.setattr(cache_module, 'RESCAN_PUTS', 4)
+    cache, other = ResultCache(str(tmpdir), max_size=5000), ResultCache(str(tmpdir))
+    cache.put('mine', os.urandom(100))
+    for i in range(10):
+        other.put(str(i), os.urandom(1000))
+    for i in range(4):
+        cache.put('mine{}'.format(i), os.urandom(100))
+    assert sum(os.path.getsize(str(path)) for path in tmpdir.listdir()) <= 5000
+
+
+def test_key_includes_the_plip_version():
+    analysis = pytest.importorskip('plipgui.analysis')
+    config = analysis.config_snapshot()
+    assert config['__version__'] == analysis.plip_version() != 'unknown'
+    other = dict(config, __version__='0.0')
+    assert cache_key('ATOM', config) != cache_key('ATOM', other)
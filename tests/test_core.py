@@ -0,0 +1,136 @@
+# encoding: utf-8
+
+from __future__ import print_function, division
+import pytest
+
+pytest.importorskip('plip.modules.chimeraplip')
+from plipgui import core
+
+
+class FakeAnalysis(object):
+
+    def __init__(self, *sites):
+        self.sites = dict((data.uid, (None, data)) for data in sites)
+        self.txtreport = []
+
+
+class _Button(object):
+
+    def configure(self, **kwargs):
+        pass
+
+
+class FakeDialog(object):
+
+    """
+    The parts of the PLIP dialog the Controller reaches before showing results
+    """
+
+    buttonWidgets = {'Run': _Button(), 'Cancel': _Button()}
+    progress = ''
+
+    def set_running(self, running):
+        pass
+
+    def set_progress(self, text):
+        self.progress = text
+
+
+@pytest.fixture
+def controller(open_complex, view_data):
+    """
+    A Controller whose model has two binding sites, A and B, with a
+    hydrophobic contact and a hydrogen bond each
+    """
+    molecule = open_complex()
+    controller = core.Controller(FakeDialog(), prefetch=False)
+    controller.model = core.Model(molecule, run=False)
+    controller.model.prepare()
+    controller.model.analysis = FakeAnalysis(
+        view_data('A:L:1', hydrophobic=[(3, 10)], hbonds=[(12, 4)]),
+        view_data('B:L:1', hydrophobic=[(6, 11)], hbonds=[(12, 1)]))
+    return controller
+
+
+def displayed(controller, site):
+    """
+    Display of the groups that hold pseudobonds of `site`, by interaction
+    """
+    return dict((interaction, [g.display for g in groups if g.pseudoBonds])
+                for interaction, groups in controller._depicted[site].items()
+                if any(g.pseudoBonds for g in groups))
+
+
+def test_depict_switches_sites(session, controller):
+    controller.depict('A:L:1')
+    assert displayed(controller, 'A:L:1') == {'hydrophobic': [True], 'hbond': [True]}
+    controller.depict('B:L:1')
+    assert displayed(controller, 'A:L:1') == {'hydrophobic': [False], 'hbond': [False]}
+    assert displayed(controller, 'B:L:1') == {'hydrophobic': [True], 'hbond': [True]}
+
+    manager = session.PseudoBondMgr.mgr()
+    n_bonds = sum(len(g.pseudoBonds) for g in manager.pseudoBondGroups)
+    assert n_bonds == 4
+    controller.depict('A:L:1')
+    # Sites are drawn once; switching back only toggles their groups
+    assert sum(len(g.pseudoBonds) for g in manager.pseudoBondGroups) == n_bonds
+    assert displayed(controller, 'A:L:1') == {'hydrophobic': [True], 'hbond': [True]}
+    assert displayed(controller, 'B:L:1') == {'hydrophobic': [False], 'hbond': [False]}
+
+
+def test_show_interaction(controller):
+    controller.depict('A:L:1')
+    controller.show_interaction('hbond', False)
+    assert displayed(controller, 'A:L:1') == {'hydrophobic': [True], 'hbond': [False]}
+    # Hidden types stay hidden in the sites shown afterwards
+    controller.depict('B:L:1')
+    assert displayed(controller, 'B:L:1') == {'hydrophobic': [True], 'hbond': [False]}
+    controller.show_interaction('hbond', True)
+    assert displayed(controller, 'B:L:1') == {'hydrophobic': [True], 'hbond': [True]}
+    controller.depict('A:L:1')
+    assert displayed(controller, 'A:L:1') == {'hydrophobic': [True], 'hbond': [True]}
+    assert displayed(controller, 'B:L:1') == {'hydrophobic': [False], 'hbond': [False]}
+
+
+def test_foreground_failure_cleans_up(session, open_complex, monkeypatch):
+    from plipgui import plip4chimera
+    from plipgui.worker import WorkerError
+
+    def crash(pdb, **kwargs):
+        raise WorkerError('PLIP worker died')
+
+    monkeypatch.setattr(plip4chimera, 'analyze_with_plip', crash)
+    molecule = open_complex()
+    controller = core.Controller(FakeDialog(), prefetch=False)
+    controller.model = core.Model(molecule, run=False, backend='worker')
+    controller._run_foreground()
+    assert controller.model is None
+    assert controller.gui.progress == 'PLIP failed! Check the Reply Log'
+    assert session.openModels.list() == [molecule] and molecule.display
+    assert len(plip4chimera.registry) == 0
+
+
+class _Selection(object):
+
+    def __init__(self, *molecules):
+        self._molecules = list(molecules)
+
+    def molecules(self):
+        return self._molecules
+
+    def residues(self):
+        return [r for m in self._molecules for r in m.residues]
+
+
+def test_report_goes_to_the_reply_log(session, open_complex, monkeypatch, capsys):
+    from plipgui import plip4chimera
+    molecule = open_complex()
+    analysis = FakeAnalysis()
+    analysis.txtreport = ['Prediction of noncovalent interactions']
+    monkeypatch.setattr(plip4chimera, 'do', lambda molecules, **kwargs:
+                        [(m, ([], analysis)) for m in molecules])
+    logged = []
+    monkeypatch.setattr(session.replyobj, 'info', logged.append)
+    core.cmd_plip(_Selection(molecule))
+    assert logged == ['Prediction of noncovalent interactions\n']
+    assert capsys.readouterr()[0] == ''
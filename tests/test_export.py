@@ -0,0 +1,80 @@
+# encoding: utf-8
+
+from __future__ import print_function, division
+import pytest
+
+pytest.importorskip('plip.modules.chimeraplip')
+from plipgui import plip4chimera
+
+
+def pdb_atoms(pdb):
+    """
+    Serial -> (chain, position, name, (x, y, z)) of the atoms in `pdb`
+    """
+    atoms = {}
+    for line in pdb.splitlines():
+        if line.startswith(('ATOM  ', 'HETATM')):
+            atoms[int(line[6:11])] = (line[21].strip(), int(line[22:26]), line[12:16].strip(),
+                                      tuple(float(line[i:i + 8]) for i in (30, 38, 46)))
+    return atoms
+
+
+def describe(atom):
+    c = atom.coord()
+    return (atom.residue.id.chainId, atom.residue.id.position, atom.name,
+            (round(c.x, 3), round(c.y, 3), round(c.z, 3)))
+
+
+def test_copy_matches_export(open_complex):
+    molecule = open_complex()
+    pdb, copy, atoms = plip4chimera.patch_molecule(molecule)
+    exported = pdb_atoms(pdb)
+    assert copy is not molecule and not molecule.display
+    assert sorted(atoms) == sorted(exported) == list(range(1, 15))
+    for serial, atom in atoms.items():
+        assert atom.molecule is copy and atom.serialNumber == serial
+        assert describe(atom) == exported[serial]
+
+
+def test_no_copy_matches_export(open_complex):
+    molecule = open_complex()
+    pdb, target, atoms = plip4chimera.prepare_molecule(molecule, copy=False)
+    assert target is molecule
+    exported = pdb_atoms(pdb)
+    assert sorted(atoms) == sorted(exported)
+    for serial, atom in atoms.items():
+        assert atom.molecule is molecule and describe(atom) == exported[serial]
+    # Reading the text back gives the same table
+    assert plip4chimera.serial_table(molecule, pdb) == atoms
+
+
+def test_pocket_export(open_complex):
+    molecule = open_complex()
+    residues = plip4chimera.pocket_residues(molecule, 0)
+    assert [(r.type, r.id.position) for r in residues] == [
+        ('ALA', 1), ('ALA', 2), ('LIG', 1), ('HOH', 1)]
+
+    # Ligands far apart keep the neighbors of each
+    ligand, water = molecule.residues[3], molecule.residues[5]
+    residues = plip4chimera.pocket_residues(molecule, 0, ligands=[ligand, water])
+    assert [(r.type, r.id.position) for r in residues] == [
+        ('ALA', 1), ('ALA', 2), ('LIG', 1), ('HOH', 1), ('HOH', 2)]
+
+    pdb, copy, atoms = plip4chimera.patch_molecule(molecule, pocket=1)
+    exported = pdb_atoms(pdb)
+    assert sorted(atoms) == sorted(exported) == list(range(1, 11))
+    for serial, atom in atoms.items():
+        assert describe(atom) == exported[serial]
+    # The copy is whole: atoms left out of the pocket are not in the table
+    assert len(copy.atoms) == len(molecule.atoms) == 14
+    # Ligand bonds use the renumbered serials
+    conect = [line for line in pdb.splitlines() if line.startswith('CONECT')]
+    assert conect == ['CONECT    7    8', 'CONECT    8    7    9', 'CONECT    9    8']
+
+
+def test_stand_in_reads_four_letter_residue_names():
+    import headless
+    line = '%-6s%5d %-4s %-4s%s%4d    %8.3f%8.3f%8.3f  1.00  0.00          %2s\n' % (
+        'HETATM', 1, ' C1', 'LIGA', 'L', 1, 0.0, 0.0, 0.0, 'C')
+    molecule, = headless.read_pdb(line)
+    assert molecule.residues[0].type == 'LIGA'
@@ -0,0 +1,129 @@
+# encoding: utf-8
+
+from __future__ import print_function, division
+import os
+import signal
+import threading
+import time
+import pytest
+
+from plipgui import pool as pool_module
+from plipgui.pool import CrashSafePool, PoolError
+
+
+class FakeAnalysis(object):
+
+    sites = {}
+    txtreport = ['report']
+
+
+def fake_plip(pdb, **kwargs):
+    """
+    Stand-in for analyze_with_plip: ``CRASH`` segfaults the worker,
+    ``SLOW`` never finishes and ``FAIL`` raises
+    """
+    if pdb.startswith('CRASH'):
+        os.kill(os.getpid(), signal.SIGSEGV)
+    if pdb.startswith('SLOW'):
+        time.sleep(60)
+    if pdb.startswith('FAIL'):
+        raise ValueError('bad structure')
+    return FakeAnalysis()
+
+
+def square(x):
+    if x < 0:
+        fake_plip('CRASH')
+    return x * x
+
+
+def test_pool_survives_crashes():
+    with CrashSafePool(2) as pool:
+        results = pool.map(square, [1, -1, 3, 4])
+        assert results[0] == 1 and results[2:] == [9, 16]
+        assert isinstance(results[1], PoolError)
+        assert 'signal {}'.format(signal.SIGSEGV) in str(results[1])
+        # The lost worker was replaced
+        assert pool.map(square, [5, 6]) == [25, 36]
+
+
+def test_pool_timeout():
+    with CrashSafePool(1, timeout=0.5) as pool:
+        t0 = time.time()
+        error, = pool.map(fake_plip, ['SLOW'])
+        assert isinstance(error, PoolError) and 'Timed out' in str(error)
+        assert time.time() - t0 < 10
+        result, = pool.map(fake_plip, ['ATOM'])
+        assert result.txtreport == ['report']
+
+
+@pytest.fixture
+def forks(monkeypatch):
+    """
+    Threads from which the pool forks its worker processes
+    """
+    threads = []
+    start = pool_module._Worker.start
+
+    def recorded(worker):
+        threads.append(threading.current_thread())
+        start(worker)
+
+    monkeypatch.setattr(pool_module._Worker, 'start', recorded)
+    return threads
+
+
+def test_pool_forks_from_the_calling_thread(forks):
+    with CrashSafePool(2) as pool:
+        results = pool.map(square, [1, -1, 3, -2, 5, 6])
+        assert [results[i] for i in (0, 2, 4, 5)] == [1, 9, 25, 36]
+    # Two workers, plus a replacement for each crash that has jobs left after it
+    assert len(forks) >= 3 and set(forks) == set([threading.current_thread()])
+
+
+def test_apply_async_replaces_lost_workers(forks):
+    results = {}
+    with CrashSafePool(1) as pool:
+        pool.start()
+        for x in (-1, 2, -3, 4):
+            pool.apply_async(square, x, lambda result, x=x: results.setdefault(x, result))
+        deadline = time.time() + 20
+        while len(results) < 4 and time.time() < deadline:
+            pool.start()
+            time.sleep(0.1)
+    assert results[2] == 4 and results[4] == 16
+    assert isinstance(results[-1], PoolError) and isinstance(results[-3], PoolError)
+    assert set(forks) == set([threading.current_thread()])
+
+
+def test_analyze_many_reports_crashes(monkeypatch):
+    analysis = pytest.importorskip('plipgui.analysis')
+    monkeypatch.setattr(analysis, 'analyze_with_plip', fake_plip)
+    results = analysis.analyze_many(['A', 'CRASH', 'FAIL', 'B'], processes=2, cache=False)
+    assert isinstance(results[0], FakeAnalysis) and isinstance(results[3], FakeAnalysis)
+    assert results[1].startswith('PLIP did not finish: Worker process was killed')
+    assert 'ValueError: bad structure' in results[2]
+    with CrashSafePool(2) as pool:
+        for _ in range(2):
+            results = analysis.analyze_many(['A', 'CRASH'], cache=False, pool=pool)
+            assert isinstance(results[0], FakeAnalysis) and 'killed' in results[1]
+
+
+def test_batch_records_crashes(monkeypatch, tmpdir):
+    analysis = pytest.importorskip('plipgui.analysis')
+    from plipgui import batch
+    monkeypatch.setattr(analysis, 'analyze_with_plip', fake_plip)
+    for name, contents in (('good', 'ATOM'), ('crash', 'CRASH'), ('slow', 'SLOW'),
+                           ('bad', 'FAIL')):
+        tmpdir.join(name + '.pdb').write(contents)
+    output = tmpdir.join('reports')
+    paths = batch.collect_structures([str(tmpdir)])
+    rows = batch.run(paths, str(output), processes=2, cache=False, timeout=1)
+    status = dict((row['structure'], (row['status'], row['error'])) for row in rows)
+    assert status['good'] == ('ok', '')
+    assert status['crash'][0] == status['slow'][0] == status['bad'][0] == 'error'
+    assert 'killed by signal' in status['crash'][1]
+    assert 'Timed out' in status['slow'][1]
+    assert 'bad structure' in status['bad'][1]
+    assert len(output.join('summary.tsv').readlines()) == 5
+    assert output.join('good.txt').read() == 'report'
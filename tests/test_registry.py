@@ -0,0 +1,84 @@
+# encoding: utf-8
+
+from __future__ import print_function, division
+import pytest
+
+pytest.importorskip('plip.modules.chimeraplip')
+from plipgui import plip4chimera
+
+
+class FakeAnalysis(object):
+
+    def __init__(self, *sites):
+        self.sites = dict((data.uid, (None, data)) for data in sites)
+
+
+def test_teardown_without_copy(session, open_complex, view_data):
+    """
+    With copy=False, only what PLIP drew on the original is removed
+    """
+    molecule = open_complex()
+    n_atoms = len(molecule.atoms)
+    _, target, atoms = plip4chimera.prepare_molecule(molecule, copy=False)
+    assert target is molecule
+    data = view_data(hydrophobic=[(3, 10)], hbonds=[(12, 4)],
+                     stacking=[((1.0, 0.0, 0.0), (4.0, 2.0, 0.0))])
+    plip4chimera.depict_analysis(FakeAnalysis(data), target, atoms)
+    manager = session.PseudoBondMgr.mgr()
+    assert sum(len(g.pseudoBonds) for g in manager.pseudoBondGroups) == 3
+    assert len(molecule.atoms) == n_atoms + 2  # ring centroids
+
+    assert plip4chimera.undo() == 1
+    assert manager.pseudoBondGroups == []
+    assert len(molecule.atoms) == n_atoms
+    assert not molecule.__destroyed__ and molecule.display
+    assert session.openModels.list() == [molecule]
+    assert molecule not in plip4chimera.registry
+
+
+def test_teardown_with_copies(session, open_complex, view_data):
+    first, second = open_complex(), open_complex()
+    others = session.misc.getPseudoBondGroup('Another tool')
+    for molecule in (first, second):
+        _, target, atoms = plip4chimera.prepare_molecule(molecule, copy=True)
+        plip4chimera.depict_analysis(FakeAnalysis(view_data(hbonds=[(12, 4)])), target, atoms)
+        assert not molecule.display
+    manager = session.PseudoBondMgr.mgr()
+    assert len(manager.pseudoBondGroups) == 2 * 8 + 1
+    assert [m.name for m in session.openModels.list()] == [
+        'complex.pdb', 'complex.pdb', 'PLIP-0', 'PLIP-1']
+
+    # By original or by copy
+    assert plip4chimera.undo([first]) == 1
+    assert plip4chimera.undo([session.openModels.list()[-1]]) == 1
+    assert plip4chimera.undo() == 0
+    assert manager.pseudoBondGroups == [others]
+    assert session.openModels.list() == [first, second]
+    assert first.display and second.display
+
+
+def test_model_discard(session, open_complex, view_data):
+    from plipgui.core import Model
+    model = Model(open_complex(), run=False)
+    model.prepare()
+    plip4chimera.depict_analysis(FakeAnalysis(view_data(hydrophobic=[(3, 10)])),
+                                 model.target, model.atoms)
+    model.discard()
+    assert session.PseudoBondMgr.mgr().pseudoBondGroups == []
+    assert session.openModels.list() == [model.molecule]
+    assert len(plip4chimera.registry) == 0
+
+
+def test_do_cleans_up_failed_batches(session, open_complex, monkeypatch):
+    from plipgui.server import ServerError
+
+    def unreachable(pdbs, **kwargs):
+        raise ServerError('Could not reach the PLIP analysis server')
+
+    monkeypatch.setattr(plip4chimera, 'analyze_many', unreachable)
+    molecules = [open_complex(), open_complex()]
+    with pytest.raises(ServerError):
+        plip4chimera.do(molecules, cache=False, backend='remote')
+    assert session.openModels.list() == molecules
+    assert all(m.display for m in molecules)
+    assert len(plip4chimera.registry) == 0
@@ -0,0 +1,77 @@
+# encoding: utf-8
+
+from __future__ import print_function, division
+import json
+import socket
+import threading
+import time
+import urllib2
+import pytest
+
+analysis = pytest.importorskip('plipgui.analysis')
+from plipgui import server
+from test_pool import FakeAnalysis, fake_plip
+
+
+@pytest.fixture
+def url(monkeypatch):
+    """
+    URL of an analysis server with one worker process, a 1 s timeout
+    and no cache, whose analyses are done by `fake_plip`
+    """
+    monkeypatch.setattr(analysis, 'analyze_with_plip', fake_plip)
+    service = server.AnalysisService(processes=1, cache=False, timeout=1)
+    httpd = server.AnalysisServer(('127.0.0.1', 0), service)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+    service.close()
+
+
+def status(url):
+    return json.loads(urllib2.urlopen(url + '/status', timeout=10).read())
+
+
+def test_server_survives_crashes(url):
+    results = server.analyze_batch(['CRASH', 'SLOW', 'A'], url=url, timeout=30)
+    assert 'killed by signal' in results[0]
+    assert 'Timed out' in results[1]
+    assert isinstance(results[2], FakeAnalysis)
+    counters = status(url)
+    assert counters['in_progress'] == 0 and counters['errors'] == 2
+    # Lost jobs are not left pending, so new submissions run again
+    with pytest.raises(server.ServerError) as error:
+        server.analyze_remote('CRASH', url=url, timeout=30)
+    assert 'killed by signal' in str(error.value)
+    assert status(url)['analyses'] == 4
+
+
+def test_client_timeout():
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    try:
+        url = 'http://127.0.0.1:{}'.format(listener.getsockname()[1])
+        t0 = time.time()
+        with pytest.raises(server.ServerError):
+            server.analyze_remote('A', url=url, timeout=0.5)
+        assert time.time() - t0 < 10
+    finally:
+        listener.close()
+
+
+def test_job_settings_do_not_leak(monkeypatch):
+    seen = []
+    monkeypatch.setattr(analysis, 'analyze_with_plip',
+                        lambda pdb, **kwargs: seen.append(analysis.plip_config.HBOND_DIST_MAX))
+    default = analysis.plip_config.HBOND_DIST_MAX
+    config = {u'HBOND_DIST_MAX': default + 1, u'NOT_A_SETTING': 1, u'__version__': '0.0'}
+    assert server._run_job(('A', config, None, None))[0] == 'done'
+    assert seen == [default + 1] and analysis.plip_config.HBOND_DIST_MAX == default
+    assert not hasattr(analysis.plip_config, 'NOT_A_SETTING')
+    snapshot = analysis.config_snapshot(config)
+    assert snapshot['__version__'] == analysis.plip_version()
+    assert 'NOT_A_SETTING' not in snapshot
@@ -0,0 +1,143 @@
+# encoding: utf-8
+
+from __future__ import print_function, division
+import json
+import pytest
+
+pytest.importorskip('plip.modules.chimeraplip')
+import headless
+from plipgui import trajectory
+from plipgui.occupancy import OccupancyAggregator
+from plipgui.pool import CrashSafePool
+from plipgui.reuse import FrameReuse
+
+FEATURES = ('RESNR', 'RESTYPE', 'RESCHAIN', 'RESNR_LIG', 'RESTYPE_LIG', 'RESCHAIN_LIG',
+            'DIST', 'LIGCARBONIDX', 'PROTCARBONIDX')
+
+
+class FakeReport(object):
+
+    hydrophobic_features = FEATURES
+
+    def __init__(self, *rows):
+        self.hydrophobic_info = list(rows)
+
+
+class FakeAnalysis(object):
+
+    def __init__(self, *rows):
+        self.sites = {'LIG:L:1': (FakeReport(*rows), None)}
+
+
+def fake_analyze_many(pdbs, **kwargs):
+    """
+    Stand-in for analyze_many, finding a hydrophobic contact between ALA 1 CB
+    and the ligand's C1 while they are closer than 2.5 A
+    """
+    fake_analyze_many.calls.append(len(pdbs))
+    fake_analyze_many.pools.append(kwargs.get('pool'))
+    results = []
+    for pdb in pdbs:
+        molecule, = headless.read_pdb(pdb)
+        atoms = dict(((a.residue.type, a.residue.id.position, a.name), a)
+                     for a in molecule.atoms)
+        cb, c1 = atoms['ALA', 1, 'CB'], atoms['LIG', 1, 'C1']
+        distance = sum((a - b) ** 2 for (a, b) in zip(cb.coord(), c1.coord())) ** 0.5
+        rows = [(1, 'ALA', 'A', 1, 'LIG', 'L', distance, c1.serialNumber, cb.serialNumber)]
+        results.append(FakeAnalysis(*rows if distance < 2.5 else ()))
+    return results
+
+
+@pytest.fixture
+def frames(open_complex, monkeypatch):
+    """
+    `COMPLEX` with frames 1 to 4: the ligand moves away from ALA 1 in frame
+    3, and frames 2 and 4 repeat the ones before them
+    """
+    molecule = open_complex()
+    for frame in range(1, 5):
+        coordset = molecule.newCoordSet(frame)
+        for atom in molecule.atoms:
+            c = atom.coord()
+            shift = 2.0 if frame >= 3 and atom.residue.type == 'LIG' else 0.0
+            atom.setCoord(headless.Point(c.x, c.y, c.z + shift), coordset)
+    fake_analyze_many.calls, fake_analyze_many.pools = [], []
+    monkeypatch.setattr(trajectory, 'analyze_many', fake_analyze_many)
+    return molecule
+
+
+def test_frames_are_activated(frames):
+    active = frames.activeCoordSet
+    with trajectory.frame_active(frames, 3) as coordset:
+        assert frames.activeCoordSet is coordset
+        assert frames.atoms[9].coord().z == 2.0
+    assert frames.activeCoordSet is active and frames.atoms[9].coord().z == 0.0
+    assert trajectory.trajectory_frames(frames, start=1, stride=2) == [1, 3]
+
+
+def test_trajectory_reuse_and_occupancy(frames, tmpdir):
+    output = tmpdir.join('frames.jsonl')
+    aggregator, reuse = OccupancyAggregator(), FrameReuse()
+    analyzed, failed, interactions = trajectory.analyze_trajectory(
+        frames, str(output), start=1, window=2, pocket=8, aggregator=aggregator, reuse=reuse)
+    assert (analyzed, failed, interactions) == (4, 0, 2)
+    # Frames 2 and 4 reuse frames 1 and 3
+    assert fake_analyze_many.calls == [1, 1]
+    assert (reuse.checked, reuse.reused) == (4, 2)
+    records = [json.loads(line) for line in output.readlines()]
+    assert [(r['frame'], r.get('reused')) for r in records] == [(1, None), (2, 1)]
+    assert records[0]['DIST'] == pytest.approx(2.088, abs=1e-3)
+
+    (contact, occupancy, stats), = aggregator.summary()
+    assert occupancy == 0.5 and stats.count == 2
+    assert contact.atoms == (('A', 1, ' ', 'CB', ''), ('L', 1, ' ', 'C1', ''))
+
+
+def test_depict_occupancy_does_not_export(frames, monkeypatch):
+    from plipgui import plip4chimera
+    from plipgui.occupancy import depict_occupancy
+    monkeypatch.setattr(plip4chimera, 'export_pdb', None)
+    aggregator = OccupancyAggregator()
+    aggregator.add(1, FakeAnalysis((1, 'ALA', 'A', 1, 'LIG', 'L', 2.0, '', '')))
+    copy, drawn = depict_occupancy(aggregator, frames)
+    assert copy is not frames and drawn == 1
+    assert len(copy.atoms) == len(frames.atoms) and copy in plip4chimera.registry
+
+
+def test_trajectory_output_is_replaced(frames, tmpdir):
+    output = tmpdir.join('frames.jsonl')
+    for _ in range(2):
+        trajectory.analyze_trajectory(frames, str(output), start=1, window=1, processes=1)
+        assert len(output.readlines()) == 2
+    assert fake_analyze_many.pools == [None] * 8
+
+
+def test_trajectory_shares_one_pool(frames, tmpdir):
+    trajectory.analyze_trajectory(frames, str(tmpdir.join('frames.jsonl')), start=1,
+                                  window=1, processes=2, backend='local')
+    pool = fake_analyze_many.pools[0]
+    assert isinstance(pool, CrashSafePool) and pool.processes == 2
+    assert fake_analyze_many.pools == [pool] * 4
+    trajectory.analyze_trajectory(frames, str(tmpdir.join('frames.jsonl')), start=1,
+                                  window=1, processes=2, backend='worker')
+    assert fake_analyze_many.pools[4:] == [None] * 4
+
+
+def test_reuse_needs_the_same_pocket_atoms():
+    reuse = FrameReuse(tolerance=0.5)
+    reuse.add(1, [(0.0, 0.0, 0.0), (1.0, 0.0, 0.0)], members=['a', 'b'])
+    assert reuse.lookup([(0.0, 0.0, 0.0), (1.2, 0.0, 0.0)], members=['a', 'b']) == 1
+    assert reuse.lookup([(0.0, 0.0, 0.0), (1.0, 0.0, 0.0)], members=['a', 'c']) is None
+    assert reuse.lookup([(0.0, 0.0, 0.0)], members=['a']) is None
+
+
+def test_trajectory_pocket_follows_frames(frames, tmpdir):
+    # In frame 5, the far water comes into the pocket of frame 1
+    water = frames.atoms[-1]
+    coordset = frames.newCoordSet(5)
+    coordset.coords[water] = headless.Point(6.0, 2.0, 3.0)
+    reuse = FrameReuse()
+    trajectory.analyze_trajectory(frames, str(tmpdir.join('frames.jsonl')), start=1,
+                                  window=5, processes=1, reuse=reuse)
+    assert fake_analyze_many.calls == [3]
+    assert (reuse.checked, reuse.reused) == (5, 2)
@@ -0,0 +1,47 @@
+# encoding: utf-8
+
+from __future__ import print_function, division
+import pytest
+
+pytest.importorskip('plip.modules.chimeraplip')
+from plipgui import plip4chimera
+
+
+def test_visualizer_uses_its_own_groups(session, open_complex, view_data):
+    """
+    ChimeraVisualizer must not hide Visualizer.getPseudoBondGroup
+    """
+    pose1 = open_complex()
+    pose2 = open_complex(sameAs=pose1)
+    viewers = []
+    for pose in (pose1, pose2):
+        _, target, atoms = plip4chimera.prepare_molecule(pose, copy=False)
+        viewer = plip4chimera.Visualizer(view_data(hydrophobic=[(3, 10)]), target, atoms,
+                                         site='LIG:L:1')
+        viewer.show_hydrophobic()
+        viewers.append(viewer)
+
+    manager = session.PseudoBondMgr.mgr()
+    assert sorted(manager.pseudoBondGroupsMap) == [
+        'Hydrophobic Interactions-0 LIG:L:1', 'Hydrophobic Interactions-0.1 LIG:L:1']
+    for pose, viewer in zip((pose1, pose2), viewers):
+        assert 'getPseudoBondGroup' not in vars(viewer)
+        group, = viewer.groups_by_interaction['hydrophobic']
+        assert viewer.groups == [group]
+        pseudobond, = group.pseudoBonds
+        assert [a.molecule for a in pseudobond.atoms] == [pose, pose]
+        assert [a.name for a in pseudobond.atoms] == ['CB', 'C1']
+        depiction, = [d for d in plip4chimera.registry._depictions.values()
+                      if d.target is pose]
+        assert depiction.groups == [group]
+
+
+def test_sites_get_separate_groups(session, open_complex, view_data):
+    molecule = open_complex()
+    _, target, atoms = plip4chimera.prepare_molecule(molecule, copy=True)
+    first = plip4chimera.Visualizer(view_data(hbonds=[(12, 4)]), target, atoms, site='A')
+    second = plip4chimera.Visualizer(view_data(hbonds=[(12, 1)]), target, atoms, site='B')
+    first.show_hbonds()
+    second.show_hbonds()
+    assert first.groups_by_interaction['hbond'] != second.groups_by_interaction['hbond']
+    assert target is not molecule and target.name == 'PLIP-0'
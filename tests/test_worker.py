@@ -0,0 +1,50 @@
+# encoding: utf-8
+
+from __future__ import print_function, division
+import subprocess
+import sys
+import threading
+import time
+
+from plipgui import worker
+
+
+def busy_worker():
+    """
+    A Worker whose process is busy and ignores its stdin closing
+    """
+    client = worker.Worker()
+    client.process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'],
+                                      stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    return client
+
+
+def test_stop_does_not_wait():
+    client = busy_worker()
+    process = client.process
+    t0 = time.time()
+    client.stop()
+    assert time.time() - t0 < 0.5 and client.process is None
+    # The daemon reaper kills it
+    deadline = time.time() + 10
+    while process.returncode is None and time.time() < deadline:
+        time.sleep(0.05)
+    assert process.returncode is not None and process.stdout.closed
+
+
+def test_stop_while_reading():
+    client = busy_worker()
+    errors = []
+
+    def request():
+        try:
+            client._request(('ping',))
+        except worker.WorkerError as e:
+            errors.append(e)
+
+    reader = threading.Thread(target=request)
+    reader.start()
+    time.sleep(0.2)
+    client.stop(wait=True)
+    reader.join(10)
+    assert not reader.is_alive() and len(errors) == 1